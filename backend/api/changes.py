@@ -0,0 +1,278 @@
+"""
+Change feed for incremental client sync.
+
+Saves and deletes of the synced models append a ChangeLogEntry in the same
+transaction (see api.signals). Clients remember the cursor of the last entry
+they applied and ask /api/changes/?since=<cursor> for what happened after
+it: compact upserts carrying the object's own columns, and tombstones for
+deleted objects or objects the caller can no longer see.
+
+Entry ids are handed out on insert but become visible on commit, so a later
+id can be read before an earlier one. On PostgreSQL every entry therefore
+records the id of the transaction that wrote it; entries are read in
+(transaction id, id) order and only from transactions older than the oldest
+one still running, which can no longer be overtaken. Cursors are
+"<transaction id>-<id>". Other databases record 0 and are read in id order,
+which is safe on SQLite, where write transactions run one at a time.
+
+Bulk QuerySet.update() and bulk_create() skip model signals, so code using
+them must call ChangeFeed.record_many() itself.
+"""
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BigIntegerField, Func, Q
+from django.utils import timezone
+
+from api.models import ChangeLogEntry
+
+CHANGE_FEED_SETTINGS = getattr(settings, 'CHANGE_FEED', {})
+CURSOR_RE = re.compile(r'^(\d+)-(\d+)$')
+
+
+class ChangeFeedExpired(Exception):
+    """The cursor points at entries that have been pruned; the client must resync in full."""
+
+
+class CurrentTransactionId(Func):
+    """Id of the writing transaction on PostgreSQL, 0 elsewhere."""
+    template = '0'
+    output_field = BigIntegerField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template='pg_current_xact_id()::text::bigint', **extra_context
+        )
+
+
+class ChangeFeed:
+    """Recording and reading of the change log."""
+
+    # model name -> columns copied into upsert payloads
+    FIELDS = {
+        'sale': (
+            'title', 'customer', 'status', 'amount', 'expected_close_date', 'assigned_to',
+            'priority', 'is_archived', 'created_at', 'updated_at',
+        ),
+        'task': (
+            'title', 'due_date', 'priority', 'status', 'assigned_to', 'created_by',
+            'created_at', 'updated_at',
+        ),
+        'customer': (
+            'name', 'email', 'phone', 'company', 'city', 'country', 'region', 'engagement_level',
+            'status', 'owner', 'last_contact_date', 'is_active', 'created_at', 'updated_at',
+        ),
+        'calendarevent': (
+            'title', 'start_time', 'end_time', 'owner', 'customer', 'sale', 'is_all_day',
+            'event_type', 'location', 'created_at', 'updated_at',
+        ),
+        'notification': (
+            'recipient', 'category', 'title', 'message', 'priority', 'is_read', 'created_at',
+            'action_url',
+        ),
+    }
+
+    @staticmethod
+    def payload(instance, participant_ids=None):
+        """Compact snapshot of the instance; foreign keys are given as ids."""
+        meta = instance._meta
+        data = {'id': instance.pk}
+        for name in ChangeFeed.FIELDS[meta.model_name]:
+            data[name] = getattr(instance, meta.get_field(name).attname)
+        if meta.model_name == 'calendarevent':
+            data['participants'] = sorted(ChangeFeed.participant_ids(instance, participant_ids))
+        return data
+
+    @staticmethod
+    def participant_ids(event, participant_ids=None):
+        if participant_ids is None:
+            participant_ids = event.participants.values_list('id', flat=True)
+        return list(participant_ids)
+
+    @staticmethod
+    def visibility(instance, participant_ids=None):
+        """(assignee, audience user ids) that decide who may see the instance."""
+        model_name = instance._meta.model_name
+        if model_name == 'sale':
+            return instance.assigned_to_id, {instance.assigned_to_id}
+        if model_name == 'task':
+            return instance.assigned_to_id, {instance.assigned_to_id, instance.created_by_id}
+        if model_name == 'customer':
+            return None, {instance.owner_id}
+        if model_name == 'calendarevent':
+            return None, {instance.owner_id, *ChangeFeed.participant_ids(instance, participant_ids)}
+        return None, {instance.recipient_id}
+
+    @staticmethod
+    def record(instance, action, visibility=None, participant_ids=None):
+        """Append an entry for the instance, visible as it is now unless visibility is given."""
+        if visibility is None:
+            visibility = ChangeFeed.visibility(instance, participant_ids)
+        assignee, audience = visibility
+        data = None
+        if action == ChangeLogEntry.UPSERT:
+            data = ChangeFeed.payload(instance, participant_ids)
+        return ChangeLogEntry.objects.create(
+            model=instance._meta.model_name,
+            object_id=instance.pk,
+            action=action,
+            data=data,
+            assignee=assignee,
+            audience=ChangeFeed.format_audience(audience),
+            txid=CurrentTransactionId(),
+        )
+
+    @staticmethod
+    def record_many(instances, original_visibility=None):
+        """
+        Append upserts for objects changed without model signals.
+
+        original_visibility maps primary keys to the visibility objects had
+        before the change; those whose visibility changed get a tombstone first.
+        """
+        original_visibility = original_visibility or {}
+        entries = []
+        for instance in instances:
+            visibility = ChangeFeed.visibility(instance)
+            original = original_visibility.get(instance.pk)
+            if original and original != visibility:
+                entries.append(ChangeFeed._entry(instance, ChangeLogEntry.DELETE, original))
+            entries.append(ChangeFeed._entry(instance, ChangeLogEntry.UPSERT, visibility))
+        return ChangeLogEntry.objects.bulk_create(entries)
+
+    @staticmethod
+    def _entry(instance, action, visibility):
+        assignee, audience = visibility
+        return ChangeLogEntry(
+            model=instance._meta.model_name,
+            object_id=instance.pk,
+            action=action,
+            data=ChangeFeed.payload(instance) if action == ChangeLogEntry.UPSERT else None,
+            assignee=assignee,
+            audience=ChangeFeed.format_audience(audience),
+            txid=CurrentTransactionId(),
+        )
+
+    @staticmethod
+    def format_audience(user_ids):
+        user_ids = sorted(user_id for user_id in user_ids if user_id is not None)
+        return f",{','.join(map(str, user_ids))}," if user_ids else ''
+
+    @staticmethod
+    def visible_to(user):
+        """Entries the user may read, mirroring the role rules of the list endpoints."""
+        member = Q(audience__contains=f',{user.id},')
+        # Customers are listed to everyone, notifications only to their recipient
+        visible = Q(model='customer') | (Q(model='notification') & member)
+        if user.role == 'ADMIN':
+            visible |= Q(model__in=['sale', 'task', 'calendarevent'])
+        elif user.role == 'MANAGER':
+            visible |= Q(model='sale') | (Q(model__in=['task', 'calendarevent']) & member)
+        else:
+            visible |= Q(model__in=['sale', 'task'], assignee=user.id) | (Q(model='calendarevent') & member)
+        return visible
+
+    @staticmethod
+    def settled_before():
+        """
+        Transaction id below which every writer has finished, or None where
+        entries are settled as soon as they can be read.
+        """
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def settled(queryset, xmin):
+        """Entries of the queryset written by transactions that have finished."""
+        return queryset if xmin is None else queryset.filter(txid__lt=xmin)
+
+    @staticmethod
+    def format_cursor(position):
+        return f'{position[0]}-{position[1]}'
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """(transaction id, id) of a cursor."""
+        match = CURSOR_RE.match(str(cursor))
+        if not match:
+            raise ValueError(f'Invalid change feed cursor: {cursor}')
+        return int(match.group(1)), int(match.group(2))
+
+    @staticmethod
+    def latest_cursor(xmin=None):
+        """Cursor of the newest settled entry, for clients starting from a full load."""
+        if xmin is None:
+            xmin = ChangeFeed.settled_before()
+        latest = ChangeFeed.settled(ChangeLogEntry.objects.all(), xmin).order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        # Every entry of a transaction before xmin can be read; later ones cannot yet
+        return ChangeFeed.format_cursor((0 if xmin is None else xmin - 1, latest))
+
+    @staticmethod
+    def changes_since(user, since, limit):
+        """
+        Changes visible to the user after the cursor, oldest first.
+
+        Several entries for one object within the page collapse into its latest
+        state. Raises ValueError for a malformed cursor and ChangeFeedExpired
+        if entries after the cursor were pruned.
+        """
+        since_txid, since_id = ChangeFeed.parse_cursor(since)
+        # Entries are pruned by age, which follows their ids, not their transaction ids
+        oldest = ChangeLogEntry.objects.order_by('id').values_list('id', flat=True).first()
+        if oldest is not None and since_id < oldest - 1:
+            raise ChangeFeedExpired
+
+        xmin = ChangeFeed.settled_before()
+        after = Q(txid__gt=since_txid) | Q(txid=since_txid, id__gt=since_id)
+        entries = list(
+            ChangeFeed.settled(ChangeLogEntry.objects.filter(after), xmin)
+            .filter(ChangeFeed.visible_to(user))
+            .order_by('txid', 'id')
+            .values('id', 'txid', 'model', 'object_id', 'action', 'data')[:limit + 1]
+        )
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        if has_more:
+            cursor = ChangeFeed.format_cursor((entries[-1]['txid'], entries[-1]['id']))
+        else:
+            # Skip over settled entries of other users so they are not scanned again
+            newest = ChangeFeed.parse_cursor(ChangeFeed.latest_cursor(xmin))
+            cursor = ChangeFeed.format_cursor(max((since_txid, since_id), newest))
+
+        latest = {}
+        for entry in entries:
+            key = (entry['model'], entry['object_id'])
+            latest.pop(key, None)
+            latest[key] = entry
+
+        changes = []
+        for entry in latest.values():
+            change = {'model': entry['model'], 'id': entry['object_id'], 'action': entry['action']}
+            if entry['action'] == ChangeLogEntry.UPSERT:
+                change['data'] = entry['data']
+            changes.append(change)
+
+        return {'cursor': cursor, 'has_more': has_more, 'changes': changes}
+
+    @staticmethod
+    def prune(days, batch_size=5000):
+        """Delete entries older than the given number of days; returns how many went."""
+        cutoff = timezone.now() - timedelta(days=days)
+        deleted = 0
+        while True:
+            batch = list(
+                ChangeLogEntry.objects.filter(created_at__lt=cutoff)
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not batch:
+                return deleted
+            ChangeLogEntry.objects.filter(id__in=batch).delete()
+            deleted += len(batch)
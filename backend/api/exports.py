@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+import re
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# Rows fetched per keyset query
+EXPORT_CHUNK_SIZE = 2000
+# Rows encoded before a chunk is handed to the server
+EXPORT_FLUSH_ROWS = 500
+
+accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def export_fields(model):
+    """Concrete columns of a model, with foreign keys exported as their ids."""
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def keyset_rows(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield queryset rows as dicts in primary key order, one chunk per query.
+
+    Each chunk continues after the last primary key of the previous one, so
+    queries stay cheap no matter how deep into the table the export is and
+    no COUNT(*) is needed.
+    """
+    pk_name = queryset.model._meta.pk.attname
+    if pk_name not in fields:
+        fields = [pk_name] + list(fields)
+    queryset = queryset.order_by(pk_name).values(*fields)
+
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(chunk[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][pk_name]
+
+
+def encode_ndjson(rows, fields):
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+        if len(buffer) >= EXPORT_FLUSH_ROWS:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def encode_csv(rows, fields):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(fields)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([row[field] for field in fields])
+        if count % EXPORT_FLUSH_ROWS == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
+
+def streaming_export(request, queryset, fields, basename):
+    """
+    Stream every row of queryset as NDJSON (default) or CSV.
+
+    The format is chosen with ?export_format=ndjson|csv. The body is gzipped
+    when the client accepts it.
+    """
+    export_format = request.query_params.get('export_format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return Response(
+            {'error': f"Unsupported export format. Use one of: {', '.join(EXPORT_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    encode = encode_csv if export_format == 'csv' else encode_ndjson
+    content = (chunk.encode() for chunk in encode(keyset_rows(queryset, fields), fields))
+
+    gzipped = bool(accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+    if gzipped:
+        content = compress_sequence(content)
+
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[export_format])
+    filename = f"{basename}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class ExportMixin:
+    """
+    Adds a GET /export/ action that streams the view's filtered queryset.
+
+    The usual role-based get_queryset() and filter backends apply; results
+    are always in primary key order and are not paginated.
+    """
+    export_fields = None
+    export_basename = None
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        model = queryset.model
+        return streaming_export(
+            request,
+            queryset,
+            self.export_fields or export_fields(model),
+            self.export_basename or model._meta.verbose_name_plural.replace(' ', '_')
+        )
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.changes import ChangeFeed
+
+
+class Command(BaseCommand):
+    help = 'Deletes change log entries past CHANGE_FEED RETENTION_DAYS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=getattr(settings, 'CHANGE_FEED', {}).get('RETENTION_DAYS', 30),
+                            help='Delete entries created more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        deleted = ChangeFeed.prune(options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} change log entries older than {options['days']} days"
+        ))
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:24
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Upsert'), ('delete', 'Delete')], max_length=6)),
+                ('data', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('assignee', models.BigIntegerField(blank=True, null=True)),
+                ('audience', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('txid', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'change log entries',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['txid', 'id'], name='api_changelog_txid_id')],
+            },
+        ),
+    ]
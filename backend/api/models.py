@@ -0,0 +1,40 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+class ChangeLogEntry(models.Model):
+    """
+    Append-only record of a save or delete of a synced model.
+
+    Written by api.signals in the same transaction as the change itself; the
+    id is the cursor clients pass back to /api/changes/. Users are stored as
+    plain ids rather than foreign keys so entries outlive deleted accounts.
+    """
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTION_CHOICES = (
+        (UPSERT, 'Upsert'),
+        (DELETE, 'Delete'),
+    )
+
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    # Field values after the change, empty for tombstones
+    data = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    # Assigned user of sales and tasks, which is all regular users are shown
+    assignee = models.BigIntegerField(null=True, blank=True)
+    # Users the object is visible to through ownership, as ",1,5,"
+    audience = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Writing transaction on PostgreSQL, which orders the feed (see api.changes)
+    txid = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['txid', 'id'], name='api_changelog_txid_id')]
+        verbose_name_plural = 'change log entries'
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.model} {self.object_id}"
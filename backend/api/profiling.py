@@ -0,0 +1,204 @@
+"""
+Opt-in SQL profiling of API requests.
+
+SQLProfilingMiddleware counts and times the queries of a sample of requests,
+groups them by fingerprint (the SQL with its parameters left out) and flags
+statements repeated often enough to be an N+1 pattern. Profiled responses
+carry Server-Timing and X-DB-Queries headers; the most recent profiles of
+each server process are listed at /api/profiling/requests/ for admins.
+
+Queries run while a streaming response is being sent happen after the
+middleware returns and are not counted.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from api.permissions import IsAdmin
+
+logger = logging.getLogger('api.profiling')
+PROFILING_SETTINGS = getattr(settings, 'SQL_PROFILING', {})
+
+IN_LIST_RE = re.compile(r'\bIN \((?:%s, )*%s\)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Normalise a statement so executions that differ only in parameters compare equal."""
+    sql = WHITESPACE_RE.sub(' ', sql).strip()
+    # IN lists of different lengths are the same query
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryProfile:
+    """Queries of one request, recorded through a connection execute wrapper."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.duplicates = 0
+        # fingerprint -> [executions, seconds]
+        self.fingerprints = {}
+        self._seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            stats = self.fingerprints.setdefault(fingerprint(sql), [0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            # The very same statement with the very same parameters ran before
+            try:
+                key = (sql, repr(params))
+            except Exception:
+                key = None
+            if key in self._seen:
+                self.duplicates += 1
+            elif key is not None:
+                self._seen.add(key)
+
+    def repeated(self, threshold):
+        """Fingerprints of SELECTs executed at least threshold times, most frequent first."""
+        return sorted(
+            (
+                {'fingerprint': sql, 'count': count, 'db_ms': round(seconds * 1000, 2)}
+                for sql, (count, seconds) in self.fingerprints.items()
+                if count >= threshold and sql.upper().startswith('SELECT')
+            ),
+            key=lambda item: -item['count']
+        )
+
+
+class RecentRequests:
+    """Bounded, thread-safe list of the latest request profiles of this process."""
+
+    def __init__(self, max_entries):
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def add(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+
+    def snapshot(self):
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+recent_requests = RecentRequests(PROFILING_SETTINGS.get('RECENT_REQUESTS', 200))
+
+
+class SQLProfilingMiddleware:
+    """
+    Profiles the SQL of a sampled share of requests.
+
+    When SQL_PROFILING['ENABLED'] is not set, Django drops this middleware
+    from the stack entirely. When it is, requests outside the sample only
+    pay for one random() call.
+    """
+
+    def __init__(self, get_response):
+        if not PROFILING_SETTINGS.get('ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = PROFILING_SETTINGS.get('SAMPLE_RATE', 0.01)
+        self.threshold = PROFILING_SETTINGS.get('N_PLUS_ONE_THRESHOLD', 5)
+        self.path_prefix = PROFILING_SETTINGS.get('PATH_PREFIX', '/api/')
+
+    def __call__(self, request):
+        if not self._should_profile(request):
+            return self.get_response(request)
+
+        profile = QueryProfile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(profile))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = profile.duration * 1000
+
+        repeated = profile.repeated(self.threshold)
+        response['X-DB-Queries'] = str(profile.count)
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{profile.count} queries", app;dur={total_ms - db_ms:.1f}'
+        )
+        if repeated:
+            response['X-DB-N-Plus-One'] = str(len(repeated))
+            logger.warning(
+                'Probable N+1 queries in %s %s: %s', request.method, request.path,
+                '; '.join(f"{item['count']}x {item['fingerprint'][:200]}" for item in repeated)
+            )
+
+        user = getattr(request, 'user', None)
+        recent_requests.add({
+            'timestamp': timezone.now(),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'user_id': user.id if user is not None and user.is_authenticated else None,
+            'duration_ms': round(total_ms, 2),
+            'db_ms': round(db_ms, 2),
+            'queries': profile.count,
+            'duplicate_queries': profile.duplicates,
+            'distinct_queries': len(profile.fingerprints),
+            'n_plus_one': repeated,
+        })
+        return response
+
+    def _should_profile(self, request):
+        if not request.path.startswith(self.path_prefix):
+            return False
+        # Developers can ask for a profile of any request while DEBUG is on
+        if settings.DEBUG and request.META.get('HTTP_X_PROFILE_SQL'):
+            return True
+        return random.random() < self.sample_rate
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated, IsAdmin])
+def profiled_requests(request):
+    """
+    Recent SQL profiles of this server process (admin only), newest first.
+
+    ?path=<prefix> and ?n_plus_one=true narrow the list; DELETE empties it.
+    """
+    if request.method == 'DELETE':
+        recent_requests.clear()
+        return Response(status=204)
+
+    entries = recent_requests.snapshot()
+    path = request.query_params.get('path')
+    if path:
+        entries = [entry for entry in entries if entry['path'].startswith(path)]
+    if request.query_params.get('n_plus_one') == 'true':
+        entries = [entry for entry in entries if entry['n_plus_one']]
+
+    return Response({
+        'enabled': PROFILING_SETTINGS.get('ENABLED', False),
+        'sample_rate': PROFILING_SETTINGS.get('SAMPLE_RATE', 0.01),
+        'n_plus_one_threshold': PROFILING_SETTINGS.get('N_PLUS_ONE_THRESHOLD', 5),
+        'count': len(entries),
+        'requests': entries,
+    })
@@ -0,0 +1,92 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from calendar_scheduling.models import CalendarEvent
+from customers.models import Customer
+from notifications.models import Notification
+from sales.models import Sale
+from tasks.models import Task
+from .changes import ChangeFeed
+from .models import ChangeLogEntry
+
+# Columns that decide visibility, for models whose visibility can change on save
+VISIBILITY_FIELDS = {
+    Sale: ('assigned_to_id',),
+    Task: ('assigned_to_id', 'created_by_id'),
+    CalendarEvent: ('owner_id',),
+}
+
+
+def _record_change(instance, original=None, participant_ids=None):
+    """Log the new state, after a tombstone for everyone who could see the object before."""
+    visibility = ChangeFeed.visibility(instance, participant_ids)
+    if original and original != visibility:
+        ChangeFeed.record(instance, ChangeLogEntry.DELETE, visibility=original)
+    ChangeFeed.record(instance, ChangeLogEntry.UPSERT, visibility=visibility, participant_ids=participant_ids)
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=CalendarEvent)
+@receiver(post_save, sender=Notification)
+def record_save(sender, instance, created, raw=False, **kwargs):
+    """Append an upsert for the saved object."""
+    if raw:
+        return
+    participant_ids = None
+    if sender is CalendarEvent:
+        # Participants are only added once the new event has been saved
+        participant_ids = [] if created else ChangeFeed.participant_ids(instance)
+
+    original = None
+    # Field trackers still hold the values from before this save
+    fields = instance.original_values(*VISIBILITY_FIELDS[sender]) if sender in VISIBILITY_FIELDS else None
+    if fields:
+        original = ChangeFeed.visibility(sender(pk=instance.pk, **fields), participant_ids)
+    _record_change(instance, original, participant_ids)
+
+
+@receiver(pre_delete, sender=CalendarEvent)
+def snapshot_deleted_event(sender, instance, **kwargs):
+    """Participants are gone by post_delete, so read them while they exist."""
+    instance._original_visibility = ChangeFeed.visibility(instance)
+
+
+@receiver(post_delete, sender=Sale)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=CalendarEvent)
+@receiver(post_delete, sender=Notification)
+def record_delete(sender, instance, **kwargs):
+    """Append a tombstone for everyone who could see the deleted object."""
+    ChangeFeed.record(
+        instance, ChangeLogEntry.DELETE,
+        visibility=getattr(instance, '_original_visibility', None)
+    )
+
+
+@receiver(m2m_changed, sender=CalendarEvent.participants.through)
+def record_participants(sender, instance, action, reverse, pk_set, **kwargs):
+    """Log events again when their participants change."""
+    if reverse:
+        # Changed from the user's side: instance is the user, pk_set holds events
+        if action in ('pre_remove', 'pre_clear'):
+            events = CalendarEvent.objects.filter(participants=instance)
+            if pk_set:
+                events = events.filter(pk__in=pk_set)
+            instance._changed_events = [(event, ChangeFeed.visibility(event)) for event in events]
+        elif action == 'post_add':
+            for event in CalendarEvent.objects.filter(pk__in=pk_set):
+                _record_change(event)
+        elif action in ('post_remove', 'post_clear'):
+            for event, original in getattr(instance, '_changed_events', []):
+                _record_change(event, original)
+        return
+
+    if action in ('pre_remove', 'pre_clear'):
+        instance._original_visibility = ChangeFeed.visibility(instance)
+    elif action == 'post_add':
+        _record_change(instance)
+    elif action in ('post_remove', 'post_clear'):
+        _record_change(instance, getattr(instance, '_original_visibility', None))
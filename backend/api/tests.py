@@ -0,0 +1,164 @@
+import threading
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from calendar_scheduling.models import CalendarEvent
+from customers.models import Customer
+from sales.models import Sale
+from tasks.models import Task
+from .changes import ChangeFeed
+from .models import ChangeLogEntry
+
+User = get_user_model()
+
+SYNCED = ('sale', 'task', 'customer', 'calendarevent')
+
+
+def synced_changes(user, since):
+    """(model, id, action) of the sales, tasks, customers and events the user is sent."""
+    feed = ChangeFeed.changes_since(user, since, 100)
+    return sorted(
+        (change['model'], change['id'], change['action'])
+        for change in feed['changes'] if change['model'] in SYNCED
+    )
+
+
+class ChangeFeedVisibilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('ada@example.com', 'pw', role='ADMIN')
+        cls.manager = User.objects.create_user('max@example.com', 'pw', role='MANAGER')
+        cls.other_manager = User.objects.create_user('mo@example.com', 'pw', role='MANAGER')
+        cls.user = User.objects.create_user('uma@example.com', 'pw', role='USER')
+        cls.other_user = User.objects.create_user('ole@example.com', 'pw', role='USER')
+
+    def setUp(self):
+        self.since = ChangeFeed.latest_cursor()
+        self.customer = Customer.objects.create(
+            name='Acme', email='acme@example.com', region='NA', owner=self.other_user
+        )
+        self.sale = Sale.objects.create(
+            title='Deal', customer=self.customer, assigned_to=self.user, status='NEW', amount=Decimal('10')
+        )
+        self.task = Task.objects.create(title='Call', assigned_to=self.user, created_by=self.manager)
+        self.event = CalendarEvent.objects.create(
+            title='Demo', owner=self.other_manager, start_time=timezone.now(), end_time=timezone.now()
+        )
+        self.event.participants.add(self.user)
+
+    def test_role_rules(self):
+        customer = ('customer', self.customer.pk, 'upsert')
+        sale = ('sale', self.sale.pk, 'upsert')
+        task = ('task', self.task.pk, 'upsert')
+        event = ('calendarevent', self.event.pk, 'upsert')
+        expected = {
+            self.admin: [event, customer, sale, task],
+            # Managers see every sale, but only the tasks and events they take part in
+            self.manager: [customer, sale, task],
+            self.other_manager: [event, customer, sale],
+            self.user: [event, customer, sale, task],
+            self.other_user: [customer],
+        }
+        for user, changes in expected.items():
+            with self.subTest(user=user.email):
+                self.assertEqual(synced_changes(user, self.since), changes)
+
+    def test_reassignment_sends_a_tombstone_to_the_previous_assignee(self):
+        since = ChangeFeed.latest_cursor()
+        self.sale.assigned_to = self.other_user
+        self.sale.save()
+
+        self.assertEqual(synced_changes(self.user, since), [('sale', self.sale.pk, 'delete')])
+        self.assertEqual(synced_changes(self.other_user, since), [('sale', self.sale.pk, 'upsert')])
+        # Users who can still see the sale only get its new state
+        self.assertEqual(synced_changes(self.manager, since), [('sale', self.sale.pk, 'upsert')])
+
+    def test_removed_participant_gets_a_tombstone(self):
+        since = ChangeFeed.latest_cursor()
+        self.event.participants.remove(self.user)
+
+        self.assertEqual(synced_changes(self.user, since), [('calendarevent', self.event.pk, 'delete')])
+        self.assertEqual(synced_changes(self.other_manager, since), [('calendarevent', self.event.pk, 'upsert')])
+
+
+class ChangeFeedOrderTests(TestCase):
+    """Entries are read in (transaction id, id) order, and only once their transactions have finished."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('ada@example.com', 'pw', role='ADMIN')
+
+    def entry(self, txid, object_id):
+        return ChangeLogEntry.objects.create(
+            model='customer', object_id=object_id, action=ChangeLogEntry.UPSERT, data={}, txid=txid
+        )
+
+    def read(self, since, xmin, limit=100):
+        with mock.patch.object(ChangeFeed, 'settled_before', return_value=xmin):
+            feed = ChangeFeed.changes_since(self.admin, since, limit)
+        return [change['id'] for change in feed['changes']], feed['cursor'], feed['has_more']
+
+    def test_late_commit_is_not_skipped(self):
+        ChangeLogEntry.objects.all().delete()
+        # Transaction 20 inserted first but is still running while transaction 21 commits
+        late = self.entry(20, 1)
+        self.entry(21, 2)
+        late_id = late.pk
+
+        with mock.patch.object(ChangeFeed, 'settled_before', return_value=20):
+            since = ChangeFeed.latest_cursor()
+        self.assertEqual(self.read(since, 20), ([], since, False))
+
+        # Once transaction 20 has finished, both are returned in transaction order
+        changes, cursor, _ = self.read(since, 22)
+        self.assertEqual(changes, [1, 2])
+        self.assertEqual(ChangeFeed.parse_cursor(cursor), (21, late_id + 1))
+
+        changes, cursor, has_more = self.read(since, 22, limit=1)
+        self.assertEqual((changes, has_more), ([1], True))
+        self.assertEqual(self.read(cursor, 22), ([2], f'21-{late_id + 1}', False))
+
+    def test_malformed_cursor(self):
+        for cursor in ('abc', '5', '-1', '1-2-3', ''):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                ChangeFeed.parse_cursor(cursor)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'transaction ids are only recorded on PostgreSQL')
+class ConcurrentChangeFeedTests(TransactionTestCase):
+
+    def test_entries_wait_for_earlier_transactions(self):
+        admin = User.objects.create_user('ada@example.com', 'pw', role='ADMIN')
+        since = ChangeFeed.latest_cursor()
+        written = threading.Event()
+        release = threading.Event()
+
+        def slow_writer():
+            try:
+                with transaction.atomic():
+                    Customer.objects.create(name='Slow', email='slow@example.com', region='NA', owner=admin)
+                    written.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=slow_writer)
+        writer.start()
+        try:
+            self.assertTrue(written.wait(10))
+            fast = Customer.objects.create(name='Fast', email='fast@example.com', region='NA', owner=admin)
+            self.assertEqual(synced_changes(admin, since), [])
+        finally:
+            release.set()
+            writer.join()
+
+        slow = Customer.objects.get(name='Slow')
+        self.assertEqual(
+            synced_changes(admin, since),
+            sorted([('customer', slow.pk, 'upsert'), ('customer', fast.pk, 'upsert')])
+        )
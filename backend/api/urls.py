@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from api.views import UserViewSet
+from api.profiling import profiled_requests
+from api.views import UserViewSet, changes
 from customers.views import CustomerViewSet
 from sales.views import SaleViewSet, SaleNoteViewSet
 
@@ -15,4 +16,6 @@ urlpatterns = [
     path('task-management/', include('tasks.urls')),
     path('calendar/', include('calendar_scheduling.urls')),
     path('notifications/', include('notifications.urls')),
+    path('profiling/requests/', profiled_requests, name='profiled-requests'),
+    path('changes/', changes, name='changes'),
 ] 
\ No newline at end of file
@@ -1,12 +1,13 @@
 from django.shortcuts import render
 from django.contrib.auth import get_user_model
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from django.utils import timezone
 from api.serializers import UserSerializer, PasswordChangeSerializer, ProfileSerializer
 from api.permissions import IsAdmin, IsAdminOrManager, CanEditUserInfo
+from api.changes import ChangeFeed, ChangeFeedExpired, CHANGE_FEED_SETTINGS
 
 User = get_user_model()
 
@@ -264,3 +265,38 @@ class UserViewSet(viewsets.ModelViewSet):
             else:
                 print(f"Serializer errors: {serializer.errors}")
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def changes(request):
+    """
+    Changes to sales, tasks, customers, calendar events and notifications
+    visible to the user since ?since=<cursor>.
+
+    Without a cursor only the current cursor is returned, to be taken before a
+    full load of the lists. Keep fetching with the returned cursor while
+    has_more is true; 410 means the cursor is too old and the lists must be
+    loaded in full again.
+    """
+    since = request.query_params.get('since')
+    if since is None:
+        return Response({'cursor': ChangeFeed.latest_cursor(), 'has_more': False, 'changes': []})
+
+    page_size = CHANGE_FEED_SETTINGS.get('PAGE_SIZE', 500)
+    try:
+        ChangeFeed.parse_cursor(since)
+        limit = int(request.query_params.get('limit', page_size))
+    except ValueError:
+        raise ValidationError({'detail': 'since must be a cursor from this endpoint and limit an integer'})
+    if limit < 1:
+        raise ValidationError({'detail': 'limit must be positive'})
+    limit = min(limit, CHANGE_FEED_SETTINGS.get('MAX_PAGE_SIZE', 2000))
+
+    try:
+        return Response(ChangeFeed.changes_since(request.user, since, limit))
+    except ChangeFeedExpired:
+        return Response(
+            {'detail': 'Cursor has expired, reload the full lists', 'cursor': ChangeFeed.latest_cursor()},
+            status=status.HTTP_410_GONE
+        )
@@ -1,10 +1,11 @@
 from django.db import models
 from django.conf import settings
+from crm.tracking import FieldTrackerMixin
 # Ensure necessary imports for Customer and Sale, if they are not already part of standard Django or defined elsewhere
 # from customers.models import Customer # Assuming Customer model is in customers app
 # from sales.models import Sale # Assuming Sale model is in sales app
 
-class CalendarEvent(models.Model):
+class CalendarEvent(FieldTrackerMixin, models.Model):
     """
     Calendar event model for scheduling.
     """
@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.profiling.SQLProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -187,6 +188,30 @@ CORS_ALLOW_HEADERS = [
     'pragma',
     'expires'
 ]
+# Let the frontend read how fresh cached analytics are
+CORS_EXPOSE_HEADERS = [
+    'age',
+    'x-cache-status',
+    'server-timing',
+    'x-db-queries',
+    'x-db-n-plus-one',
+]
+
+# Per-request SQL profiling (api.profiling.SQLProfilingMiddleware), off unless enabled
+SQL_PROFILING = {
+    'ENABLED': os.getenv('SQL_PROFILING_ENABLED', 'False') == 'True',
+    'SAMPLE_RATE': float(os.getenv('SQL_PROFILING_SAMPLE_RATE', '0.01')),  # Share of API requests profiled
+    'N_PLUS_ONE_THRESHOLD': 5,  # Executions of one SELECT fingerprint in a request that flag an N+1
+    'RECENT_REQUESTS': 200,  # Profiles kept per process for /api/profiling/requests/
+    'PATH_PREFIX': '/api/',
+}
+
+# Change feed behind /api/changes/
+CHANGE_FEED = {
+    'PAGE_SIZE': 500,
+    'MAX_PAGE_SIZE': 2000,
+    'RETENTION_DAYS': 30,  # Clients with older cursors must reload in full
+}
 
 # JWT settings
 SIMPLE_JWT = {
@@ -269,6 +294,11 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': True,
         },
+        'api': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
     },
 }
 
@@ -281,10 +311,56 @@ ANALYTICS_SETTINGS = {
         'task_completion': 600,  # 10 minutes
         'conversion_ratios': 600,  # 10 minutes
         'user_activity': 900,  # 15 minutes
+        'user_sales_performance': 900,  # 15 minutes
+        'user_task_performance': 900,  # 15 minutes
+        'pipeline_forecast': 86400,  # 1 day; the key also changes with the date
     },
     'MAX_EXPORT_ROWS': 10000,
     'ENABLE_REAL_TIME_UPDATES': True,
-    'REPORT_RETENTION_DAYS': 90,
+    'REPORT_RETENTION_DAYS': 90,  # Generated reports older than this are deleted by sweep_generated_reports
+    'REPORT_INLINE_DATA_BYTES': 32768,  # Larger report payloads are stored compressed, off the main JSON column
+    'REPORT_WORKERS': 2,  # Threads per server process generating reports in the background
+    'REPORT_JOB_TIMEOUT': 1800,  # Seconds before an unfinished report stops absorbing identical requests and is failed
+    'REPORT_ARTIFACT_DIR': 'report_artifacts',  # Rendered exports, relative to MEDIA_ROOT
+    'PDF_RENDERING': {
+        'WORKERS': 2,  # Renderer processes per server process
+        'TIMEOUT': 120,  # Seconds to wait for one PDF
+    },
+    # run_report_schedules daemon
+    'SCHEDULE_RUNNER': {
+        'BATCH_SIZE': 50,  # Schedules claimed per transaction
+        'WORKERS': 4,  # Threads generating reports per runner process
+        'POLL_INTERVAL': 30,  # Seconds to sleep once no schedules are due
+        'ATTACH_PDF': True,  # Send the PDF export along with the CSV
+    },
+    # Limits on the ad-hoc reports of custom report templates
+    'CUSTOM_REPORTS': {
+        'MAX_GROUPS': 1000,  # Result rows one report may return
+        'MAX_DATE_SPAN_DAYS': 732,  # Longest date range; also the range of reports with an open start
+        'MAX_DIMENSIONS': 3,
+        'PLAN_CACHE_SIZE': 256,  # Compiled template plans kept per process
+    },
+    'USE_ROLLUP_CUBE': True,  # Answer day-aligned analytics from the daily fact tables
+    'TREND_WINDOW_DAYS': 30,  # Dashboard KPI trends compare the last N days with the N days before
+    # Weighted pipeline forecast (reporting.forecast)
+    'FORECAST': {
+        'LOOKBACK_DAYS': 365,  # Deals closed within this window train the win probabilities
+        'OWNER_SMOOTHING': 10,  # Closed deals an owner needs before their own ratio outweighs the global one
+    },
+    # Per-process cache in front of the shared cache backend
+    'LOCAL_CACHE': {
+        'MAX_ENTRIES': 256,
+        'TIMEOUT': 30,  # Seconds an entry is served locally before rechecking the shared cache
+        'GENERATION_TIMEOUT': 2,  # Seconds data generations are trusted locally
+        'LOCK_TIMEOUT': 30,  # Upper bound on one recomputation holding the single-flight lock
+        'WAIT_TIMEOUT': 10,  # How long waiters wait for a recomputation before doing it themselves
+    },
+    # Entries past their CACHE_TIMEOUT are served stale while refreshed in the background
+    'STALE_WHILE_REVALIDATE': {
+        'HARD_TIMEOUT_FACTOR': 4,  # Stale entries are dropped after CACHE_TIMEOUT * factor
+        'REFRESH_WORKERS': 2,
+        'MAX_PENDING_REFRESHES': 16,
+    },
 }
 
 # Email settings for scheduled reports
@@ -0,0 +1,74 @@
+"""Model mixins shared by the CRM apps."""
+
+
+class FieldTrackerMixin:
+    """
+    Remembers the field values a model instance was loaded or last saved with.
+
+    changed_fields() tells what an unsaved modification touches without
+    reading the row again, and stays valid inside pre_save/post_save handlers;
+    saved_changes() keeps the diff of the last save. Fields deferred at load
+    time are tracked once they are fetched. Objects that were never saved
+    have no original values.
+    """
+
+    def _tracked_values(self, attnames=None):
+        deferred = self.get_deferred_fields()
+        return {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname not in deferred and (attnames is None or field.attname in attnames)
+        }
+
+    def _attnames(self, field_names):
+        return {self._meta.get_field(name).attname for name in field_names}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._original_values = instance._tracked_values()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        refreshed = self._tracked_values(self._attnames(fields) if fields else None)
+        self._original_values = {**(getattr(self, '_original_values', None) or {}), **refreshed}
+
+    def original_values(self, *attnames):
+        """Original values of the given fields by attname, or None if they are not known."""
+        originals = getattr(self, '_original_values', None)
+        if originals is None or any(name not in originals for name in attnames):
+            return None
+        return {name: originals[name] for name in attnames}
+
+    def changed_fields(self):
+        """{attname: (original, current)} of the fields modified since load or the last save."""
+        originals = getattr(self, '_original_values', None) or {}
+        current = self._tracked_values(originals.keys())
+        return {
+            name: (value, current[name])
+            for name, value in originals.items()
+            if name in current and current[name] != value
+        }
+
+    def saved_changes(self):
+        """changed_fields() as it was when save() was last called."""
+        return getattr(self, '_saved_changes', {})
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None and getattr(self, '_original_values', None) is None:
+            # Built by hand with a primary key: read the row once so changes can still be told
+            self._original_values = type(self)._base_manager.using(
+                kwargs.get('using') or self._state.db
+            ).filter(pk=self.pk).values(*self._tracked_values()).first()
+        self._saved_changes = self.changed_fields()
+        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self._original_values = self._tracked_values()
+        else:
+            self._original_values = {
+                **(self._original_values or {}),
+                **self._tracked_values(self._attnames(update_fields)),
+            }
@@ -1,6 +1,9 @@
 from django.db import models
 from django.conf import settings
 
+from crm.tracking import FieldTrackerMixin
+
+
 class TimeStampedModel(models.Model):
     """
     Abstract base model that provides created_at and updated_at fields.
@@ -11,7 +14,7 @@ class TimeStampedModel(models.Model):
     class Meta:
         abstract = True
 
-class Customer(TimeStampedModel):
+class Customer(FieldTrackerMixin, TimeStampedModel):
     """
     Customer model for the CRM system.
     """
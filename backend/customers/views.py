@@ -6,10 +6,11 @@ from django.db.models import Q
 from .models import Customer
 from api.serializers import CustomerSerializer
 from api.permissions import IsAdminOrManager, IsOwnerOrAdmin
+from api.exports import ExportMixin
 
 # Create your views here.
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(ExportMixin, viewsets.ModelViewSet):
     """
     API endpoint for customer management.
     """
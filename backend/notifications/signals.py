@@ -1,4 +1,4 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.auth import get_user_model
@@ -106,7 +106,7 @@ def sale_notification(sender, instance, created, **kwargs):
             )
     else:
         # Sale status changed to won
-        if instance.status == 'WON' and instance.status != getattr(instance, '_original_status', None):
+        if instance.status == 'WON' and 'status' in instance.changed_fields():
             # Notify manager
             managers = User.objects.filter(role='MANAGER')
             for manager in managers:
@@ -122,16 +122,6 @@ def sale_notification(sender, instance, created, **kwargs):
                     color="#4caf50"
                 )
 
-@receiver(pre_save, sender=Sale)
-def store_original_sale_status(sender, instance, **kwargs):
-    """Store the original status before save to detect changes"""
-    if instance.id:
-        try:
-            original = Sale.objects.get(id=instance.id)
-            instance._original_status = original.status
-        except Sale.DoesNotExist:
-            pass
-
 # Customer signals
 @receiver(post_save, sender=Customer)
 def customer_notification(sender, instance, created, **kwargs):
@@ -2,7 +2,9 @@ from django.shortcuts import render
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
 from django.db.models import Q
+from api.changes import ChangeFeed
 from .models import Notification, NotificationCategory, NotificationPreference
 from .serializers import NotificationSerializer, NotificationCategorySerializer, NotificationPreferenceSerializer
 
@@ -23,7 +25,11 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def mark_all_as_read(self, request):
         """Mark all notifications as read"""
         notifications = self.get_queryset().filter(is_read=False)
-        notifications.update(is_read=True)
+        with transaction.atomic():
+            ids = list(notifications.values_list('id', flat=True))
+            Notification.objects.filter(id__in=ids).update(is_read=True)
+            # update() skips model signals, so log the change feed entries here
+            ChangeFeed.record_many(Notification.objects.filter(id__in=ids))
         return Response({'status': 'All notifications marked as read'})
     
     @action(detail=True, methods=['post'])
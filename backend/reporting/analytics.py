@@ -1,5 +1,5 @@
+from django.conf import settings
 from django.db.models import Count, Sum, Avg, Q, F, Case, When, DateTimeField
-from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -10,6 +10,16 @@ from customers.models import Customer
 from tasks.models import Task
 from django.contrib.auth import get_user_model
 
+from .cube import RollupCube
+from .metrics import (
+    Metric, SALES_KPIS, TASK_KPIS, CUSTOMER_KPIS, ROW_COUNT,
+    SALES_PERFORMANCE, TASK_PERFORMANCE, SALES_TRENDS, TASK_CREATION_TRENDS,
+    TASK_COMPLETION_TRENDS, CUSTOMER_TRENDS,
+    SALES_SERIES, ACQUISITION_SERIES, COMPLETION_SERIES, percentage, trend
+)
+from .models import SaleFact, TaskFact, CustomerFact
+from .timeseries import TimeSeriesBuilder
+
 User = get_user_model()
 
 def convert_decimals_to_float(obj):
@@ -35,7 +45,10 @@ class AnalyticsService:
         """
         Generate sales performance analytics using expected close dates.
         """
-        queryset = Sale.objects.all()
+        # Day-aligned requests are answered from the rollup cube instead of the raw table
+        use_cube = RollupCube.can_answer(date_range)
+        all_sales = SaleFact.objects.all() if use_cube else Sale.objects.all()
+        queryset = all_sales
         
         # If target_user is specified, filter by that user (for managers viewing specific user data)
         if target_user:
@@ -51,101 +64,62 @@ class AnalyticsService:
             # For staff/managers, show all data anyway
             pass
         
-        if date_range:
-            start_date = date_range.get('start')
-            end_date = date_range.get('end')
-            if start_date:
-                # Use expected_close_date for filtering, with fallback to created_at
-                queryset = queryset.filter(
-                    Q(expected_close_date__gte=start_date) | 
-                    Q(expected_close_date__isnull=True, created_at__gte=start_date)
-                )
-            if end_date:
-                # Use expected_close_date for filtering, with fallback to created_at
-                queryset = queryset.filter(
-                    Q(expected_close_date__lte=end_date) | 
-                    Q(expected_close_date__isnull=True, created_at__lte=end_date)
-                )
-
-        # Group by time period
-        if grouping == 'day':
-            trunc_func = TruncDate
-        elif grouping == 'week':
-            trunc_func = TruncWeek
-        else:  # month
-            trunc_func = TruncMonth
-
-        # Sales over time using expected_close_date with fallback to created_at
-        sales_over_time = queryset.annotate(
-            period=Case(
-                When(expected_close_date__isnull=False, then=trunc_func('expected_close_date')),
-                default=trunc_func('created_at'),
-                output_field=DateTimeField()
+        if use_cube:
+            # Fact days already hold the expected close date, or the creation date as fallback
+            queryset = RollupCube.filter_sale_days(queryset, date_range)
+            series = TimeSeriesBuilder(grouping).build(
+                queryset, SALES_SERIES.for_facts(), field='day', date_range=date_range
+            )
+        else:
+            queryset = AnalyticsService._filter_sales_by_date(queryset, date_range)
+            # Sales over time using expected_close_date with fallback to created_at
+            series = TimeSeriesBuilder(grouping).build(
+                queryset,
+                SALES_SERIES,
+                field='expected_close_date',
+                fallback_field='created_at',
+                date_range=date_range
             )
-        ).values('period').annotate(
-            count=Count('id'),
-            total_amount=Sum('amount')
-        ).order_by('period')
+
+        breakdown = AnalyticsService._metric_set(SALES_SERIES, use_cube)
 
         # Sales by status
         sales_by_status = queryset.values('status').annotate(
-            count=Count('id'),
-            total_amount=Sum('amount')
+            **breakdown.expressions()
         ).order_by('status')
 
         # Sales by priority
         sales_by_priority = queryset.values('priority').annotate(
-            count=Count('id'),
-            total_amount=Sum('amount')
+            **breakdown.expressions()
         ).order_by('priority')
 
         # Top performing sales people - only for managers/admins
         top_performers = []
         if not target_user:  # Only show if not filtering by specific user
-            top_performers = Sale.objects.filter(
+            top_performers = all_sales.filter(
                 assigned_to__isnull=False
             ).values('assigned_to__username', 'assigned_to__first_name', 'assigned_to__last_name').annotate(
-                total_sales=Count('id'),
-                total_amount=Sum('amount'),
-                won_sales=Count('id', filter=Q(status='WON')),
-                lost_sales=Count('id', filter=Q(status='LOST'))
+                **AnalyticsService._metric_set(SALES_PERFORMANCE, use_cube).expressions()
             ).order_by('-total_amount')[:10]
 
+        summary = AnalyticsService._metric_set(SALES_KPIS, use_cube).compute(queryset)
+
         # Personal performance data for individual users
         personal_performance = None
         if target_user:
-            personal_stats = queryset.aggregate(
-                total_sales=Count('id'),
-                total_amount=Sum('amount'),
-                won_sales=Count('id', filter=Q(status='WON')),
-                lost_sales=Count('id', filter=Q(status='LOST'))
-            )
-            
             personal_performance = {
-                'total_sales': personal_stats['total_sales'] or 0,
-                'total_amount': personal_stats['total_amount'] or 0,
-                'won_sales': personal_stats['won_sales'] or 0,
-                'lost_sales': personal_stats['lost_sales'] or 0,
-                'win_rate': (personal_stats['won_sales'] / personal_stats['total_sales'] * 100) if personal_stats['total_sales'] > 0 else 0
+                'total_sales': summary['total_sales'],
+                'total_amount': summary['total_amount'],
+                'won_sales': summary['won_sales'],
+                'lost_sales': summary['lost_sales'],
+                'win_rate': percentage(summary['won_sales'], summary['total_sales'])
             }
 
-        # Calculate summary statistics
-        total_sales = queryset.count()
-        total_amount = queryset.aggregate(Sum('amount'))['amount__sum'] or 0
-        won_sales = queryset.filter(status='WON').count()
-        
         result = {
-            'sales_over_time': list(sales_over_time),
+            'sales_over_time': list(series),
             'sales_by_status': list(sales_by_status),
             'sales_by_priority': list(sales_by_priority),
-            'summary': {
-                'total_sales': total_sales,
-                'total_amount': total_amount,
-                'won_sales': won_sales,
-                'lost_sales': queryset.filter(status='LOST').count(),
-                'win_rate': (won_sales / total_sales * 100) if total_sales > 0 else 0,
-                'average_deal_size': (total_amount / total_sales) if total_sales > 0 else 0,
-            }
+            'summary': AnalyticsService._sales_summary(summary),
         }
         
         # Add appropriate performance data based on user type
@@ -175,61 +149,48 @@ class AnalyticsService:
             # For staff/managers, show all data anyway
             pass
         
-        if date_range:
-            start_date = date_range.get('start')
-            end_date = date_range.get('end')
-            if start_date:
-                queryset = queryset.filter(created_at__gte=start_date)
-            if end_date:
-                queryset = queryset.filter(created_at__lte=end_date)
+        queryset = AnalyticsService._filter_by_created(queryset, date_range)
 
-        # Group by time period
-        if grouping == 'day':
-            trunc_func = TruncDate
-        elif grouping == 'week':
-            trunc_func = TruncWeek
-        else:  # month
-            trunc_func = TruncMonth
+        # Breakdowns come from the rollup cube for day-aligned requests
+        use_cube = RollupCube.can_answer(date_range)
+        if use_cube:
+            facts = RollupCube.filter_days(CustomerFact.objects.all(), date_range, end_inclusive=False)
+        else:
+            facts = queryset
+        breakdown = AnalyticsService._metric_set(ROW_COUNT, use_cube)
 
         # Customers by engagement level
-        engagement_levels = queryset.values('engagement_level').annotate(
-            count=Count('id')
+        engagement_levels = facts.values('engagement_level').annotate(
+            **breakdown.expressions()
         ).order_by('engagement_level')
 
         # Customers by status
-        customer_status = queryset.values('status').annotate(
-            count=Count('id')
+        customer_status = facts.values('status').annotate(
+            **breakdown.expressions()
         ).order_by('status')
 
         # Customer acquisition over time
-        acquisition_over_time = queryset.annotate(
-            period=trunc_func('created_at')
-        ).values('period').annotate(
-            count=Count('id')
-        ).order_by('period')
+        acquisition_over_time = TimeSeriesBuilder(grouping).build(
+            facts,
+            AnalyticsService._metric_set(ACQUISITION_SERIES, use_cube),
+            field='day' if use_cube else 'created_at',
+            date_range=date_range
+        )
 
         # Regional distribution
-        regional_distribution = queryset.values('region').annotate(
-            count=Count('id')
+        regional_distribution = facts.values('region').annotate(
+            **breakdown.expressions()
         ).order_by('-count')
 
-        # Recent activity (customers with recent contact)
-        recent_cutoff = timezone.now() - timedelta(days=30)
-        recent_activity = queryset.filter(
-            last_contact_date__gte=recent_cutoff.date()
-        ).count()
-
         return convert_decimals_to_float({
             'engagement_levels': list(engagement_levels),
             'customer_status': list(customer_status),
             'acquisition_over_time': list(acquisition_over_time),
             'regional_distribution': list(regional_distribution),
-            'summary': {
-                'total_customers': queryset.count(),
-                'active_customers': queryset.filter(status='ACTIVE').count(),
-                'recent_activity': recent_activity,
-                'vip_customers': queryset.filter(engagement_level='VIP').count(),
-            }
+            # Recent activity depends on last contact dates, which the cube does not track
+            'summary': AnalyticsService._customer_summary(
+                AnalyticsService._customer_summary_metrics().compute(queryset)
+            ),
         })
 
     @staticmethod
@@ -237,7 +198,10 @@ class AnalyticsService:
         """
         Generate task completion analytics.
         """
-        queryset = Task.objects.all()
+        # Day-aligned requests are answered from the rollup cube instead of the raw table
+        use_cube = RollupCube.can_answer(date_range)
+        all_tasks = TaskFact.objects.all() if use_cube else Task.objects.all()
+        queryset = all_tasks
         
         # If target_user is specified, filter by that user (for managers viewing specific user data)
         if target_user:
@@ -253,81 +217,35 @@ class AnalyticsService:
             # For staff/managers, show all data anyway
             pass
         
-        if date_range:
-            start_date = date_range.get('start')
-            end_date = date_range.get('end')
-            if start_date:
-                queryset = queryset.filter(created_at__gte=start_date)
-            if end_date:
-                queryset = queryset.filter(created_at__lte=end_date)
-
-        # Group by time period
-        if grouping == 'day':
-            trunc_func = TruncDate
-        elif grouping == 'week':
-            trunc_func = TruncWeek
-        else:  # month
-            trunc_func = TruncMonth
+        if use_cube:
+            queryset = RollupCube.filter_days(queryset, date_range, end_inclusive=False)
+        else:
+            queryset = AnalyticsService._filter_by_created(queryset, date_range)
+        breakdown = AnalyticsService._metric_set(ROW_COUNT, use_cube)
 
         # Tasks by status
         tasks_by_status = queryset.values('status').annotate(
-            count=Count('id')
+            **breakdown.expressions()
         ).order_by('status')
 
         # Tasks by priority
         tasks_by_priority = queryset.values('priority').annotate(
-            count=Count('id')
+            **breakdown.expressions()
         ).order_by('priority')
 
-        # Task completion over time with status breakdown
-        # Get all time periods where tasks exist
-        all_periods = queryset.annotate(
-            period=trunc_func('created_at')
-        ).values('period').distinct().order_by('period')
-        
-        completion_over_time = []
-        for period_data in all_periods:
-            period = period_data['period']
-            
-            # Calculate the end of the period based on grouping
-            if grouping == 'month':
-                # Add one month
-                if period.month == 12:
-                    period_end = period.replace(year=period.year + 1, month=1)
-                else:
-                    period_end = period.replace(month=period.month + 1)
-            elif grouping == 'week':
-                period_end = period + timedelta(weeks=1)
-            else:  # day
-                period_end = period + timedelta(days=1)
-            
-            # Get tasks for this period
-            period_tasks = queryset.filter(
-                created_at__gte=period,
-                created_at__lt=period_end
-            )
-            
-            completion_over_time.append({
-                'period': period,
-                'completed': period_tasks.filter(status='C').count(),
-                'pending': period_tasks.filter(status='P').count(),
-                'overdue': period_tasks.filter(status='O').count(),
-                'in_progress': period_tasks.filter(status='IP').count(),
-                'total': period_tasks.count()
-            })
-
-        # Overdue tasks
-        overdue_tasks = queryset.filter(
-            status='O'
-        ).count()
+        # Task completion over time with status breakdown, one grouped query for all periods
+        completion_over_time = TimeSeriesBuilder(grouping).build(
+            queryset,
+            AnalyticsService._metric_set(COMPLETION_SERIES, use_cube),
+            field='day' if use_cube else 'created_at',
+            date_range=date_range
+        )
 
         # User performance - only for managers/admins
         user_performance = []
         if not target_user:  # Only show if not filtering by specific user
-            user_performance = Task.objects.values('assigned_to__username', 'assigned_to__first_name', 'assigned_to__last_name').annotate(
-                total_tasks=Count('id'),
-                completed_tasks=Count('id', filter=Q(status='C')),
-                overdue_tasks=Count('id', filter=Q(status='O'))
+            user_performance = all_tasks.values('assigned_to__username', 'assigned_to__first_name', 'assigned_to__last_name').annotate(
+                **AnalyticsService._metric_set(TASK_PERFORMANCE, use_cube).expressions()
             ).order_by('-completed_tasks')[:10]
 
             # Add completion rate calculation
@@ -337,39 +255,24 @@ class AnalyticsService:
                 else:
                     user_data['completion_rate'] = 0
 
+        summary = AnalyticsService._metric_set(TASK_KPIS, use_cube).compute(queryset)
+
         # Personal performance data for individual users
         personal_performance = None
         if target_user:
-            personal_stats = queryset.aggregate(
-                total_tasks=Count('id'),
-                completed_tasks=Count('id', filter=Q(status='C')),
-                pending_tasks=Count('id', filter=Q(status='P')),
-                overdue_tasks=Count('id', filter=Q(status='O'))
-            )
-            
             personal_performance = {
-                'total_tasks': personal_stats['total_tasks'] or 0,
-                'completed_tasks': personal_stats['completed_tasks'] or 0,
-                'pending_tasks': personal_stats['pending_tasks'] or 0,
-                'overdue_tasks': personal_stats['overdue_tasks'] or 0,
-                'completion_rate': (personal_stats['completed_tasks'] / personal_stats['total_tasks'] * 100) if personal_stats['total_tasks'] > 0 else 0
+                'total_tasks': summary['total_tasks'],
+                'completed_tasks': summary['status_C'],
+                'pending_tasks': summary['status_P'],
+                'overdue_tasks': summary['status_O'],
+                'completion_rate': percentage(summary['status_C'], summary['total_tasks'])
             }
 
-        # Calculate summary statistics
-        total_tasks = queryset.count()
-        completed_tasks = queryset.filter(status='C').count()
-
         result = {
             'tasks_by_status': list(tasks_by_status),
             'tasks_by_priority': list(tasks_by_priority),
             'completion_over_time': list(completion_over_time),
-            'summary': {
-                'total_tasks': total_tasks,
-                'completed_tasks': completed_tasks,
-                'pending_tasks': queryset.filter(status='P').count(),
-                'overdue_tasks': overdue_tasks,
-                'completion_rate': (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0,
-            }
+            'summary': AnalyticsService._task_summary(summary),
         }
         
         # Add appropriate performance data based on user type
@@ -440,24 +343,41 @@ class AnalyticsService:
         # Get all users
         users_queryset = User.objects.filter(is_active=True)
 
+        # One grouped query per model covers every user at once
+        if RollupCube.can_answer(date_range):
+            sales_by_user = SALES_KPIS.for_facts().compute_grouped(
+                RollupCube.filter_sale_days(SaleFact.objects.all(), date_range), 'assigned_to'
+            )
+            tasks_by_user = TASK_KPIS.for_facts().compute_grouped(
+                RollupCube.filter_days(TaskFact.objects.all(), date_range, end_inclusive=False), 'assigned_to'
+            )
+        else:
+            sales_by_user = SALES_KPIS.compute_grouped(
+                AnalyticsService._filter_sales_by_date(Sale.objects.all(), date_range), 'assigned_to'
+            )
+            tasks_by_user = TASK_KPIS.compute_grouped(
+                AnalyticsService._filter_by_created(Task.objects.all(), date_range), 'assigned_to'
+            )
+        customer_metrics = AnalyticsService._customer_summary_metrics()
+        customers_by_user = customer_metrics.compute_grouped(
+            AnalyticsService._filter_by_created(Customer.objects.all(), date_range), 'owner'
+        )
+
         user_stats = []
         for user in users_queryset:
-            # Sales activity
-            sales_data = AnalyticsService.get_sales_performance_data(user=user, date_range=date_range)
-            
-            # Task activity
-            task_data = AnalyticsService.get_task_completion_data(user=user, date_range=date_range)
-            
-            # Customer activity
-            customer_data = AnalyticsService.get_customer_engagement_data(user=user, date_range=date_range)
-
             user_stats.append({
                 'user_id': user.id,
                 'username': user.username,
                 'full_name': f"{user.first_name} {user.last_name}".strip() or user.username,
-                'sales_summary': sales_data['summary'],
-                'task_summary': task_data['summary'],
-                'customer_summary': customer_data['summary'],
+                'sales_summary': AnalyticsService._sales_summary(
+                    sales_by_user.get(user.id, SALES_KPIS.defaults())
+                ),
+                'task_summary': AnalyticsService._task_summary(
+                    tasks_by_user.get(user.id, TASK_KPIS.defaults())
+                ),
+                'customer_summary': AnalyticsService._customer_summary(
+                    customers_by_user.get(user.id, customer_metrics.defaults())
+                ),
                 'last_login': user.last_login,
             })
 
@@ -471,93 +391,220 @@ class AnalyticsService:
             }
         })
 
+    # Reports whose data never depends on who asks, unless a target user is given
+    SHARED_REPORTS = (
+        'sales_performance', 'customer_engagement', 'task_completion',
+        'user_activity', 'user_sales_performance', 'user_task_performance',
+    )
+
+    @staticmethod
+    def get_cache_scope(report_type, user, target_user_id=None):
+        """
+        Return the data scope of a report for this user: 'global' or 'user:<id>'.
+
+        Users whose requests resolve to the same scope see identical data and
+        can share one cache entry. This mirrors the filtering done by the
+        report methods themselves.
+        """
+        if target_user_id:
+            return f'user:{target_user_id}'
+        if report_type in AnalyticsService.SHARED_REPORTS:
+            return 'global'
+        if report_type in ('dashboard_kpis', 'pipeline_forecast') and not AnalyticsService._restricted_to_own_data(user):
+            return 'global'
+        # Conversion ratios, and the dashboard and forecast for regular users, only cover the user's own records
+        return f'user:{user.id}'
+
+    @staticmethod
+    def _restricted_to_own_data(user):
+        """Check whether dashboard figures for this user only cover their own records."""
+        return bool(user) and hasattr(user, 'role') and user.role == 'USER'
+
+    @staticmethod
+    def _metric_set(metrics, use_cube):
+        """Return metrics as declared, or their rollup fact equivalent."""
+        return metrics.for_facts() if use_cube else metrics
+
+    @staticmethod
+    def _filter_sales_by_date(queryset, date_range):
+        """Filter sales by expected close date, falling back to created_at."""
+        if date_range:
+            start_date = date_range.get('start')
+            end_date = date_range.get('end')
+            if start_date:
+                queryset = queryset.filter(
+                    Q(expected_close_date__gte=start_date) | 
+                    Q(expected_close_date__isnull=True, created_at__gte=start_date)
+                )
+            if end_date:
+                queryset = queryset.filter(
+                    Q(expected_close_date__lte=end_date) | 
+                    Q(expected_close_date__isnull=True, created_at__lte=end_date)
+                )
+        return queryset
+
+    @staticmethod
+    def _filter_by_created(queryset, date_range):
+        """Filter a queryset by its created_at timestamp."""
+        if date_range:
+            start_date = date_range.get('start')
+            end_date = date_range.get('end')
+            if start_date:
+                queryset = queryset.filter(created_at__gte=start_date)
+            if end_date:
+                queryset = queryset.filter(created_at__lte=end_date)
+        return queryset
+
+    @staticmethod
+    def _customer_summary_metrics():
+        """Customer KPIs plus recent activity (customers contacted in the last 30 days)."""
+        recent_cutoff = timezone.now() - timedelta(days=30)
+        return CUSTOMER_KPIS.extend(
+            Metric('recent_activity', filter=Q(last_contact_date__gte=recent_cutoff.date())),
+        )
+
+    @staticmethod
+    def _sales_summary(values):
+        """Build the sales summary block from SALES_KPIS values."""
+        total_sales = values['total_sales']
+        total_amount = values['total_amount']
+        return {
+            'total_sales': total_sales,
+            'total_amount': total_amount,
+            'won_sales': values['won_sales'],
+            'lost_sales': values['lost_sales'],
+            'win_rate': percentage(values['won_sales'], total_sales),
+            'average_deal_size': (total_amount / total_sales) if total_sales > 0 else 0,
+        }
+
+    @staticmethod
+    def _task_summary(values):
+        """Build the task summary block from TASK_KPIS values."""
+        return {
+            'total_tasks': values['total_tasks'],
+            'completed_tasks': values['status_C'],
+            'pending_tasks': values['status_P'],
+            'overdue_tasks': values['status_O'],
+            'completion_rate': percentage(values['status_C'], values['total_tasks']),
+        }
+
+    @staticmethod
+    def _customer_summary(values):
+        """Build the customer summary block from customer summary metric values."""
+        return {
+            'total_customers': values['total_customers'],
+            'active_customers': values['status_ACTIVE'],
+            'recent_activity': values['recent_activity'],
+            'vip_customers': values['vip_customers'],
+        }
+
     @staticmethod
     def get_dashboard_kpis(user=None):
         """
         Get key performance indicators for dashboard widgets with role-based filtering.
+
+        Each section carries a trends block comparing the trailing trend window
+        with the window before it, computed in the same aggregate as the totals.
+        The totals themselves are all-time, so they have no previous values.
         """
         kpis = {}
 
+        # Current and previous trend windows
+        window = timedelta(days=settings.ANALYTICS_SETTINGS.get('TREND_WINDOW_DAYS', 30))
+        current_start = timezone.now() - window
+        previous_start = current_start - window
+
         # Sales KPIs - All time data with role-based filtering
         all_sales = Sale.objects.all()
-        if user:
-            # Apply role-based filtering for USER role
-            if hasattr(user, 'role') and user.role == 'USER':
-                all_sales = all_sales.filter(assigned_to=user)
-            # ADMIN and MANAGER can see all sales
-
-        total_sales = all_sales.count()
-        total_amount = all_sales.aggregate(Sum('amount'))['amount__sum'] or 0
-        won_sales = all_sales.filter(status='WON').count()
-        won_amount = all_sales.filter(status='WON').aggregate(Sum('amount'))['amount__sum'] or 0
+        # Apply role-based filtering for USER role; ADMIN and MANAGER can see all sales
+        if AnalyticsService._restricted_to_own_data(user):
+            all_sales = all_sales.filter(assigned_to=user)
+
+        sales = SALES_KPIS.extend(
+            *SALES_TRENDS.windows('created_at', current_start, previous_start).metrics
+        ).compute(all_sales)
+        total_sales = sales['total_sales']
+        total_amount = sales['total_amount']
+        won_sales = sales['won_sales']
+
+        sales_trends = AnalyticsService._trends(sales, SALES_TRENDS)
+        sales_trends['win_rate'] = trend(
+            percentage(sales['current_won_sales'], sales['current_total_sales']),
+            percentage(sales['previous_won_sales'], sales['previous_total_sales'])
+        )
 
         kpis['sales'] = {
             'total_sales': total_sales,
             'total_amount': float(total_amount),
             'won_sales': won_sales,
-            'won_amount': float(won_amount),
-            'win_rate': (won_sales / total_sales * 100) if total_sales > 0 else 0,
-            'pipeline_value': float(all_sales.exclude(status__in=['WON', 'LOST']).aggregate(Sum('amount'))['amount__sum'] or 0),
-            # Add previous period data for trend calculation (mock for now)
-            'previous_amount': float(total_amount) * 0.9,  # Mock 10% less than current
-            'previous_win_rate': max(0, (won_sales / total_sales * 100) - 5) if total_sales > 0 else 0  # Mock 5% less
+            'won_amount': float(sales['won_amount']),
+            'win_rate': percentage(won_sales, total_sales),
+            'pipeline_value': float(sales['pipeline_value']),
+            'trends': sales_trends,
         }
 
         # Task KPIs - All time data with role-based filtering  
         all_tasks = Task.objects.all()
-        if user:
-            # Apply role-based filtering for USER role
-            if hasattr(user, 'role') and user.role == 'USER':
-                all_tasks = all_tasks.filter(assigned_to=user)
-            # ADMIN and MANAGER can see all tasks
+        # Apply role-based filtering for USER role; ADMIN and MANAGER can see all tasks
+        if AnalyticsService._restricted_to_own_data(user):
+            all_tasks = all_tasks.filter(assigned_to=user)
 
-        total_tasks = all_tasks.count()
-        completed_tasks = all_tasks.filter(status='C').count()
-        completion_rate = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+        tasks = TASK_KPIS.extend(
+            *TASK_CREATION_TRENDS.windows('created_at', current_start, previous_start).metrics,
+            *TASK_COMPLETION_TRENDS.windows('updated_at', current_start, previous_start).metrics
+        ).compute(all_tasks)
+        total_tasks = tasks['total_tasks']
+        completed_tasks = tasks['status_C']
+
+        task_trends = AnalyticsService._trends(tasks, TASK_CREATION_TRENDS)
+        task_trends.update(AnalyticsService._trends(tasks, TASK_COMPLETION_TRENDS))
 
         kpis['tasks'] = {
             'total_tasks': total_tasks,
-            'pending_tasks': all_tasks.filter(status='P').count(),
-            'in_progress_tasks': all_tasks.filter(status='IP').count(),
+            'pending_tasks': tasks['status_P'],
+            'in_progress_tasks': tasks['status_IP'],
             'completed_tasks': completed_tasks,
-            'overdue_tasks': all_tasks.filter(status='O').count(),
-            'completion_rate': completion_rate,
-            # Add previous period data for trend calculation (mock for now)
-            'previous_completed': max(0, completed_tasks - 2),  # Mock 2 less than current
+            'overdue_tasks': tasks['status_O'],
+            'completion_rate': percentage(completed_tasks, total_tasks),
+            'trends': task_trends,
         }
 
         # Customer KPIs - All time data with role-based filtering
         all_customers = Customer.objects.all()
-        if user:
-            # Apply role-based filtering for USER role
-            if hasattr(user, 'role') and user.role == 'USER':
-                filtered_customers = all_customers.filter(owner=user)
-            else:
-                # ADMIN and MANAGER can see all customers
-                filtered_customers = all_customers
+        # Apply role-based filtering for USER role; ADMIN and MANAGER can see all customers
+        if AnalyticsService._restricted_to_own_data(user):
+            filtered_customers = all_customers.filter(owner=user)
         else:
             filtered_customers = all_customers
 
-        total_customers = filtered_customers.count()
-        active_customers = filtered_customers.filter(status='ACTIVE').count()
-        
-        # Calculate new customers this month
+        # New customers this month is computed in the same aggregate pass
         current_month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        new_this_month = filtered_customers.filter(created_at__gte=current_month_start).count()
+        customers = CUSTOMER_KPIS.extend(
+            Metric('new_this_month', filter=Q(created_at__gte=current_month_start)),
+            *CUSTOMER_TRENDS.windows('created_at', current_start, previous_start).metrics
+        ).compute(filtered_customers)
+        total_customers = customers['total_customers']
 
         kpis['customers'] = {
             'total_customers': total_customers,
-            'active_customers': active_customers,
-            'prospects': filtered_customers.filter(status='PROSPECT').count(),
-            'leads': filtered_customers.filter(status='LEAD').count(),
-            'vip_customers': filtered_customers.filter(engagement_level='VIP').count(),
-            'new_this_month': new_this_month,
-            # Add previous period data for trend calculation (mock for now)
-            'previous_customers': max(0, total_customers - 3),  # Mock 3 less than current
+            'active_customers': customers['status_ACTIVE'],
+            'prospects': customers['status_PROSPECT'],
+            'leads': customers['status_LEAD'],
+            'vip_customers': customers['vip_customers'],
+            'new_this_month': customers['new_this_month'],
+            'trends': AnalyticsService._trends(customers, CUSTOMER_TRENDS),
         }
 
         return convert_decimals_to_float(kpis)
 
+    @staticmethod
+    def _trends(values, metrics):
+        """Pair the current_/previous_ values of windowed metrics into trend entries."""
+        return {
+            metric.name: trend(values[f'current_{metric.name}'], values[f'previous_{metric.name}'])
+            for metric in metrics.metrics
+        }
+
     @staticmethod
     def get_user_sales_performance():
         """
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ReportingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reporting'
+
+    def ready(self):
+        # Import signal handlers that keep the rollup cube up to date
+        from . import signals
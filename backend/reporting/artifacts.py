@@ -0,0 +1,221 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import parse_etags
+
+logger = logging.getLogger('reporting')
+
+
+class ReportArtifactStore:
+    """
+    Rendered report exports, stored once under MEDIA_ROOT and served from disk.
+
+    Files are content addressed: the name holds a hash of everything the
+    rendering depends on, so a stored file never goes stale. A report whose
+    data changes simply gets a new file, and the old one rendered with the
+    same options is removed. The name starts with a key of those options, so
+    e.g. PDFs with and without charts are kept side by side.
+    """
+    FORMATS = {
+        'csv': ('csv_file_path', 'text/csv'),
+        'pdf': ('pdf_file_path', 'application/pdf'),
+    }
+    RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+    UNSATISFIABLE = 'unsatisfiable'
+
+    @staticmethod
+    def root():
+        return os.path.join(
+            settings.MEDIA_ROOT, settings.ANALYTICS_SETTINGS.get('REPORT_ARTIFACT_DIR', 'report_artifacts')
+        )
+
+    @staticmethod
+    def data_digest(report):
+        """
+        Digest of the report's data, stored when the report completed.
+
+        Reports stored without one get it computed from their data once.
+        """
+        if not report.data_digest:
+            digest = type(report).pack_data(report.data_dict)['data_digest']
+            type(report).objects.filter(pk=report.pk).update(data_digest=digest)
+            report.data_digest = digest
+        return report.data_digest
+
+    @staticmethod
+    def content_hash(report, fmt, options=None):
+        """Hash of the inputs a rendered export depends on, without loading the report data."""
+        key_data = json.dumps({
+            'format': fmt,
+            'options': options or {},
+            'data': ReportArtifactStore.data_digest(report),
+            'template_name': report.template.name,
+            'report_type': report.template.report_type,
+            'generated_at': report.completed_at or report.created_at,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    @staticmethod
+    def options_key(fmt, options=None):
+        """Filename prefix shared by every export of a report in fmt rendered with options."""
+        options_hash = hashlib.sha256(json.dumps(options or {}, sort_keys=True).encode()).hexdigest()
+        return f'{fmt}-{options_hash[:12]}-'
+
+    @staticmethod
+    def locate(report, fmt, options=None):
+        """Return (absolute path, content hash) the report's current export in fmt is stored under."""
+        digest = ReportArtifactStore.content_hash(report, fmt, options)
+        filename = f'{ReportArtifactStore.options_key(fmt, options)}{digest}.{fmt}'
+        return os.path.join(ReportArtifactStore.root(), str(report.pk), filename), digest
+
+    @staticmethod
+    def get_or_render(report, fmt, render, options=None):
+        """
+        Return (absolute path, content hash) of the report's export in fmt.
+
+        render() is called only when no file exists for the current content;
+        it returns the file contents as str or bytes. options holds any
+        rendering choices that change the output.
+        """
+        path_field, _ = ReportArtifactStore.FORMATS[fmt]
+        path, digest = ReportArtifactStore.locate(report, fmt, options)
+        if os.path.exists(path):
+            return path, digest
+        report_dir = os.path.dirname(path)
+
+        content = render()
+        if isinstance(content, str):
+            content = content.encode()
+        os.makedirs(report_dir, exist_ok=True)
+        # Write under a temporary name so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=report_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(content)
+        os.replace(tmp_path, path)
+
+        ReportArtifactStore._remove_superseded(report_dir, ReportArtifactStore.options_key(fmt, options), path)
+        relative_path = os.path.relpath(path, settings.MEDIA_ROOT)
+        type(report).objects.filter(pk=report.pk).update(**{path_field: relative_path})
+        setattr(report, path_field, relative_path)
+        return path, digest
+
+    @staticmethod
+    def delete(report_id):
+        """Remove every stored export of a report."""
+        shutil.rmtree(os.path.join(ReportArtifactStore.root(), str(report_id)), ignore_errors=True)
+
+    @staticmethod
+    def serve(request, fetch, fmt, filename):
+        """
+        Serve a stored export with a strong ETag, conditional GET and single byte ranges.
+
+        fetch() returns (path, content hash) of the export, rendering it if
+        needed. It is called again if the file is removed before it is opened,
+        e.g. by a newer rendering or the artifact sweep.
+        """
+        _, content_type = ReportArtifactStore.FORMATS[fmt]
+        path, digest = fetch()
+        etag = f'"{digest}"'
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponse(status=304)
+            response['ETag'] = etag
+            return response
+
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            path, digest = fetch()
+            etag = f'"{digest}"'
+            file = open(path, 'rb')
+        # Once open, the file can be read in full even if it is removed meanwhile
+        size = os.fstat(file.fileno()).st_size
+
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        # A stale If-Range means the client's partial copy is outdated: send everything
+        if range_header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+            byte_range = ReportArtifactStore._parse_range(range_header, size)
+            if byte_range == ReportArtifactStore.UNSATISFIABLE:
+                file.close()
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        if byte_range:
+            start, end = byte_range
+            file.seek(start)
+            response = FileResponse(
+                _BoundedReader(file, end - start + 1), status=206, content_type=content_type,
+                as_attachment=True, filename=filename
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = FileResponse(file, content_type=content_type, as_attachment=True, filename=filename)
+        response['ETag'] = etag
+        response['Accept-Ranges'] = 'bytes'
+        response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+        return response
+
+    @staticmethod
+    def _parse_range(header, size):
+        """
+        Parse a single 'bytes=' range into inclusive (start, end).
+
+        Returns None for headers to ignore (malformed or several ranges), so the
+        whole file is sent, and UNSATISFIABLE for a valid range outside the file.
+        """
+        match = ReportArtifactStore.RANGE_RE.match(header.strip())
+        if not match or match.groups() == ('', ''):
+            return None
+        start, end = match.groups()
+        if start == '':
+            # Suffix range: the last N bytes
+            length = int(end)
+            if length == 0 or size == 0:
+                return ReportArtifactStore.UNSATISFIABLE
+            return max(size - length, 0), size - 1
+        start = int(start)
+        if end and int(end) < start:
+            return None
+        if start >= size:
+            return ReportArtifactStore.UNSATISFIABLE
+        return start, min(int(end), size - 1) if end else size - 1
+
+    @staticmethod
+    def _remove_superseded(report_dir, prefix, current_path):
+        for name in os.listdir(report_dir):
+            path = os.path.join(report_dir, name)
+            if name.startswith(prefix) and path != current_path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    logger.warning('Could not remove superseded report artifact %s', path)
+
+
+class _BoundedReader:
+    """Read at most length bytes from a file, for serving byte ranges."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,303 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+
+logger = logging.getLogger('reporting')
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache with per-entry expiry.
+
+    Expired entries are kept until they are evicted so they can still be
+    served as a previous value while a fresh one is being computed.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, allow_expired=False):
+        """Return (found, value); expired entries only count when allow_expired is set."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.monotonic() and not allow_expired:
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CacheStats:
+    """Thread-safe counters describing how cache lookups were served."""
+    COUNTERS = (
+        'local_hits', 'shared_hits', 'misses', 'coalesced_waits', 'stale_served', 'wait_timeouts',
+        'refreshes_queued', 'refreshes_skipped', 'refresh_errors',
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def incr(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts = {name: 0 for name in self.COUNTERS}
+
+
+class CachedValue:
+    """A cached payload with the time it was computed and the end of its soft TTL."""
+
+    def __init__(self, value, computed_at, fresh_until, state='fresh'):
+        self.value = value
+        self.computed_at = computed_at
+        self.fresh_until = fresh_until
+        # How this lookup was served: fresh, stale or computed
+        self.state = state
+
+    @property
+    def age(self):
+        """Seconds since the payload was computed."""
+        return max(0, int(time.time() - self.computed_at))
+
+    @property
+    def is_fresh(self):
+        return time.time() < self.fresh_until
+
+    def to_dict(self):
+        return {'value': self.value, 'computed_at': self.computed_at, 'fresh_until': self.fresh_until}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an entry read from the shared cache; anything else counts as a miss."""
+        if not isinstance(data, dict) or 'fresh_until' not in data:
+            return None
+        return cls(data['value'], data['computed_at'], data['fresh_until'])
+
+
+class TieredCache:
+    """
+    Two-level cache: a per-process LocalCache in front of Django's shared cache.
+
+    Entries have a soft and a hard TTL. Until the soft TTL they are served as
+    fresh. Between the soft and hard TTL they are served stale straight away
+    while a bounded background pool recomputes them. Past the hard TTL they
+    are gone and the caller has to wait for a recomputation.
+
+    Misses are single-flight. Within a process, concurrent callers for the
+    same key wait for the first one; across processes a short-lived lock key
+    in the shared cache elects one worker to compute while the others poll
+    for its result. Waiters that still hold an expired local copy get that
+    instead of waiting.
+    """
+    LOCK_SUFFIX = ':lock'
+    REFRESH_SUFFIX = ':refresh'
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, max_entries=256, local_ttl=30, lock_timeout=30, wait_timeout=10,
+                 refresh_workers=2, max_pending_refreshes=16):
+        self.local = LocalCache(max_entries)
+        self.local_ttl = local_ttl
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.stats = CacheStats()
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._refresh_slots = threading.BoundedSemaphore(max_pending_refreshes)
+        self._refreshing = set()
+        self._refresh_workers = refresh_workers
+        self._refresh_pool = None
+
+    def get(self, key):
+        """Return the cached value for key, fresh or stale, or None."""
+        entry = self._lookup(key)
+        return entry.value if entry else None
+
+    def set(self, key, value, soft_ttl, hard_ttl=None):
+        """Store value as fresh for soft_ttl seconds and keep it, stale, until hard_ttl."""
+        hard_ttl = max(hard_ttl or soft_ttl, soft_ttl)
+        now = time.time()
+        entry = CachedValue(value, now, now + soft_ttl, state='computed')
+        cache.set(key, entry.to_dict(), hard_ttl)
+        self.local.set(key, entry, min(hard_ttl, self.local_ttl))
+        return entry
+
+    def get_or_compute(self, key, compute, soft_ttl, hard_ttl=None):
+        """
+        Return a CachedValue for key, computing it at most once per key at a time.
+
+        Stale entries are returned immediately and refreshed in the background.
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            if entry.is_fresh:
+                return entry
+            self.stats.incr('stale_served')
+            self._schedule_refresh(key, compute, soft_ttl, hard_ttl)
+            entry.state = 'stale'
+            return entry
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = threading.Event()
+
+        if not leader:
+            return self._follow(key, flight, compute, soft_ttl, hard_ttl)
+
+        try:
+            return self._lead(key, compute, soft_ttl, hard_ttl)
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.set()
+
+    def _lookup(self, key):
+        """Find an unexpired entry locally, then in the shared cache, preferring fresh ones."""
+        found, entry = self.local.get(key)
+        if found and entry.is_fresh:
+            self.stats.incr('local_hits')
+            return CachedValue(entry.value, entry.computed_at, entry.fresh_until)
+
+        # A stale local copy may already have been refreshed by another process
+        shared = CachedValue.from_dict(cache.get(key))
+        if shared is not None:
+            self.stats.incr('shared_hits')
+            self.local.set(key, shared, self.local_ttl)
+            return shared
+        if found:
+            return CachedValue(entry.value, entry.computed_at, entry.fresh_until)
+        return None
+
+    def _lead(self, key, compute, soft_ttl, hard_ttl):
+        """Compute the value unless another process already is, then wait for it."""
+        lock_key = key + self.LOCK_SUFFIX
+        # A token of our own, so a lock that expired and was taken over is left alone
+        token = uuid.uuid4().hex
+        locked = cache.add(lock_key, token, self.lock_timeout)
+        if not locked:
+            entry = self._poll_shared(key)
+            if entry is not None:
+                return entry
+            # The other worker gave up or timed out; take the lock if it is free now
+            locked = cache.add(lock_key, token, self.lock_timeout)
+            if not locked:
+                self.stats.incr('wait_timeouts')
+
+        self.stats.incr('misses')
+        try:
+            return self.set(key, compute(), soft_ttl, hard_ttl)
+        finally:
+            if locked and cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    def _follow(self, key, flight, compute, soft_ttl, hard_ttl):
+        """Wait for the in-process leader, serving an expired copy if one is at hand."""
+        found, entry = self.local.get(key, allow_expired=True)
+        if found:
+            self.stats.incr('stale_served')
+            return CachedValue(entry.value, entry.computed_at, entry.fresh_until, state='stale')
+
+        self.stats.incr('coalesced_waits')
+        if flight.wait(self.wait_timeout):
+            found, entry = self.local.get(key)
+            if not found:
+                entry = CachedValue.from_dict(cache.get(key))
+            if entry is not None:
+                return entry
+
+        # The leader failed or is too slow; compute independently
+        self.stats.incr('wait_timeouts')
+        return self.set(key, compute(), soft_ttl, hard_ttl)
+
+    def _poll_shared(self, key):
+        """Poll the shared cache while another process computes key."""
+        self.stats.incr('coalesced_waits')
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.POLL_INTERVAL)
+            entry = CachedValue.from_dict(cache.get(key))
+            if entry is not None:
+                self.local.set(key, entry, self.local_ttl)
+                return entry
+            if cache.get(key + self.LOCK_SUFFIX) is None:
+                # The other worker gave up without storing a value
+                return None
+        return None
+
+    # Background refresh
+
+    def _schedule_refresh(self, key, compute, soft_ttl, hard_ttl):
+        """Queue a background recomputation of key unless one is already running or the pool is full."""
+        with self._flights_lock:
+            if key in self._refreshing:
+                return
+            if not self._refresh_slots.acquire(blocking=False):
+                self.stats.incr('refreshes_skipped')
+                return
+            self._refreshing.add(key)
+
+        # Only one process refreshes a given key
+        if not cache.add(key + self.REFRESH_SUFFIX, 1, self.lock_timeout):
+            self._finish_refresh(key)
+            return
+
+        self.stats.incr('refreshes_queued')
+        self._get_refresh_pool().submit(self._refresh, key, compute, soft_ttl, hard_ttl)
+
+    def _refresh(self, key, compute, soft_ttl, hard_ttl):
+        from django.db import connection
+        try:
+            self.set(key, compute(), soft_ttl, hard_ttl)
+        except Exception:
+            self.stats.incr('refresh_errors')
+            logger.exception('Background refresh of %s failed', key)
+        finally:
+            cache.delete(key + self.REFRESH_SUFFIX)
+            self._finish_refresh(key)
+            # Pool threads must not hold on to their database connections
+            connection.close()
+
+    def _finish_refresh(self, key):
+        with self._flights_lock:
+            self._refreshing.discard(key)
+        self._refresh_slots.release()
+
+    def _get_refresh_pool(self):
+        with self._flights_lock:
+            if self._refresh_pool is None:
+                self._refresh_pool = ThreadPoolExecutor(
+                    max_workers=self._refresh_workers,
+                    thread_name_prefix='analytics-refresh'
+                )
+            return self._refresh_pool
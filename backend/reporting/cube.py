@@ -0,0 +1,292 @@
+from datetime import datetime, date, time
+from decimal import Decimal
+
+from dateutil import parser
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum, F, Q, Value, DecimalField, BooleanField, ExpressionWrapper
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from sales.models import Sale
+from customers.models import Customer
+from tasks.models import Task
+from .models import SaleFact, TaskFact, CustomerFact
+
+
+class RollupCube:
+    """
+    Incrementally maintained daily rollups of sales, tasks and customers.
+
+    Analytics read from the fact tables instead of the raw tables whenever the
+    request can be answered at day granularity, so report cost depends on the
+    number of days and dimension combinations rather than on the row count.
+    """
+    SALE_FIELDS = ('expected_close_date', 'created_at', 'assigned_to_id', 'status', 'priority', 'amount')
+    TASK_FIELDS = ('created_at', 'assigned_to_id', 'status', 'priority')
+    CUSTOMER_FIELDS = ('created_at', 'owner_id', 'status', 'engagement_level', 'region')
+
+    REBUILD_BATCH_SIZE = 1000
+
+    @staticmethod
+    def is_enabled():
+        """Check whether analytics may read from the cube."""
+        return settings.ANALYTICS_SETTINGS.get('USE_ROLLUP_CUBE', True)
+
+    @staticmethod
+    def can_answer(date_range):
+        """
+        Check whether a request over date_range can be answered from day-level facts.
+
+        Bounds must fall on day boundaries (plain dates or midnight timestamps);
+        anything finer has to go to the raw tables.
+        """
+        if not RollupCube.is_enabled():
+            return False
+        if not date_range:
+            return True
+        for bound in (date_range.get('start'), date_range.get('end')):
+            if bound and RollupCube._to_day(bound) is None:
+                return False
+        return True
+
+    @staticmethod
+    def day_bounds(date_range):
+        """Return the (start, end) days of a day-aligned date range; both inclusive."""
+        if not date_range:
+            return None, None
+        start = date_range.get('start')
+        end = date_range.get('end')
+        return (
+            RollupCube._to_day(start) if start else None,
+            RollupCube._to_day(end) if end else None,
+        )
+
+    @staticmethod
+    def filter_days(queryset, date_range, end_inclusive=True):
+        """
+        Restrict a fact queryset to the days of date_range.
+
+        Facts derived from a timestamp pass end_inclusive=False: the raw
+        created_at__lte filter stops at midnight of the end day.
+        """
+        start, end = RollupCube.day_bounds(date_range)
+        if start:
+            queryset = queryset.filter(day__gte=start)
+        if end:
+            queryset = queryset.filter(day__lte=end) if end_inclusive else queryset.filter(day__lt=end)
+        return queryset
+
+    @staticmethod
+    def filter_sale_days(queryset, date_range):
+        """
+        Restrict sale facts to the days of date_range.
+
+        Sales with an expected close date include the end day; undated ones
+        fall back to created_at and, like the raw filter, stop before it.
+        """
+        start, end = RollupCube.day_bounds(date_range)
+        if start:
+            queryset = queryset.filter(day__gte=start)
+        if end:
+            queryset = queryset.filter(Q(undated=False, day__lte=end) | Q(undated=True, day__lt=end))
+        return queryset
+
+    @staticmethod
+    def _to_day(value):
+        """Return the date of a day-aligned bound, or None if the bound has a time of day."""
+        if isinstance(value, str):
+            value = parser.parse(value)
+        if isinstance(value, datetime):
+            if timezone.is_aware(value):
+                value = timezone.localtime(value)
+            if value.time() != time.min:
+                return None
+            return value.date()
+        if isinstance(value, date):
+            return value
+        return None
+
+    # Fact keys
+
+    @staticmethod
+    def sale_key(values, region):
+        """Build the SaleFact key from sale field values."""
+        return {
+            'day': values['expected_close_date'] or timezone.localdate(values['created_at']),
+            'undated': values['expected_close_date'] is None,
+            'assigned_to_id': values['assigned_to_id'],
+            'status': values['status'],
+            'priority': values['priority'],
+            'region': region,
+        }
+
+    @staticmethod
+    def task_key(values):
+        """Build the TaskFact key from task field values."""
+        return {
+            'day': timezone.localdate(values['created_at']),
+            'assigned_to_id': values['assigned_to_id'],
+            'status': values['status'],
+            'priority': values['priority'],
+        }
+
+    @staticmethod
+    def customer_key(values):
+        """Build the CustomerFact key from customer field values."""
+        return {
+            'day': timezone.localdate(values['created_at']),
+            'owner_id': values['owner_id'],
+            'status': values['status'],
+            'engagement_level': values['engagement_level'],
+            'region': values['region'],
+        }
+
+    @staticmethod
+    def field_values(instance, fields):
+        """Read the tracked field values from a model instance."""
+        return {field: getattr(instance, field) for field in fields}
+
+    # Incremental maintenance
+
+    @staticmethod
+    def apply(model, key, count, amount=None):
+        """Add count (and amount) to the fact row for key, creating or removing it as needed."""
+        updates = {'count': F('count') + count}
+        if amount:
+            updates['amount'] = F('amount') + amount
+
+        if model.objects.filter(**key).update(**updates):
+            if count < 0:
+                model.objects.filter(**key, count__lte=0).delete()
+            return
+
+        if count <= 0:
+            return
+
+        defaults = {'count': count}
+        if amount is not None:
+            defaults['amount'] = amount
+        try:
+            with transaction.atomic():
+                model.objects.create(**key, **defaults)
+        except IntegrityError:
+            # Another writer created the row first; fold our delta into it
+            model.objects.filter(**key).update(**updates)
+
+    @staticmethod
+    def move(model, old_key, new_key, old_amount=None, new_amount=None):
+        """
+        Move one source row from old_key to new_key; either key may be None.
+
+        Amounts are only tracked for facts that have an amount column and must
+        be None for the others.
+        """
+        if old_key == new_key:
+            if old_key is not None and new_amount != old_amount:
+                RollupCube.apply(model, new_key, 0, new_amount - old_amount)
+            return
+        if old_key is not None:
+            RollupCube.apply(model, old_key, -1, -old_amount if old_amount is not None else None)
+        if new_key is not None:
+            RollupCube.apply(model, new_key, 1, new_amount)
+
+    @staticmethod
+    def move_many(model, moves):
+        """
+        Apply several moves at once, as (old_key, new_key, old_amount, new_amount) tuples.
+
+        Moves are netted per fact row first, so a bulk change touches each
+        affected row once instead of once per source row.
+        """
+        deltas = {}
+        for old_key, new_key, old_amount, new_amount in moves:
+            if old_key == new_key and old_amount == new_amount:
+                continue
+            for key, count, amount in ((old_key, -1, old_amount), (new_key, 1, new_amount)):
+                if key is None:
+                    continue
+                row = deltas.setdefault(tuple(sorted(key.items())), [0, None])
+                row[0] += count
+                if amount is not None:
+                    row[1] = (row[1] or Decimal('0')) + count * amount
+        for key, (count, amount) in deltas.items():
+            if count or amount:
+                RollupCube.apply(model, dict(key), count, amount)
+
+    # Rebuild
+
+    @staticmethod
+    def rebuild():
+        """Recompute every fact table from the raw tables. Returns row counts per table."""
+        sale_rows = Sale.objects.annotate(
+            fact_day=Coalesce('expected_close_date', TruncDate('created_at')),
+            fact_undated=ExpressionWrapper(Q(expected_close_date__isnull=True), output_field=BooleanField())
+        ).values(
+            'fact_day', 'fact_undated', 'assigned_to_id', 'status', 'priority', 'customer__region'
+        ).annotate(
+            fact_count=Count('id'),
+            fact_amount=Coalesce(Sum('amount'), Value(Decimal('0')), output_field=DecimalField())
+        ).order_by()
+
+        task_rows = Task.objects.annotate(
+            fact_day=TruncDate('created_at')
+        ).values(
+            'fact_day', 'assigned_to_id', 'status', 'priority'
+        ).annotate(fact_count=Count('id')).order_by()
+
+        customer_rows = Customer.objects.annotate(
+            fact_day=TruncDate('created_at')
+        ).values(
+            'fact_day', 'owner_id', 'status', 'engagement_level', 'region'
+        ).annotate(fact_count=Count('id')).order_by()
+
+        with transaction.atomic():
+            SaleFact.objects.all().delete()
+            TaskFact.objects.all().delete()
+            CustomerFact.objects.all().delete()
+
+            sale_facts = RollupCube._bulk_create(SaleFact, (
+                SaleFact(
+                    day=row['fact_day'], undated=row['fact_undated'], assigned_to_id=row['assigned_to_id'],
+                    status=row['status'], priority=row['priority'],
+                    region=row['customer__region'], count=row['fact_count'],
+                    amount=row['fact_amount']
+                ) for row in sale_rows.iterator()
+            ))
+            task_facts = RollupCube._bulk_create(TaskFact, (
+                TaskFact(
+                    day=row['fact_day'], assigned_to_id=row['assigned_to_id'],
+                    status=row['status'], priority=row['priority'],
+                    count=row['fact_count']
+                ) for row in task_rows.iterator()
+            ))
+            customer_facts = RollupCube._bulk_create(CustomerFact, (
+                CustomerFact(
+                    day=row['fact_day'], owner_id=row['owner_id'],
+                    status=row['status'], engagement_level=row['engagement_level'],
+                    region=row['region'], count=row['fact_count']
+                ) for row in customer_rows.iterator()
+            ))
+
+        return {
+            'sales': sale_facts,
+            'tasks': task_facts,
+            'customers': customer_facts,
+        }
+
+    @staticmethod
+    def _bulk_create(model, objects):
+        """Insert facts in fixed-size batches and return the number of rows written."""
+        total = 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= RollupCube.REBUILD_BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+            total += len(batch)
+        return total
@@ -0,0 +1,183 @@
+"""
+Weighted pipeline forecast.
+
+Open deals are weighted by the probability of winning from their current
+stage and summed by expected close month, owner and region.
+
+Stage probabilities are learned from the deals closed in the lookback window.
+Only a deal's current status is stored, not the stages it went through. So
+the smoothed WON/(WON+LOST) ratio r is read as the chance of passing every
+stage gate from NEW onwards, with each of the N gates passed equally often.
+A deal with k gates left then wins with r ** (k / N). Each owner's ratio is
+shrunk towards the global one, so owners with few closed deals are not
+forecast at 0% or 100%.
+
+The database sums the open deals per stage, owner, region and close month.
+Those groups are weighted and broken down over NumPy arrays in one pass.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, FloatField, Q, Sum
+from django.db.models.functions import Cast, ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from sales.models import Sale
+
+FORECAST_SETTINGS = settings.ANALYTICS_SETTINGS.get('FORECAST', {})
+
+# Open stages in pipeline order; the gate after the last one is closing the deal
+OPEN_STAGES = ('NEW', 'CONTACTED', 'PROPOSAL', 'NEGOTIATION')
+CLOSED_STAGES = ('WON', 'LOST')
+UNSCHEDULED = 'unscheduled'
+
+
+class PipelineForecaster:
+    """Builds weighted forecasts of the open pipeline."""
+
+    @staticmethod
+    def forecast(user=None):
+        """
+        Forecast of the open deals the user can see (regular users: their own).
+
+        Returns the learned stage probabilities and the deal count, pipeline
+        value and weighted value per month, owner and region, plus totals.
+        """
+        sales = Sale.objects.all()
+        if user is not None and getattr(user, 'role', None) == 'USER':
+            sales = sales.filter(assigned_to=user)
+
+        rates = PipelineForecaster.win_rates(sales)
+        columns = PipelineForecaster._load_open_deals(sales)
+        breakdowns = PipelineForecaster._aggregate(columns, rates)
+
+        return {
+            'generated_at': timezone.now(),
+            'win_rate': rates['global'],
+            'stage_probabilities': {
+                stage: PipelineForecaster.stage_probability(rates['global'], stage) for stage in OPEN_STAGES
+            },
+            'closed_deals': rates['closed'],
+            **breakdowns,
+        }
+
+    @staticmethod
+    def win_rates(sales):
+        """Smoothed global and per-owner WON/(WON+LOST) ratios over the lookback window."""
+        since = timezone.now() - timedelta(days=FORECAST_SETTINGS.get('LOOKBACK_DAYS', 365))
+        rows = sales.filter(status__in=CLOSED_STAGES, updated_at__gte=since).values('assigned_to_id').annotate(
+            won=Count('id', filter=Q(status='WON')),
+            closed=Count('id'),
+        ).order_by()
+
+        owners = {row['assigned_to_id']: (row['won'], row['closed']) for row in rows}
+        won = sum(value[0] for value in owners.values())
+        closed = sum(value[1] for value in owners.values())
+        # Laplace smoothing keeps an empty history at even odds
+        global_rate = (won + 1) / (closed + 2)
+
+        strength = FORECAST_SETTINGS.get('OWNER_SMOOTHING', 10)
+        return {
+            'global': global_rate,
+            'closed': closed,
+            'owners': {
+                owner_id: (owner_won + strength * global_rate) / (owner_closed + strength)
+                for owner_id, (owner_won, owner_closed) in owners.items()
+            },
+        }
+
+    @staticmethod
+    def stage_probability(rate, stage):
+        """Chance that a deal at stage wins, given the win ratio of deals entering the pipeline."""
+        remaining = len(OPEN_STAGES) - OPEN_STAGES.index(stage)
+        return rate ** (remaining / len(OPEN_STAGES))
+
+    @staticmethod
+    def _load_open_deals(sales):
+        """
+        Open deals on the pipeline board, summed per stage, owner, region and
+        close month as parallel columns.
+
+        A deal's weight only depends on its owner and stage, so weighting these
+        groups gives the same figures as weighting every deal, and the rows
+        loaded grow with the number of groups rather than the number of deals.
+        """
+        rows = sales.filter(status__in=OPEN_STAGES, is_archived=False).annotate(
+            close_year=ExtractYear('expected_close_date'),
+            close_month=ExtractMonth('expected_close_date'),
+        ).values(
+            'status', 'assigned_to_id', 'customer__region', 'close_year', 'close_month'
+        ).annotate(
+            deals=Count('id'),
+            pipeline=Cast(Sum('amount'), FloatField()),
+        ).values_list(
+            'deals', 'pipeline', 'status', 'assigned_to_id', 'customer__region', 'close_year', 'close_month'
+        ).order_by()
+
+        columns = tuple(zip(*rows))
+        return columns or ((), (), (), (), (), (), ())
+
+    @staticmethod
+    def _current_month():
+        today = timezone.localdate()
+        return today.year * 12 + today.month - 1
+
+    @staticmethod
+    def _month_label(index):
+        return UNSCHEDULED if index < 0 else f'{index // 12:04d}-{index % 12 + 1:02d}'
+
+    @staticmethod
+    def _aggregate(columns, rates):
+        deal_counts, amounts, statuses, owners, regions, years, months = columns
+        count = len(deal_counts)
+        current = PipelineForecaster._current_month()
+
+        deals = np.fromiter(deal_counts, dtype=np.int64, count=count)
+        amount = np.fromiter((value or 0.0 for value in amounts), dtype=np.float64, count=count)
+        stage = np.fromiter((OPEN_STAGES.index(value) for value in statuses), dtype=np.int8, count=count)
+        owner_ids, owner_index = np.unique(np.asarray(owners, dtype=np.int64), return_inverse=True)
+        region_names, region_index = np.unique(np.asarray(regions, dtype=object).astype(str), return_inverse=True)
+        year = np.fromiter((value or 0 for value in years), dtype=np.int64, count=count)
+        month = np.fromiter((value or 0 for value in months), dtype=np.int64, count=count)
+
+        # Deals without a close date go to an "unscheduled" bucket, overdue ones to this month
+        month_number = np.where(year > 0, np.maximum(year * 12 + month - 1, current), -1)
+        month_keys, month_index = np.unique(month_number, return_inverse=True)
+
+        owner_rate = np.array(
+            [rates['owners'].get(int(owner_id), rates['global']) for owner_id in owner_ids], dtype=np.float64
+        )
+        remaining = (len(OPEN_STAGES) - stage) / len(OPEN_STAGES)
+        probability = owner_rate[owner_index] ** remaining if count else np.zeros(0)
+        weighted = amount * probability
+
+        def breakdown(index, size):
+            return (
+                np.bincount(index, weights=deals, minlength=size),
+                np.bincount(index, weights=amount, minlength=size),
+                np.bincount(index, weights=weighted, minlength=size),
+            )
+
+        def rows(labels, sums):
+            deals, pipeline, weighted_value = sums
+            return [
+                PipelineForecaster._row(label, int(deals[i]), float(pipeline[i]), float(weighted_value[i]))
+                for i, label in enumerate(labels)
+            ]
+
+        return {
+            'totals': PipelineForecaster._row(None, int(deals.sum()), float(amount.sum()), float(weighted.sum())),
+            'by_month': rows(
+                [PipelineForecaster._month_label(int(key)) for key in month_keys],
+                breakdown(month_index, len(month_keys))
+            ),
+            'by_owner': rows([int(owner_id) for owner_id in owner_ids], breakdown(owner_index, len(owner_ids))),
+            'by_region': rows([str(name) for name in region_names], breakdown(region_index, len(region_names))),
+        }
+
+    @staticmethod
+    def _row(key, deals, pipeline, weighted):
+        row = {'key': key} if key is not None else {}
+        row.update({'deals': deals, 'pipeline_value': round(pipeline, 2), 'weighted_value': round(weighted, 2)})
+        return row
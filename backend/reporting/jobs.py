@@ -0,0 +1,328 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .analytics import AnalyticsService
+from .models import ReportTemplate, GeneratedReport
+from .planner import CustomReportPlanner
+
+User = get_user_model()
+logger = logging.getLogger('reporting')
+
+
+class ReportGenerator:
+    """Builds report payloads from report templates."""
+
+    @staticmethod
+    def get_parameters(template):
+        """Return the date range, grouping and target user id a template asks for."""
+        date_range = template.date_range_dict if template.date_range_dict else None
+        grouping = template.grouping_dict.get('period', 'month') if template.grouping_dict else 'month'
+        target_user_id = template.filters_dict.get('user_id') if template.filters_dict else None
+        return date_range, grouping, target_user_id
+
+    @staticmethod
+    def params_hash(template, user):
+        """Hash everything the report data depends on, so identical requests can share a job."""
+        date_range, grouping, target_user_id = ReportGenerator.get_parameters(template)
+        key_data = json.dumps({
+            'template': template.id,
+            'template_updated_at': template.updated_at,
+            'report_type': template.report_type,
+            'date_range': date_range,
+            'grouping': grouping,
+            'filters': template.filters_dict,
+            'metrics': template.metrics_list,
+            'scope': AnalyticsService.get_cache_scope(template.report_type, user, target_user_id),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    @staticmethod
+    def generate_data(template, user):
+        """Generate report data based on template configuration."""
+        date_range, grouping, target_user_id = ReportGenerator.get_parameters(template)
+
+        # Filter by user if specified in template filters
+        target_user = None
+        if target_user_id:
+            try:
+                target_user = User.objects.get(id=target_user_id)
+            except User.DoesNotExist:
+                # If the specified user doesn't exist, use None and fall back to current user
+                target_user = None
+
+        if template.report_type == 'sales_performance':
+            return AnalyticsService.get_sales_performance_data(user, date_range, grouping, target_user=target_user)
+        elif template.report_type == 'customer_engagement':
+            return AnalyticsService.get_customer_engagement_data(user, date_range, grouping)
+        elif template.report_type == 'task_completion':
+            return AnalyticsService.get_task_completion_data(user, date_range, grouping, target_user=target_user)
+        elif template.report_type == 'conversion_ratios':
+            return AnalyticsService.get_conversion_ratios(user, date_range)
+        elif template.report_type == 'user_activity':
+            return AnalyticsService.get_user_activity_data(date_range, grouping)
+        elif template.report_type == 'custom':
+            return CustomReportPlanner.run(template, user)
+        else:
+            raise ValueError(f"Unknown report type: {template.report_type}")
+
+    @staticmethod
+    def calculate_summary_stats(data):
+        """Calculate summary statistics from report data."""
+        summary = {}
+        if 'summary' in data:
+            summary = data['summary']
+
+        # Add generation metadata
+        summary['generated_at'] = timezone.now().isoformat()
+        summary['data_points'] = len(data.get('sales_over_time', []))
+
+        return summary
+
+
+class QueryCounter:
+    """Connection execute wrapper counting the queries run through it."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def timed_step(timings, section):
+    """Record wall time and query count of one generation step."""
+    start = time.perf_counter()
+    queries = QueryCounter()
+    with connection.execute_wrapper(queries):
+        yield
+    timings[section] = {
+        'seconds': round(time.perf_counter() - start, 4),
+        'queries': queries.count,
+    }
+
+
+class ReportCancelled(Exception):
+    """Raised inside a job once every report waiting on it has been cancelled."""
+
+
+class ReportJobQueue:
+    """
+    Runs report generation on a bounded worker pool instead of in the request.
+
+    Requests with the same params_hash share one job: the same user gets the
+    in-flight report back, other users get their own report row that is filled
+    in by the shared job. Cancellation is cooperative and takes effect between
+    generation steps; a job stops once none of its reports is still waiting.
+
+    Jobs are registered once the submitting transaction commits, and stop
+    absorbing new requests after REPORT_JOB_TIMEOUT. Reports left in flight
+    longer than that, by a hung worker or a restarted process, are failed by
+    fail_abandoned().
+    """
+    _executor = None
+    _lock = threading.Lock()
+    # params_hash -> {'reports': set of report ids, 'queued_at': datetime, 'started_at': datetime or None}
+    _jobs = {}
+
+    @classmethod
+    def submit(cls, template, user):
+        """Queue generation of template for user and return the GeneratedReport to poll."""
+        params_hash = ReportGenerator.params_hash(template, user)
+
+        # The same request from the same user is already running
+        existing = GeneratedReport.objects.filter(
+            template=template,
+            generated_by=user,
+            params_hash=params_hash,
+            status__in=GeneratedReport.IN_FLIGHT_STATUSES,
+            created_at__gte=cls._abandoned_before()
+        ).first()
+        if existing:
+            return existing
+
+        report = GeneratedReport.objects.create(
+            template=template,
+            generated_by=user,
+            params_hash=params_hash,
+            status='pending'
+        )
+        # Nothing is queued if the transaction rolls back
+        transaction.on_commit(lambda: cls._enqueue(report, template.id, user.id))
+        return report
+
+    @classmethod
+    def _enqueue(cls, report, template_id, user_id):
+        """Join the running job for the report's parameters, or queue a new one."""
+        with cls._lock:
+            job = cls._live_job(report.params_hash)
+            if job is None:
+                job = cls._jobs[report.params_hash] = {
+                    'reports': {report.id}, 'queued_at': timezone.now(), 'started_at': None
+                }
+                started_at = None
+                queued = True
+            else:
+                # Coalesce onto the job that is already queued or running
+                job['reports'].add(report.id)
+                started_at = job['started_at']
+                queued = False
+
+        if queued:
+            cls._get_executor().submit(cls._run, report.params_hash, job, template_id, user_id)
+        elif started_at:
+            GeneratedReport.objects.filter(pk=report.pk, status='pending').update(
+                status='processing', started_at=started_at
+            )
+            report.status = 'processing'
+            report.started_at = started_at
+
+    @classmethod
+    def _live_job(cls, params_hash):
+        """The job still accepting reports for params_hash, dropping it once timed out. Hold _lock."""
+        job = cls._jobs.get(params_hash)
+        if job is not None and (job['started_at'] or job['queued_at']) < cls._abandoned_before():
+            # The worker hung or the queue is stuck; later requests get a job of their own
+            del cls._jobs[params_hash]
+            return None
+        return job
+
+    @classmethod
+    def cancel(cls, report):
+        """Cancel a pending or processing report. Returns False if it already finished."""
+        cancelled = GeneratedReport.objects.filter(
+            pk=report.pk, status__in=GeneratedReport.IN_FLIGHT_STATUSES
+        ).update(status='cancelled', completed_at=timezone.now())
+
+        with cls._lock:
+            job = cls._jobs.get(report.params_hash)
+            if job:
+                job['reports'].discard(report.pk)
+        return bool(cancelled)
+
+    @classmethod
+    def fail_abandoned(cls, reports=None):
+        """
+        Fail in-flight reports older than REPORT_JOB_TIMEOUT; returns how many.
+
+        Their job is gone (the process restarted or the submit never ran) or
+        has hung, so nothing will complete them anymore.
+        """
+        if reports is None:
+            reports = GeneratedReport.objects.all()
+        return reports.filter(
+            status__in=GeneratedReport.IN_FLIGHT_STATUSES,
+            created_at__lt=cls._abandoned_before()
+        ).update(
+            status='failed',
+            error_message='Report generation did not finish in time; please generate the report again',
+            completed_at=timezone.now()
+        )
+
+    @classmethod
+    def _run(cls, params_hash, job, template_id, user_id):
+        """Worker entry point: generate once and store the result on every waiting report."""
+        timings = {}
+        started_at = timezone.now()
+        with cls._lock:
+            job['started_at'] = started_at
+
+        try:
+            report_ids = cls._active_reports(job)
+            GeneratedReport.objects.filter(id__in=report_ids, status='pending').update(
+                status='processing', started_at=started_at
+            )
+
+            template = ReportTemplate.objects.get(pk=template_id)
+            user = User.objects.get(pk=user_id)
+
+            with timed_step(timings, 'data'):
+                data = ReportGenerator.generate_data(template, user)
+            cls._active_reports(job)
+
+            with timed_step(timings, 'summary'):
+                summary = ReportGenerator.calculate_summary_stats(data)
+
+            report_ids = cls._finish(params_hash, job)
+            completed_at = timezone.now()
+            GeneratedReport.objects.filter(
+                id__in=report_ids, status__in=GeneratedReport.IN_FLIGHT_STATUSES
+            ).update(
+                status='completed',
+                **GeneratedReport.pack_data(data),
+                summary_stats=summary,
+                section_timings=timings,
+                completed_at=completed_at,
+                execution_time=completed_at - started_at
+            )
+        except ReportCancelled:
+            cls._finish(params_hash, job)
+            logger.info('Report job %s stopped: all reports cancelled', params_hash)
+        except Exception as e:
+            logger.exception('Report job %s failed', params_hash)
+            completed_at = timezone.now()
+            GeneratedReport.objects.filter(
+                id__in=cls._finish(params_hash, job), status__in=GeneratedReport.IN_FLIGHT_STATUSES
+            ).update(
+                status='failed',
+                error_message=str(e),
+                section_timings=timings,
+                completed_at=completed_at,
+                execution_time=completed_at - started_at
+            )
+        finally:
+            # Pool threads must not hold on to their database connections
+            connection.close()
+
+    @classmethod
+    def _active_reports(cls, job):
+        """Return the job's reports that are still waiting; raise if there are none."""
+        with cls._lock:
+            report_ids = set(job['reports'])
+        # Cancellation may have happened in another process
+        active = set(GeneratedReport.objects.filter(
+            id__in=report_ids, status__in=GeneratedReport.IN_FLIGHT_STATUSES
+        ).values_list('id', flat=True))
+        if not active:
+            raise ReportCancelled()
+        return active
+
+    @classmethod
+    def _finish(cls, params_hash, job):
+        """Close the job to new requests and return all of its report ids."""
+        with cls._lock:
+            # A timed-out job may have been replaced by a newer one for the same parameters
+            if cls._jobs.get(params_hash) is job:
+                del cls._jobs[params_hash]
+            return set(job['reports'])
+
+    @classmethod
+    def _abandoned_before(cls):
+        return timezone.now() - timedelta(seconds=cls._job_timeout())
+
+    @staticmethod
+    def _job_timeout():
+        """Seconds after which an in-flight report is treated as abandoned (e.g. after a restart)."""
+        return settings.ANALYTICS_SETTINGS.get('REPORT_JOB_TIMEOUT', 1800)
+
+    @classmethod
+    def _get_executor(cls):
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=settings.ANALYTICS_SETTINGS.get('REPORT_WORKERS', 2),
+                    thread_name_prefix='report-worker'
+                )
+            return cls._executor
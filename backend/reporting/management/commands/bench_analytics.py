@@ -0,0 +1,400 @@
+import json
+import math
+import platform
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from customers.models import Customer
+from reporting.analytics import AnalyticsService
+from reporting.cube import RollupCube
+from reporting.utils import CacheManager
+from reporting.views import AnalyticsViewSet
+from sales.models import Sale
+from tasks.models import Task
+
+User = get_user_model()
+
+# Seeded records are recognised by this e-mail domain
+BENCH_DOMAIN = 'bench.invalid'
+# Rows seeded per unit of --scale: about 10k rows at 1, 1M at 100
+ROWS_PER_SCALE = {'users': 20, 'customers': 2000, 'sales': 5000, 'tasks': 3000}
+SEED_BATCH_SIZE = 5000
+
+GROUPINGS = ('day', 'week', 'month', 'quarter')
+VIEW_ACTIONS = (
+    'dashboard_kpis', 'sales_performance', 'customer_engagement', 'task_completion',
+    'conversion_ratios', 'user_activity', 'user_sales_performance', 'user_task_performance',
+)
+# Endpoints regular users get a 403 from
+STAFF_VIEW_ACTIONS = ('user_activity', 'user_sales_performance', 'user_task_performance')
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created_at/updated_at values it is given, to spread seeded rows over time."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks every AnalyticsService method and analytics endpoint on seeded data, '
+        'reporting p50/p95 latency, SQL query count and peak memory'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1,
+                            help='Seed %s rows per unit (about 10k rows at 1)' % ROWS_PER_SCALE)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per case before timing')
+        parser.add_argument('--only', help='Only run cases whose name contains this text')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Flag regressions against a previous JSON result file')
+        parser.add_argument('--max-regression', type=float, default=0.2,
+                            help='Allowed p95 latency increase over the baseline, as a fraction')
+        parser.add_argument('--no-seed', action='store_true', help='Benchmark the data already in the database')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the seeded benchmark data and exit')
+        parser.add_argument('--force', action='store_true', help='Allow seeding with DEBUG off')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted, _ = User.objects.filter(email__endswith=f'@{BENCH_DOMAIN}').delete()
+            Customer.objects.filter(email__endswith=f'@{BENCH_DOMAIN}').delete()
+            self._refresh_derived_data()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} benchmark rows'))
+            return
+
+        if not options['no_seed']:
+            if not settings.DEBUG and not options['force']:
+                raise CommandError('Refusing to seed benchmark data with DEBUG off; pass --force to do it anyway')
+            self._seed(options['scale'])
+
+        users = self._bench_users()
+        cases = [
+            case for case in self._service_cases(users) + self._view_cases(users)
+            if not options['only'] or options['only'] in case[0]
+        ]
+        self.stdout.write(f'Running {len(cases)} cases, {options["repeat"]} timed runs each...')
+        self.stdout.write(f'{"case":<64} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8} {"peak KiB":>9}')
+
+        results = {}
+        for name, run, before in cases:
+            result = self._measure(run, before, options['repeat'], options['warmup'])
+            results[name] = result
+            if 'error' in result:
+                self.stdout.write(self.style.ERROR(f'{name:<64} {result["error"]}'))
+            else:
+                self.stdout.write(
+                    f'{name:<64} {result["p50_ms"]:>9.1f} {result["p95_ms"]:>9.1f} '
+                    f'{result["queries"]:>8} {result["peak_memory_kib"]:>9}'
+                )
+
+        report = {'meta': self._meta(options), 'results': results}
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if options['compare']:
+            self._compare(report, options['compare'], options['max_regression'])
+
+    # Seeding
+
+    def _seed(self, scale):
+        """Top the benchmark data up to the requested scale; existing benchmark rows are reused."""
+        rng = random.Random(42)
+        now = timezone.now()
+        targets = {name: max(int(rows * scale), 1) for name, rows in ROWS_PER_SCALE.items()}
+        bench_users = User.objects.filter(email__endswith=f'@{BENCH_DOMAIN}')
+        bench_customers = Customer.objects.filter(email__endswith=f'@{BENCH_DOMAIN}')
+        existing = {
+            'users': bench_users.count(),
+            'customers': bench_customers.count(),
+            'sales': Sale.objects.filter(assigned_to__in=bench_users).count(),
+            'tasks': Task.objects.filter(assigned_to__in=bench_users).count(),
+        }
+        if all(existing[name] >= targets[name] for name in targets):
+            self.stdout.write(f'Benchmark data already at scale {scale}: {existing}')
+            return
+
+        def past(days):
+            return now - timedelta(days=rng.uniform(0, days))
+
+        self.stdout.write(f'Seeding benchmark data up to {targets}...')
+        with explicit_timestamps(Customer, Sale, Task):
+            User.objects.bulk_create([
+                User(
+                    email=f'bench-user-{i}@{BENCH_DOMAIN}',
+                    username=f'bench-user-{i}@{BENCH_DOMAIN}',
+                    first_name='Bench', last_name=f'User {i}',
+                    role='ADMIN' if i == 0 else 'MANAGER' if i % 5 == 1 else 'USER',
+                    is_staff=i == 0,
+                    password='!',  # Unusable password
+                    force_password_change=False,
+                )
+                for i in range(existing['users'], targets['users'])
+            ])
+            user_ids = list(bench_users.values_list('id', flat=True))
+
+            self._bulk_create(Customer, existing['customers'], targets['customers'], lambda i: Customer(
+                name=f'Bench Customer {i}',
+                email=f'bench-customer-{i}@{BENCH_DOMAIN}',
+                company=f'Bench Company {i % 500}',
+                region=rng.choice(Customer.REGION_CHOICES)[0],
+                engagement_level=rng.choice(Customer.ENGAGEMENT_LEVEL_CHOICES)[0],
+                status=rng.choice(Customer.STATUS_CHOICES)[0],
+                owner_id=rng.choice(user_ids),
+                last_contact_date=past(180).date() if rng.random() < 0.8 else None,
+                created_at=past(730), updated_at=now,
+            ))
+            customer_ids = list(bench_customers.values_list('id', flat=True))
+
+            def sale(i):
+                created_at = past(730)
+                return Sale(
+                    title=f'Bench Sale {i}',
+                    customer_id=rng.choice(customer_ids),
+                    status=rng.choices(['NEW', 'CONTACTED', 'PROPOSAL', 'NEGOTIATION', 'WON', 'LOST'],
+                                       [20, 20, 15, 10, 20, 15])[0],
+                    amount=Decimal(rng.randint(500, 250000)) if rng.random() < 0.95 else None,
+                    expected_close_date=(created_at + timedelta(days=rng.randint(7, 120))).date()
+                    if rng.random() < 0.85 else None,
+                    assigned_to_id=rng.choice(user_ids),
+                    priority=rng.choice(Sale.PRIORITY_CHOICES)[0],
+                    created_at=created_at, updated_at=created_at,
+                )
+            self._bulk_create(Sale, existing['sales'], targets['sales'], sale)
+
+            def task(i):
+                created_at = past(730)
+                return Task(
+                    title=f'Bench Task {i}',
+                    due_date=(created_at + timedelta(days=rng.randint(1, 60))).date(),
+                    priority=rng.choice(Task.PRIORITY_CHOICES)[0],
+                    status=rng.choices(['P', 'IP', 'C', 'O'], [25, 20, 40, 15])[0],
+                    assigned_to_id=rng.choice(user_ids),
+                    created_by_id=rng.choice(user_ids),
+                    created_at=created_at, updated_at=created_at,
+                )
+            self._bulk_create(Task, existing['tasks'], targets['tasks'], task)
+
+        self._refresh_derived_data()
+
+    def _bulk_create(self, model, start, stop, build):
+        for batch_start in range(start, stop, SEED_BATCH_SIZE):
+            batch_stop = min(batch_start + SEED_BATCH_SIZE, stop)
+            with transaction.atomic():
+                model.objects.bulk_create([build(i) for i in range(batch_start, batch_stop)])
+            self.stdout.write(f'  {model._meta.verbose_name_plural}: {batch_stop}/{stop}')
+
+    def _refresh_derived_data(self):
+        """Bulk writes bypass the signals that keep the rollup cube and cache generations current."""
+        self.stdout.write('Rebuilding analytics rollup cube...')
+        RollupCube.rebuild()
+        self._expire_cache()
+
+    @staticmethod
+    def _expire_cache():
+        for name in CacheManager.ALL_MODELS:
+            CacheManager.bump_generation(name)
+
+    def _bench_users(self):
+        """One user per role, preferring seeded ones."""
+        users = {}
+        for role in ('ADMIN', 'MANAGER', 'USER'):
+            candidates = User.objects.filter(role=role, is_active=True).order_by('id')
+            users[role] = (candidates.filter(email__endswith=f'@{BENCH_DOMAIN}').first()
+                           or candidates.first())
+            if users[role] is None:
+                raise CommandError(f'No active {role} user to benchmark with')
+        return users
+
+    # Cases
+
+    @staticmethod
+    def _date_ranges():
+        """Day-aligned ranges are answered from the rollup cube, the exact one from the raw tables."""
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        now = timezone.now()
+        return {
+            'all': None,
+            '30d': {'start': today - timedelta(days=30), 'end': today},
+            '365d': {'start': today - timedelta(days=365), 'end': today},
+            '90d-exact': {'start': now - timedelta(days=90), 'end': now},
+        }
+
+    def _service_cases(self, users):
+        admin = users['ADMIN']
+        cases = []
+        for range_name, date_range in self._date_ranges().items():
+            for grouping in GROUPINGS:
+                suffix = f'[grouping={grouping},range={range_name}]'
+                cases += [
+                    (f'service.sales_performance{suffix}',
+                     lambda d=date_range, g=grouping: AnalyticsService.get_sales_performance_data(admin, d, g), None),
+                    (f'service.customer_engagement{suffix}',
+                     lambda d=date_range, g=grouping: AnalyticsService.get_customer_engagement_data(admin, d, g), None),
+                    (f'service.task_completion{suffix}',
+                     lambda d=date_range, g=grouping: AnalyticsService.get_task_completion_data(admin, d, g), None),
+                    (f'service.user_activity{suffix}',
+                     lambda d=date_range, g=grouping: AnalyticsService.get_user_activity_data(d, g), None),
+                ]
+            cases.append((f'service.conversion_ratios[range={range_name}]',
+                          lambda d=date_range: AnalyticsService.get_conversion_ratios(admin, d), None))
+
+        cases += [
+            ('service.sales_performance[target_user]',
+             lambda: AnalyticsService.get_sales_performance_data(admin, None, 'month', target_user=users['USER']), None),
+            ('service.task_completion[target_user]',
+             lambda: AnalyticsService.get_task_completion_data(admin, None, 'month', target_user=users['USER']), None),
+            ('service.user_sales_performance', AnalyticsService.get_user_sales_performance, None),
+            ('service.user_task_performance', AnalyticsService.get_user_task_performance, None),
+        ]
+        for role, user in users.items():
+            cases.append((f'service.dashboard_kpis[role={role}]',
+                          lambda u=user: AnalyticsService.get_dashboard_kpis(u), None))
+        return cases
+
+    def _view_cases(self, users):
+        """Endpoints as served, uncached (every run at a new cache generation) and cached."""
+        factory = APIRequestFactory()
+        year = self._date_ranges()['365d']
+        params = {
+            'start_date': year['start'].isoformat(),
+            'end_date': year['end'].isoformat(),
+            'grouping': 'month',
+        }
+
+        def call(action, user):
+            request = factory.get(f'/api/reporting/analytics/{action}/', params)
+            force_authenticate(request, user=user)
+            response = AnalyticsViewSet.as_view({'get': action})(request)
+            if response.status_code >= 400:
+                raise RuntimeError(f'HTTP {response.status_code}: {response.data}')
+            return response
+
+        cases = []
+        for action in VIEW_ACTIONS:
+            roles = ('ADMIN',) if action in STAFF_VIEW_ACTIONS else ('ADMIN', 'USER')
+            for role in roles:
+                run = lambda a=action, u=users[role]: call(a, u)
+                cases += [
+                    (f'view.{action}[role={role},cache=cold]', run, self._expire_cache),
+                    (f'view.{action}[role={role},cache=warm]', run, None),
+                ]
+        return cases
+
+    # Measuring
+
+    @staticmethod
+    def _measure(run, before, repeat, warmup):
+        """Time run() repeat times; before() runs ahead of each call, outside the measurement."""
+        def once():
+            if before:
+                before()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - started
+            return elapsed, len(queries.captured_queries)
+
+        try:
+            for _ in range(warmup):
+                once()
+            runs = [once() for _ in range(max(repeat, 1))]
+
+            # Memory is traced on a separate run, since tracing slows everything down
+            if before:
+                before()
+            tracemalloc.start()
+            try:
+                run()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        except Exception as e:
+            return {'error': str(e)}
+
+        timings = [elapsed * 1000 for elapsed, _ in runs]
+        return {
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries': max(count for _, count in runs),
+            'peak_memory_kib': peak // 1024,
+        }
+
+    def _meta(self, options):
+        return {
+            'scale': options['scale'],
+            'seeded': not options['no_seed'],
+            'repeat': options['repeat'],
+            'warmup': options['warmup'],
+            'rows': {
+                'users': User.objects.count(),
+                'customers': Customer.objects.count(),
+                'sales': Sale.objects.count(),
+                'tasks': Task.objects.count(),
+            },
+            'database': connection.vendor,
+            'rollup_cube': RollupCube.is_enabled(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'finished_at': timezone.now().isoformat(),
+        }
+
+    def _compare(self, report, baseline_path, max_regression):
+        """Flag cases that got slower at p95 or started issuing more queries than in the baseline."""
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['meta'].get('rows') != report['meta']['rows']:
+            self.stdout.write(self.style.WARNING('Baseline was recorded on a different data set'))
+
+        regressions = []
+        for name, result in report['results'].items():
+            previous = baseline['results'].get(name)
+            if not previous or 'error' in previous or 'error' in result:
+                continue
+            if result['queries'] > previous['queries']:
+                regressions.append(f'{name}: {previous["queries"]} -> {result["queries"]} queries')
+            # Ignore sub-millisecond jitter on very fast cases
+            if (result['p95_ms'] > previous['p95_ms'] * (1 + max_regression)
+                    and result['p95_ms'] - previous['p95_ms'] > 1):
+                regressions.append(f'{name}: p95 {previous["p95_ms"]:.1f} -> {result["p95_ms"]:.1f} ms')
+        errors = [name for name, result in report['results'].items() if 'error' in result]
+        regressions += [f'{name}: failed' for name in errors]
+
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(f'  {regression}'))
+            raise CommandError(f'{len(regressions)} regressions against {baseline_path}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}'))
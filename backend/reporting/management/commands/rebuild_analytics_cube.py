@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from reporting.cube import RollupCube
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the analytics rollup cube from the sales, task and customer tables'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding analytics rollup cube...')
+
+        # Bulk updates bypass model signals, so this also repairs any drift
+        counts = RollupCube.rebuild()
+
+        for table, rows in counts.items():
+            self.stdout.write(f'  {table}: {rows} fact rows')
+
+        self.stdout.write(self.style.SUCCESS('Successfully rebuilt analytics rollup cube'))
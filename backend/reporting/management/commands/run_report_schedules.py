@@ -0,0 +1,51 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from reporting.scheduler import ScheduleRunner
+
+
+class Command(BaseCommand):
+    help = 'Runs due report schedules and emails the reports; safe to run as several instances'
+
+    def add_arguments(self, parser):
+        runner_settings = settings.ANALYTICS_SETTINGS.get('SCHEDULE_RUNNER', {})
+        parser.add_argument('--once', action='store_true',
+                            help='Run every schedule that is currently due, then exit')
+        parser.add_argument('--batch-size', type=int, default=runner_settings.get('BATCH_SIZE', 50))
+        parser.add_argument('--workers', type=int, default=runner_settings.get('WORKERS', 4))
+        parser.add_argument('--interval', type=float, default=runner_settings.get('POLL_INTERVAL', 30),
+                            help='Seconds to sleep when no schedules are due')
+
+    def handle(self, *args, **options):
+        runner = ScheduleRunner(batch_size=options['batch_size'], workers=options['workers'])
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.stdout.write(f"Running report schedules ({options['workers']} workers)...")
+        total = 0
+        try:
+            while not self.stopping:
+                claimed = runner.run_once()
+                total += claimed
+                # A full batch means more schedules are probably due right now
+                if claimed < runner.batch_size:
+                    if options['once']:
+                        break
+                    self._sleep(options['interval'])
+        finally:
+            runner.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f'Stopped after running {total} report schedules'))
+
+    def _stop(self, signum, frame):
+        # Finish the current batch before exiting
+        self.stopping = True
+
+    def _sleep(self, seconds):
+        deadline = time.monotonic() + seconds
+        while not self.stopping and time.monotonic() < deadline:
+            time.sleep(min(1, deadline - time.monotonic()))
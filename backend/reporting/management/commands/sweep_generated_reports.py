@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from reporting.jobs import ReportJobQueue
+from reporting.models import GeneratedReport
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes generated reports past REPORT_RETENTION_DAYS, fails reports stuck in flight past '
+        'REPORT_JOB_TIMEOUT and compresses large inline report payloads'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.ANALYTICS_SETTINGS.get('REPORT_RETENTION_DAYS', 90),
+                            help='Delete reports created more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--compact', action='store_true',
+                            help='Also move large payloads of remaining reports to compressed storage')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = GeneratedReport.objects.filter(created_at__lt=cutoff).exclude(
+            status__in=GeneratedReport.IN_FLIGHT_STATUSES
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f'{expired.count()} reports created before {cutoff:%Y-%m-%d} would be deleted')
+            return
+
+        abandoned = ReportJobQueue.fail_abandoned()
+        if abandoned:
+            self.stdout.write(f'Failed {abandoned} reports whose generation never finished')
+
+        deleted = 0
+        while True:
+            # Short transactions keep locks and cascades small; artifacts go once each batch commits
+            with transaction.atomic():
+                batch = list(expired.values_list('id', flat=True)[:options['batch_size']])
+                if not batch:
+                    break
+                GeneratedReport.objects.filter(id__in=batch).delete()
+            deleted += len(batch)
+            self.stdout.write(f'  deleted {deleted} reports...')
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} reports created before {cutoff:%Y-%m-%d}'))
+
+        if options['compact']:
+            compacted = self._compact(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Moved {compacted} report payloads to compressed storage'))
+
+    def _compact(self, batch_size):
+        """Re-store inline payloads through pack_data, which compresses the large ones."""
+        compacted = 0
+        inline = GeneratedReport.objects.filter(data_blob__isnull=True).only('id', 'data')
+        for report in inline.iterator(chunk_size=batch_size):
+            packed = GeneratedReport.pack_data(report.data)
+            # The data itself is unchanged, so its stored exports keep their names
+            packed.pop('data_digest')
+            if packed['data_blob'] is not None:
+                GeneratedReport.objects.filter(pk=report.pk, data_blob__isnull=True).update(**packed)
+                compacted += 1
+        return compacted
@@ -0,0 +1,216 @@
+from decimal import Decimal
+
+from django.db.models import Count, Sum, Avg, Q, Value
+from django.db.models.functions import Coalesce
+
+from sales.models import Sale
+from customers.models import Customer
+from tasks.models import Task
+
+
+class Metric:
+    """
+    A single KPI declared as a conditional aggregate over one model.
+    """
+    AGGREGATES = {
+        'count': Count,
+        # Zero rather than NULL when no amounts are set, as fact rows store 0
+        'sum': lambda field, filter=None: Coalesce(Sum(field, filter=filter), Value(Decimal('0'))),
+        'avg': Avg,
+        # Sum of pre-aggregated counts; zero rather than NULL like Count
+        'total': lambda field, filter=None: Coalesce(Sum(field, filter=filter), 0),
+    }
+
+    def __init__(self, name, aggregate='count', field='id', filter=None, default=0):
+        if aggregate not in self.AGGREGATES:
+            raise ValueError(f"Unknown aggregate: {aggregate}")
+        self.name = name
+        self.aggregate = aggregate
+        self.field = field
+        self.filter = filter
+        self.default = default
+
+    def as_expression(self):
+        """Build the ORM aggregate expression for this metric."""
+        return self.AGGREGATES[self.aggregate](self.field, filter=self.filter)
+
+    def within(self, name, window):
+        """Return a copy of this metric renamed and restricted to rows matching window."""
+        combined = window & self.filter if self.filter is not None else window
+        return Metric(name, self.aggregate, self.field, filter=combined, default=self.default)
+
+    def for_facts(self):
+        """Return the equivalent metric over rollup fact rows, where counts are pre-summed."""
+        if self.aggregate == 'count':
+            return Metric(self.name, 'total', 'count', filter=self.filter, default=self.default)
+        if self.aggregate == 'avg':
+            raise ValueError(f"Metric {self.name} cannot be computed from rollup facts")
+        return self
+
+
+class MetricSet:
+    """
+    A group of metrics for one model, compiled into a single aggregate() query.
+    """
+
+    def __init__(self, *metrics):
+        self.metrics = list(metrics)
+
+    def extend(self, *metrics):
+        """Return a new set with additional (e.g. time-dependent) metrics."""
+        return MetricSet(*self.metrics, *metrics)
+
+    def windows(self, field, current_start, previous_start):
+        """
+        Declare current_<name> and previous_<name> variants of every metric.
+
+        The current window starts at current_start; the previous window covers
+        [previous_start, current_start). Both are evaluated in the same pass as
+        the rest of the set once extended into it.
+        """
+        current = Q(**{f'{field}__gte': current_start})
+        previous = Q(**{f'{field}__gte': previous_start, f'{field}__lt': current_start})
+        return MetricSet(*(
+            windowed
+            for metric in self.metrics
+            for windowed in (
+                metric.within(f'current_{metric.name}', current),
+                metric.within(f'previous_{metric.name}', previous),
+            )
+        ))
+
+    def for_facts(self):
+        """Return the same set evaluated against rollup fact tables."""
+        return MetricSet(*(metric.for_facts() for metric in self.metrics))
+
+    def expressions(self):
+        """Return the aggregate expressions keyed by metric name."""
+        return {metric.name: metric.as_expression() for metric in self.metrics}
+
+    def defaults(self):
+        """Return the values reported when no rows match."""
+        return {metric.name: metric.default for metric in self.metrics}
+
+    def compute(self, queryset):
+        """Evaluate every metric against the queryset in one round trip."""
+        return self._with_defaults(queryset.aggregate(**self.expressions()))
+
+    def compute_grouped(self, queryset, field):
+        """Evaluate every metric per distinct value of field with one GROUP BY query."""
+        rows = queryset.values(field).annotate(**self.expressions()).order_by()
+        return {row.pop(field): self._with_defaults(row) for row in rows}
+
+    def _with_defaults(self, values):
+        return {
+            metric.name: values[metric.name] if values[metric.name] is not None else metric.default
+            for metric in self.metrics
+        }
+
+
+def percentage(part, whole):
+    """Return part as a percentage of whole, or 0 when whole is empty."""
+    return (part / whole * 100) if whole else 0
+
+
+def trend(current, previous):
+    """Describe the change of a KPI between two windows."""
+    return {
+        'current': current,
+        'previous': previous,
+        'change_percentage': ((current - previous) / previous * 100) if previous else 0,
+    }
+
+
+def status_metrics(model, prefix=''):
+    """Declare one count metric per status choice of the model."""
+    return [
+        Metric(f'{prefix}{code}', filter=Q(status=code))
+        for code, _ in model.STATUS_CHOICES
+    ]
+
+
+# Sales KPIs used by the dashboard and the sales stats endpoint
+SALES_KPIS = MetricSet(
+    Metric('total_sales'),
+    Metric('total_amount', 'sum', 'amount'),
+    Metric('won_sales', filter=Q(status='WON')),
+    Metric('won_amount', 'sum', 'amount', filter=Q(status='WON')),
+    Metric('lost_sales', filter=Q(status='LOST')),
+    Metric('pipeline_value', 'sum', 'amount', filter=~Q(status__in=['WON', 'LOST'])),
+    *status_metrics(Sale, prefix='status_'),
+)
+
+# Task KPIs used by the dashboard and the task stats endpoint
+TASK_KPIS = MetricSet(
+    Metric('total_tasks'),
+    Metric('active_tasks', filter=~Q(status='C')),
+    *status_metrics(Task, prefix='status_'),
+)
+
+# Customer KPIs used by the dashboard
+CUSTOMER_KPIS = MetricSet(
+    Metric('total_customers'),
+    Metric('vip_customers', filter=Q(engagement_level='VIP')),
+    *status_metrics(Customer, prefix='status_'),
+)
+
+# Activity compared between the current and previous dashboard trend windows
+SALES_TRENDS = MetricSet(
+    Metric('total_sales'),
+    Metric('total_amount', 'sum', 'amount'),
+    Metric('won_sales', filter=Q(status='WON')),
+    Metric('won_amount', 'sum', 'amount', filter=Q(status='WON')),
+    Metric('pipeline_value', 'sum', 'amount', filter=~Q(status__in=['WON', 'LOST'])),
+)
+
+TASK_CREATION_TRENDS = MetricSet(
+    Metric('total_tasks'),
+)
+
+# Tasks carry no completion timestamp; the last update of a completed task stands in for it
+TASK_COMPLETION_TRENDS = MetricSet(
+    Metric('completed_tasks', filter=Q(status='C')),
+)
+
+CUSTOMER_TRENDS = MetricSet(
+    Metric('total_customers'),
+    Metric('active_customers', filter=Q(status='ACTIVE')),
+    Metric('vip_customers', filter=Q(engagement_level='VIP')),
+)
+
+# Plain row count used by the analytics breakdowns
+ROW_COUNT = MetricSet(
+    Metric('count'),
+)
+
+# Per-user performance used by the analytics leaderboards
+SALES_PERFORMANCE = MetricSet(
+    Metric('total_sales'),
+    Metric('total_amount', 'sum', 'amount'),
+    Metric('won_sales', filter=Q(status='WON')),
+    Metric('lost_sales', filter=Q(status='LOST')),
+)
+
+TASK_PERFORMANCE = MetricSet(
+    Metric('total_tasks'),
+    Metric('completed_tasks', filter=Q(status='C')),
+    Metric('overdue_tasks', filter=Q(status='O')),
+)
+
+# Per-period series used by the analytics time series
+SALES_SERIES = MetricSet(
+    Metric('count'),
+    Metric('total_amount', 'sum', 'amount'),
+)
+
+ACQUISITION_SERIES = MetricSet(
+    Metric('count'),
+)
+
+COMPLETION_SERIES = MetricSet(
+    Metric('completed', filter=Q(status='C')),
+    Metric('pending', filter=Q(status='P')),
+    Metric('overdue', filter=Q(status='O')),
+    Metric('in_progress', filter=Q(status='IP')),
+    Metric('total'),
+)
@@ -0,0 +1,118 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:46
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+import django.db.models.deletion
+
+
+def backfill_rollup_cube(apps, schema_editor):
+    """Populate the fact tables from existing sales, tasks and customers."""
+    Sale = apps.get_model('sales', 'Sale')
+    Task = apps.get_model('tasks', 'Task')
+    Customer = apps.get_model('customers', 'Customer')
+    SaleFact = apps.get_model('reporting', 'SaleFact')
+    TaskFact = apps.get_model('reporting', 'TaskFact')
+    CustomerFact = apps.get_model('reporting', 'CustomerFact')
+
+    sale_rows = Sale.objects.annotate(
+        fact_day=Coalesce('expected_close_date', TruncDate('created_at'))
+    ).values('fact_day', 'assigned_to_id', 'status', 'priority', 'customer__region').annotate(
+        fact_count=Count('id'),
+        fact_amount=Coalesce(Sum('amount'), Value(Decimal('0')), output_field=models.DecimalField())
+    ).order_by()
+    SaleFact.objects.bulk_create([
+        SaleFact(
+            day=row['fact_day'], assigned_to_id=row['assigned_to_id'], status=row['status'],
+            priority=row['priority'], region=row['customer__region'],
+            count=row['fact_count'], amount=row['fact_amount']
+        ) for row in sale_rows
+    ], batch_size=1000)
+
+    task_rows = Task.objects.annotate(
+        fact_day=TruncDate('created_at')
+    ).values('fact_day', 'assigned_to_id', 'status', 'priority').annotate(
+        fact_count=Count('id')
+    ).order_by()
+    TaskFact.objects.bulk_create([
+        TaskFact(
+            day=row['fact_day'], assigned_to_id=row['assigned_to_id'], status=row['status'],
+            priority=row['priority'], count=row['fact_count']
+        ) for row in task_rows
+    ], batch_size=1000)
+
+    customer_rows = Customer.objects.annotate(
+        fact_day=TruncDate('created_at')
+    ).values('fact_day', 'owner_id', 'status', 'engagement_level', 'region').annotate(
+        fact_count=Count('id')
+    ).order_by()
+    CustomerFact.objects.bulk_create([
+        CustomerFact(
+            day=row['fact_day'], owner_id=row['owner_id'], status=row['status'],
+            engagement_level=row['engagement_level'], region=row['region'],
+            count=row['fact_count']
+        ) for row in customer_rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reporting', '0002_upgrade_to_jsonfield'),
+        ('sales', '0001_initial'),
+        ('tasks', '0004_task_created_by'),
+        ('customers', '0002_remove_customer_industry_remove_customer_postal_code_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('priority', models.CharField(max_length=1)),
+                ('assigned_to', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('day', 'assigned_to', 'status', 'priority')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SaleFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('priority', models.CharField(max_length=10)),
+                ('region', models.CharField(max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('assigned_to', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('day', 'assigned_to', 'status', 'priority', 'region')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CustomerFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('engagement_level', models.CharField(max_length=10)),
+                ('region', models.CharField(max_length=10)),
+                ('owner', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('day', 'owner', 'status', 'engagement_level', 'region')},
+            },
+        ),
+        migrations.RunPython(backfill_rollup_cube, migrations.RunPython.noop),
+    ]
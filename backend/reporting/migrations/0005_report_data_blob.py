@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0004_report_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedreport',
+            name='data_blob',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
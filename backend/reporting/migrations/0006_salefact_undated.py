@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:12
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def rebuild_sale_facts(apps, schema_editor):
+    """Recompute the sale facts so rows from the created_at fallback are flagged."""
+    Sale = apps.get_model('sales', 'Sale')
+    SaleFact = apps.get_model('reporting', 'SaleFact')
+
+    sale_rows = Sale.objects.annotate(
+        fact_day=Coalesce('expected_close_date', TruncDate('created_at')),
+        fact_undated=ExpressionWrapper(Q(expected_close_date__isnull=True), output_field=BooleanField())
+    ).values('fact_day', 'fact_undated', 'assigned_to_id', 'status', 'priority', 'customer__region').annotate(
+        fact_count=Count('id'),
+        fact_amount=Coalesce(Sum('amount'), Value(Decimal('0')), output_field=models.DecimalField())
+    ).order_by()
+
+    SaleFact.objects.all().delete()
+    SaleFact.objects.bulk_create([
+        SaleFact(
+            day=row['fact_day'], undated=row['fact_undated'], assigned_to_id=row['assigned_to_id'],
+            status=row['status'], priority=row['priority'], region=row['customer__region'],
+            count=row['fact_count'], amount=row['fact_amount']
+        ) for row in sale_rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0005_report_data_blob'),
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salefact',
+            name='undated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterUniqueTogether(
+            name='salefact',
+            unique_together={('day', 'undated', 'assigned_to', 'status', 'priority', 'region')},
+        ),
+        migrations.RunPython(rebuild_sale_facts, migrations.RunPython.noop),
+    ]
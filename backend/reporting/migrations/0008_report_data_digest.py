@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0007_data_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedreport',
+            name='data_digest',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
+import hashlib
 import json
+import zlib
 
 # PostgreSQL JSONField import
 from django.db.models import JSONField
@@ -92,7 +95,9 @@ class GeneratedReport(TimeStampedModel):
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
     ]
+    IN_FLIGHT_STATUSES = ['pending', 'processing']
 
     template = models.ForeignKey(ReportTemplate, on_delete=models.CASCADE, related_name='generated_reports')
     generated_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='generated_reports')
@@ -102,14 +107,24 @@ class GeneratedReport(TimeStampedModel):
     # Report execution details
     execution_time = models.DurationField(null=True, blank=True)
     error_message = models.TextField(blank=True, null=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    section_timings = JSONField(default=dict, blank=True, help_text="Seconds and queries spent per generation step")
+
+    # Identifies identical requests so in-flight jobs can be shared
+    params_hash = models.CharField(max_length=64, blank=True, db_index=True)
     
     # Generated data using PostgreSQL JSONField
     data = JSONField(default=dict, help_text="Generated report data")
     summary_stats = JSONField(default=dict, help_text="Summary statistics")
+    # Large payloads are kept zlib-compressed here instead of in data; use data_dict to read either
+    data_blob = models.BinaryField(null=True, blank=True, editable=False)
     
     # File paths for exports
     csv_file_path = models.CharField(max_length=500, blank=True, null=True)
     pdf_file_path = models.CharField(max_length=500, blank=True, null=True)
+    # Hash of the stored data, so exports can be looked up without loading it
+    data_digest = models.CharField(max_length=64, blank=True, default='')
 
     class Meta:
         ordering = ['-created_at']
@@ -120,11 +135,33 @@ class GeneratedReport(TimeStampedModel):
     # Legacy property methods for backward compatibility
     @property
     def data_dict(self):
-        return self.data
+        if self.data_blob is None:
+            return self.data
+        # Decompress once per instance, and again only if the blob is replaced
+        cached = getattr(self, '_unpacked_data', None)
+        if cached is None or cached[0] is not self.data_blob:
+            cached = (self.data_blob, json.loads(zlib.decompress(self.data_blob)))
+            self._unpacked_data = cached
+        return cached[1]
 
     @data_dict.setter
     def data_dict(self, value):
-        self.data = value
+        for field, field_value in self.pack_data(value).items():
+            setattr(self, field, field_value)
+
+    @staticmethod
+    def pack_data(value):
+        """
+        Field values storing report data inline, or compressed in data_blob if
+        it is large, together with its digest.
+
+        Usable with save(), update() and bulk_create().
+        """
+        encoded = json.dumps(value, cls=DjangoJSONEncoder).encode()
+        digest = hashlib.sha256(encoded).hexdigest()
+        if len(encoded) < settings.ANALYTICS_SETTINGS.get('REPORT_INLINE_DATA_BYTES', 32768):
+            return {'data': value, 'data_blob': None, 'data_digest': digest}
+        return {'data': {}, 'data_blob': zlib.compress(encoded), 'data_digest': digest}
 
     @property
     def summary_stats_dict(self):
@@ -304,3 +341,86 @@ class ReportShare(TimeStampedModel):
     @external_emails_list.setter
     def external_emails_list(self, value):
         self.external_emails = value
+
+
+class FactTable(models.Model):
+    """
+    Abstract base for the analytics rollup cube.
+
+    Each row holds the number of source records that fall on one day for one
+    combination of dimensions. Rows are maintained incrementally by the
+    signal handlers in reporting.signals and can be rebuilt from scratch with
+    the rebuild_analytics_cube management command.
+    """
+    day = models.DateField(db_index=True)
+    status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class SaleFact(FactTable):
+    """
+    Daily sales rollup keyed by (day, undated, assigned_to, status, priority, region).
+
+    The day is the expected close date, falling back to the creation date, as
+    used by the sales analytics. Rows for the fallback are flagged undated:
+    their day comes from a timestamp, so date ranges end before the last day.
+    """
+    # No FK constraint so cascaded user deletes can unwind facts through the sale signals
+    assigned_to = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name='+'
+    )
+    priority = models.CharField(max_length=10)
+    region = models.CharField(max_length=10)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    undated = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ['day', 'undated', 'assigned_to', 'status', 'priority', 'region']
+
+
+class TaskFact(FactTable):
+    """
+    Daily task rollup keyed by (day created, assigned_to, status, priority).
+    """
+    assigned_to = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name='+'
+    )
+    priority = models.CharField(max_length=1)
+
+    class Meta:
+        unique_together = ['day', 'assigned_to', 'status', 'priority']
+
+
+class CustomerFact(FactTable):
+    """
+    Daily customer rollup keyed by (day created, owner, status, engagement_level, region).
+    """
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name='+'
+    )
+    engagement_level = models.CharField(max_length=10)
+    region = models.CharField(max_length=10)
+
+    class Meta:
+        unique_together = ['day', 'owner', 'status', 'engagement_level', 'region']
+
+
+class DataGeneration(models.Model):
+    """
+    Version counter of the data behind cached analytics, see CacheManager.
+
+    Counters live in the database rather than the cache backend so bumps are
+    atomic UPDATEs; DatabaseCache implements incr as a read and a write, and
+    two concurrent bumps could collapse into one.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
@@ -0,0 +1,309 @@
+"""
+PDF rendering for generated reports.
+
+Layout and rasterization are CPU bound, so they run in a process pool rather
+than on the web workers. The functions at module level are what the pool
+processes execute: they only take plain data and never touch Django, which
+keeps them importable in a freshly spawned interpreter.
+"""
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont, features
+
+logger = logging.getLogger('reporting')
+
+# A4 at 150 dpi
+DPI = 150
+PAGE_SIZE = (1240, 1754)
+MARGIN = 90
+CHART_SIZE = (PAGE_SIZE[0] - 2 * MARGIN, 460)
+# Bump when page layout or chart drawing changes, so stored PDFs and chart rasters are redrawn
+LAYOUT_VERSION = 1
+PALETTE = ['#007bff', '#28a745', '#ffc107', '#dc3545', '#17a2b8', '#6f42c1', '#fd7e14', '#20c997']
+
+_fonts = {}
+
+
+def render_pdf(document, chart_cache_dir):
+    """Lay out a report document and return the PDF bytes."""
+    pages = _PageWriter()
+    pages.text(document['title'], 'title')
+    pages.text(document['subtitle'], 'muted')
+    pages.space(20)
+
+    for chart in document.get('charts', []):
+        pages.image(rasterize_chart(chart, chart_cache_dir))
+        pages.space(30)
+
+    for row in document['rows']:
+        pages.row(row)
+
+    output = BytesIO()
+    first, *rest = pages.finish()
+    first.save(output, 'PDF', resolution=DPI, save_all=True, append_images=rest)
+    return output.getvalue()
+
+
+def rasterize_chart(chart, cache_dir):
+    """Return the chart as an image, drawing it only if no raster of the same data is cached."""
+    key_data = json.dumps({'chart': chart, 'version': LAYOUT_VERSION}, sort_keys=True, default=str)
+    path = os.path.join(cache_dir, hashlib.sha256(key_data.encode()).hexdigest() + '.png')
+    if os.path.exists(path):
+        try:
+            with Image.open(path) as cached:
+                return cached.convert('RGB')
+        except OSError:
+            logger.warning('Ignoring unreadable chart raster %s', path)
+
+    image = _draw_chart(chart)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        image.save(tmp, 'PNG')
+    os.replace(tmp_path, path)
+    return image
+
+
+def _font(style):
+    if style not in _fonts:
+        size = {'title': 36, 'heading': 22, 'body': 16, 'muted': 16, 'small': 13}[style]
+        # The bundled scalable font needs FreeType; fall back to Pillow's bitmap font
+        _fonts[style] = ImageFont.load_default(size=size) if features.check('freetype2') else ImageFont.load_default()
+    return _fonts[style]
+
+
+def _fit(text, font, width):
+    """Truncate text with an ellipsis so it fits in width pixels."""
+    text = str(text)
+    if font.getlength(text) <= width:
+        return text
+    while text and font.getlength(text + '...') > width:
+        text = text[:-1]
+    return text + '...'
+
+
+class _PageWriter:
+    """Flows text rows and images down A4 page images, starting new pages as needed."""
+    LINE_HEIGHTS = {'title': 52, 'heading': 36, 'body': 26, 'muted': 26, 'small': 20}
+
+    def __init__(self):
+        self.pages = []
+        self._new_page()
+
+    def _new_page(self):
+        self.page = Image.new('RGB', PAGE_SIZE, 'white')
+        self.draw = ImageDraw.Draw(self.page)
+        self.pages.append(self.page)
+        self.y = MARGIN
+
+    def _ensure(self, height):
+        if self.y + height > PAGE_SIZE[1] - MARGIN:
+            self._new_page()
+
+    def space(self, height):
+        self.y += height
+
+    def text(self, value, style='body'):
+        height = self.LINE_HEIGHTS[style]
+        self._ensure(height)
+        fill = '#6c757d' if style == 'muted' else '#212529'
+        self.draw.text((MARGIN, self.y), _fit(value, _font(style), PAGE_SIZE[0] - 2 * MARGIN), font=_font(style), fill=fill)
+        self.y += height
+
+    def row(self, cells):
+        """Draw one report row; a row with only its first cell set is a section heading."""
+        cells = ['' if cell is None else str(cell) for cell in cells]
+        if not any(cells):
+            self.space(14)
+            return
+        if not any(cells[1:]) and cells[0].isupper():
+            self.space(10)
+            self.text(cells[0].title(), 'heading')
+            return
+
+        height = self.LINE_HEIGHTS['body']
+        self._ensure(height)
+        width = PAGE_SIZE[0] - 2 * MARGIN
+        first_width = int(width * 0.36)
+        other_width = (width - first_width) // max(len(cells) - 1, 1)
+        x = MARGIN
+        for index, cell in enumerate(cells):
+            column_width = first_width if index == 0 else other_width
+            self.draw.text((x, self.y), _fit(cell, _font('body'), column_width - 12), font=_font('body'), fill='#212529')
+            x += column_width
+        self.draw.line((MARGIN, self.y + height - 4, PAGE_SIZE[0] - MARGIN, self.y + height - 4), fill='#e9ecef')
+        self.y += height
+
+    def image(self, image):
+        self._ensure(image.height)
+        self.page.paste(image, (MARGIN, self.y))
+        self.y += image.height
+
+    def finish(self):
+        return self.pages
+
+
+def _draw_chart(chart):
+    image = Image.new('RGB', CHART_SIZE, 'white')
+    draw = ImageDraw.Draw(image)
+    draw.text((0, 0), chart.get('title', ''), font=_font('heading'), fill='#212529')
+    data = chart.get('data', {})
+    labels = [str(label) for label in data.get('labels', [])]
+    datasets = data.get('datasets', [])
+    values = [float(value or 0) for value in datasets[0].get('data', [])] if datasets else []
+
+    if not values:
+        draw.text((0, 60), 'No data', font=_font('muted'), fill='#6c757d')
+    elif chart.get('type') == 'pie':
+        _draw_pie(draw, labels, values)
+    else:
+        _draw_line(draw, labels, values, datasets[0].get('borderColor', PALETTE[0]))
+    return image
+
+
+def _draw_line(draw, labels, values, color):
+    left, top, right, bottom = 70, 50, CHART_SIZE[0] - 20, CHART_SIZE[1] - 50
+    peak = max(values) or 1
+    draw.line((left, top, left, bottom), fill='#adb5bd')
+    draw.line((left, bottom, right, bottom), fill='#adb5bd')
+    for step in range(5):
+        y = bottom - (bottom - top) * step / 4
+        draw.line((left, y, right, y), fill='#f1f3f5')
+        tick = peak * step / 4
+        draw.text((0, y - 8), f'{tick:,.0f}' if peak >= 10 else f'{tick:.1f}', font=_font('small'), fill='#6c757d')
+
+    span = max(len(values) - 1, 1)
+    points = [
+        (left + (right - left) * index / span, bottom - (bottom - top) * value / peak)
+        for index, value in enumerate(values)
+    ]
+    if len(points) > 1:
+        draw.line(points, fill=color, width=3)
+    for x, y in points:
+        draw.ellipse((x - 4, y - 4, x + 4, y + 4), fill=color)
+
+    # Label at most about ten points along the x axis
+    every = max(1, math.ceil(len(labels) / 10))
+    for index in range(0, len(labels), every):
+        x = points[index][0] if index < len(points) else right
+        draw.text((min(x - 30, right - 80), bottom + 10), _fit(labels[index][:10], _font('small'), 90), font=_font('small'), fill='#6c757d')
+
+
+def _draw_pie(draw, labels, values):
+    total = sum(values) or 1
+    box = (20, 50, 20 + CHART_SIZE[1] - 70, CHART_SIZE[1] - 20)
+    angle = -90.0
+    legend_x = box[2] + 60
+    for index, value in enumerate(values):
+        color = PALETTE[index % len(PALETTE)]
+        sweep = 360.0 * value / total
+        if sweep > 0:
+            draw.pieslice(box, angle, angle + sweep, fill=color, outline='white')
+        angle += sweep
+        legend_y = 70 + index * 30
+        label = labels[index] if index < len(labels) else ''
+        draw.rectangle((legend_x, legend_y, legend_x + 18, legend_y + 18), fill=color)
+        draw.text(
+            (legend_x + 30, legend_y), f'{label}: {value:,.0f} ({value / total:.0%})',
+            font=_font('body'), fill='#212529'
+        )
+
+
+class PdfRenderer:
+    """Renders reports to PDF on a process pool and keeps the files in the artifact store."""
+    _pool = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def build_document(report, include_charts=True):
+        """Plain-data description of a report for render_pdf."""
+        from .utils import ReportExporter
+
+        template = report.template
+        generated_at = report.completed_at or report.created_at
+        data = report.data_dict
+        return {
+            'title': template.name,
+            'subtitle': f"{template.report_type.replace('_', ' ').title()} report, "
+                        f"generated {generated_at:%Y-%m-%d %H:%M}",
+            'charts': ReportExporter.prepare_chart_data_for_pdf(data) if include_charts else [],
+            # The PDF shows the same tables as the CSV export, without its header block
+            'rows': list(ReportExporter.report_rows(data, template.name, template.report_type, generated_at))[5:],
+        }
+
+    @staticmethod
+    def render(report, include_charts=True):
+        """Return (path, content hash) of the report's PDF, rendering it if needed."""
+        return PdfRenderer.render_batch([report], include_charts)[0]
+
+    @staticmethod
+    def render_batch(reports, include_charts=True):
+        """
+        Render several reports at once, in parallel across the pool.
+
+        Returns (path, content hash) per report, in order. Reports whose PDF is
+        already stored are not rendered again.
+        """
+        from .artifacts import ReportArtifactStore
+
+        options = {'charts': include_charts, 'layout': LAYOUT_VERSION}
+        pool = PdfRenderer._get_pool()
+        chart_cache_dir = os.path.join(ReportArtifactStore.root(), 'charts')
+
+        # Reports with identical content, e.g. schedules sharing a generation, are rendered once
+        futures = {}
+
+        def submit(report, digest):
+            if digest not in futures:
+                futures[digest] = pool.submit(
+                    render_pdf, PdfRenderer.build_document(report, include_charts), chart_cache_dir
+                )
+            return futures[digest]
+
+        for report in reports:
+            path, digest = ReportArtifactStore.locate(report, 'pdf', options)
+            if not os.path.exists(path):
+                submit(report, digest)
+
+        timeout = PdfRenderer._settings().get('TIMEOUT', 120)
+        results = []
+        try:
+            for report in reports:
+                digest = ReportArtifactStore.content_hash(report, 'pdf', options)
+                # A file found above may have been removed since; it is then rendered now
+                results.append(ReportArtifactStore.get_or_render(
+                    report, 'pdf', lambda report=report, digest=digest: submit(report, digest).result(timeout), options
+                ))
+        except BrokenProcessPool:
+            # A renderer process died; start a fresh pool for the next request
+            with PdfRenderer._lock:
+                if PdfRenderer._pool is pool:
+                    PdfRenderer._pool = None
+            raise
+        return results
+
+    @staticmethod
+    def _settings():
+        from django.conf import settings
+        return settings.ANALYTICS_SETTINGS.get('PDF_RENDERING', {})
+
+    @classmethod
+    def _get_pool(cls):
+        with cls._lock:
+            if cls._pool is None:
+                # Spawned rather than forked: web and scheduler processes hold threads and DB connections
+                cls._pool = ProcessPoolExecutor(
+                    max_workers=cls._settings().get('WORKERS', 2),
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return cls._pool
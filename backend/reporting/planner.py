@@ -0,0 +1,361 @@
+"""
+Query planner for custom reports.
+
+A custom report template describes what to aggregate rather than naming an
+AnalyticsService method:
+
+    filters:    {'source': 'sales', 'status': ['WON', 'NEGOTIATION'], 'min_amount': 1000}
+    metrics:    ['count', 'total_amount']
+    grouping:   {'period': 'month', 'dimensions': ['status', 'assigned_to']}
+    date_range: {'start': '2024-01-01', 'end': '2024-12-31'}
+
+Only the sources, metrics, dimensions and filters declared in SOURCES can be
+used. The spec is compiled into a plan that runs as one grouped aggregation
+query; compiled plans are cached per template version.
+"""
+import math
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from customers.models import Customer
+from sales.models import Sale
+from tasks.models import Task
+
+from .caching import LocalCache
+from .metrics import Metric, MetricSet
+from .timeseries import TimeSeriesBuilder
+
+PLANNER_SETTINGS = settings.ANALYTICS_SETTINGS.get('CUSTOM_REPORTS', {})
+
+
+def choice_codes(choices):
+    return [code for code, _ in choices]
+
+
+# Everything a custom report may touch. Filters map to (lookup, kind), where
+# kind is a list of allowed codes, 'id', 'number' or 'bool'.
+SOURCES = {
+    'sales': {
+        'date_field': 'expected_close_date',
+        'fallback_date_field': 'created_at',
+        'metrics': MetricSet(
+            Metric('count'),
+            Metric('total_amount', 'sum', 'amount'),
+            Metric('avg_amount', 'avg', 'amount'),
+            Metric('won_count', filter=Q(status='WON')),
+            Metric('won_amount', 'sum', 'amount', filter=Q(status='WON')),
+            Metric('lost_count', filter=Q(status='LOST')),
+            Metric('pipeline_value', 'sum', 'amount', filter=~Q(status__in=['WON', 'LOST'])),
+        ),
+        'dimensions': {
+            'status': 'status',
+            'priority': 'priority',
+            'assigned_to': 'assigned_to__username',
+            'customer': 'customer__name',
+            'customer_region': 'customer__region',
+        },
+        'filters': {
+            'status': ('status', choice_codes(Sale.STATUS_CHOICES)),
+            'priority': ('priority', choice_codes(Sale.PRIORITY_CHOICES)),
+            'customer_region': ('customer__region', choice_codes(Customer.REGION_CHOICES)),
+            'assigned_to': ('assigned_to_id', 'id'),
+            'customer': ('customer_id', 'id'),
+            'min_amount': ('amount__gte', 'number'),
+            'max_amount': ('amount__lte', 'number'),
+            'is_archived': ('is_archived', 'bool'),
+        },
+    },
+    'tasks': {
+        'date_field': 'created_at',
+        'fallback_date_field': None,
+        'metrics': MetricSet(
+            Metric('count'),
+            Metric('completed', filter=Q(status='C')),
+            Metric('pending', filter=Q(status='P')),
+            Metric('in_progress', filter=Q(status='IP')),
+            Metric('overdue', filter=Q(status='O')),
+        ),
+        'dimensions': {
+            'status': 'status',
+            'priority': 'priority',
+            'assigned_to': 'assigned_to__username',
+            'created_by': 'created_by__username',
+        },
+        'filters': {
+            'status': ('status', choice_codes(Task.STATUS_CHOICES)),
+            'priority': ('priority', choice_codes(Task.PRIORITY_CHOICES)),
+            'assigned_to': ('assigned_to_id', 'id'),
+            'created_by': ('created_by_id', 'id'),
+        },
+    },
+    'customers': {
+        'date_field': 'created_at',
+        'fallback_date_field': None,
+        'metrics': MetricSet(
+            Metric('count'),
+            Metric('active_count', filter=Q(status='ACTIVE')),
+            Metric('vip_count', filter=Q(engagement_level='VIP')),
+        ),
+        'dimensions': {
+            'status': 'status',
+            'region': 'region',
+            'engagement_level': 'engagement_level',
+            'owner': 'owner__username',
+            'country': 'country',
+        },
+        'filters': {
+            'status': ('status', choice_codes(Customer.STATUS_CHOICES)),
+            'region': ('region', choice_codes(Customer.REGION_CHOICES)),
+            'engagement_level': ('engagement_level', choice_codes(Customer.ENGAGEMENT_LEVEL_CHOICES)),
+            'owner': ('owner_id', 'id'),
+            'is_active': ('is_active', 'bool'),
+        },
+    },
+}
+
+# Filter keys that are not field filters: the source itself, and the target user
+# the report generator already applies
+RESERVED_FILTERS = ('source', 'user_id')
+
+
+class ReportPlanError(ValueError):
+    """Raised when a custom report spec is invalid or would be too expensive to run."""
+
+
+class ReportPlan:
+    """A compiled custom report: one grouped aggregation over a source."""
+
+    def __init__(self, source, metrics, dimensions, period, filter_q, date_range, start, end):
+        self.source = source
+        self.metrics = metrics
+        # Output name -> ORM lookup
+        self.dimensions = dimensions
+        self.period = period
+        self.filter_q = filter_q
+        # As given in the template, and parsed
+        self.given_date_range = date_range
+        self.start = start
+        self.end = end
+
+    def bounds(self):
+        """
+        Start and end of the report. An open start is capped at the maximum
+        span; an open end stays open (None), so deals closing later are kept.
+        """
+        span = timedelta(days=CustomReportPlanner.max_date_span_days())
+        return self.start or (self.end or timezone.now()) - span, self.end
+
+    def date_range(self):
+        """The date range to filter by, keeping the template's own values where it has them."""
+        start, _ = self.bounds()
+        return {
+            'start': self.given_date_range.get('start') or start,
+            'end': self.given_date_range.get('end'),
+        }
+
+    def estimated_groups(self):
+        """Upper bound on result rows, where the dimensions have a fixed set of values."""
+        groups = 1
+        for name in self.dimensions:
+            codes = SOURCES[self.source]['filters'].get(name, (None, None))[1]
+            if isinstance(codes, list):
+                groups *= len(codes)
+        if self.period:
+            start, end = self.bounds()
+            # Periods after today are only known once run; the row cap is checked again then
+            days = ((end or timezone.now()) - start).days + 1
+            period_days = {'day': 1, 'week': 7, 'month': 28, 'quarter': 90}[self.period]
+            groups *= math.ceil(days / period_days) + 1
+        return groups
+
+    def columns(self):
+        keys = (['period'] if self.period else []) + list(self.dimensions) + [m.name for m in self.metrics.metrics]
+        return [{'key': key, 'label': key.replace('_', ' ').title()} for key in keys]
+
+
+class CustomReportPlanner:
+    """Compiles custom report specs into plans and runs them."""
+    _plans = LocalCache(max_entries=PLANNER_SETTINGS.get('PLAN_CACHE_SIZE', 256))
+    # Plans are keyed by template version, so they only expire to free memory
+    PLAN_TTL = 3600
+
+    @staticmethod
+    def max_groups():
+        return PLANNER_SETTINGS.get('MAX_GROUPS', 1000)
+
+    @staticmethod
+    def max_date_span_days():
+        return PLANNER_SETTINGS.get('MAX_DATE_SPAN_DAYS', 732)
+
+    @staticmethod
+    def compile(filters, metrics, grouping, date_range):
+        """Validate a spec against the whitelist and return its ReportPlan."""
+        filters = filters or {}
+        grouping = grouping or {}
+        source = filters.get('source', 'sales')
+        if source not in SOURCES:
+            raise ReportPlanError(f"Unknown source '{source}'. Use one of: {', '.join(SOURCES)}")
+        spec = SOURCES[source]
+
+        available = {metric.name: metric for metric in spec['metrics'].metrics}
+        metrics = metrics or ['count']
+        unknown = [name for name in metrics if name not in available]
+        if unknown:
+            raise ReportPlanError(f"Unknown {source} metrics: {', '.join(map(str, unknown))}")
+
+        dimension_names = grouping.get('dimensions', [])
+        unknown = [name for name in dimension_names if name not in spec['dimensions']]
+        if unknown:
+            raise ReportPlanError(f"Unknown {source} dimensions: {', '.join(map(str, unknown))}")
+        if len(dimension_names) > PLANNER_SETTINGS.get('MAX_DIMENSIONS', 3):
+            raise ReportPlanError(f"At most {PLANNER_SETTINGS.get('MAX_DIMENSIONS', 3)} dimensions can be used")
+
+        period = grouping.get('period')
+        if period and period not in TimeSeriesBuilder.TRUNC_FUNCTIONS:
+            raise ReportPlanError(
+                f"Unknown period '{period}'. Use one of: {', '.join(TimeSeriesBuilder.TRUNC_FUNCTIONS)}"
+            )
+
+        filter_q = Q()
+        for name, value in filters.items():
+            if name in RESERVED_FILTERS:
+                continue
+            if name not in spec['filters']:
+                raise ReportPlanError(f"Unknown {source} filter '{name}'")
+            lookup, kind = spec['filters'][name]
+            filter_q &= CustomReportPlanner._filter(name, lookup, kind, value)
+
+        date_range = date_range or {}
+        start, end = CustomReportPlanner._date_bounds(date_range)
+        plan = ReportPlan(
+            source,
+            MetricSet(*(available[name] for name in dict.fromkeys(metrics))),
+            {name: spec['dimensions'][name] for name in dict.fromkeys(dimension_names)},
+            period,
+            filter_q,
+            date_range,
+            start,
+            end,
+        )
+        if plan.estimated_groups() > CustomReportPlanner.max_groups():
+            raise ReportPlanError(
+                f"This report could return more than {CustomReportPlanner.max_groups()} rows; "
+                f"use a coarser period, fewer dimensions or a shorter date range"
+            )
+        return plan
+
+    @staticmethod
+    def plan_for(template):
+        """Return the compiled plan of a template, compiling it once per template version."""
+        key = (template.id, template.updated_at)
+        found, plan = CustomReportPlanner._plans.get(key)
+        if not found:
+            plan = CustomReportPlanner.compile(
+                template.filters_dict, template.metrics_list, template.grouping_dict, template.date_range_dict
+            )
+            CustomReportPlanner._plans.set(key, plan, CustomReportPlanner.PLAN_TTL)
+        return plan
+
+    @staticmethod
+    def run(template, user):
+        """Generate the data of a custom report template for user."""
+        from .analytics import convert_decimals_to_float
+        from .utils import ReportExporter
+
+        plan = CustomReportPlanner.plan_for(template)
+        spec = SOURCES[plan.source]
+        # Role rules are the same as for the raw record export of the source
+        queryset = ReportExporter.raw_queryset(plan.source, template, user, date_range=plan.date_range())
+        queryset = queryset.filter(plan.filter_q)
+
+        fields = list(plan.dimensions.values())
+        builder = TimeSeriesBuilder(plan.period) if plan.period else None
+        if builder:
+            queryset = queryset.annotate(
+                period=builder.period_expression(spec['date_field'], spec['fallback_date_field'])
+            )
+            fields.insert(0, 'period')
+
+        max_groups = CustomReportPlanner.max_groups()
+        grouped = queryset.values(*fields).annotate(**plan.metrics.expressions()).order_by(*fields)
+        # The estimate cannot bound free-form dimensions such as users; fetch one row past the cap to check
+        results = list(grouped[:max_groups + 1]) if fields else [plan.metrics.compute(queryset)]
+        if len(results) > max_groups:
+            raise ReportPlanError(
+                f"This report returns more than {max_groups} rows; add filters or use fewer dimensions"
+            )
+
+        rows = []
+        for result in results:
+            row = {}
+            if builder:
+                row['period'] = builder.truncate(result['period']) if result['period'] else None
+            for name, lookup in plan.dimensions.items():
+                row[name] = result[lookup]
+            for metric in plan.metrics.metrics:
+                value = result[metric.name]
+                row[metric.name] = metric.default if value is None else value
+            rows.append(row)
+
+        # Totals of the metrics that add up across groups
+        summary = {'groups': len(rows)}
+        for metric in plan.metrics.metrics:
+            if metric.aggregate != 'avg':
+                summary[metric.name] = sum(row[metric.name] for row in rows)
+
+        return convert_decimals_to_float({
+            'source': plan.source,
+            'columns': plan.columns(),
+            'rows': rows,
+            'summary': summary,
+        })
+
+    @staticmethod
+    def _filter(name, lookup, kind, value):
+        values = value if isinstance(value, list) else [value]
+        if not values:
+            raise ReportPlanError(f"Filter '{name}' needs a value")
+
+        if isinstance(kind, list):
+            invalid = [v for v in values if v not in kind]
+            if invalid:
+                raise ReportPlanError(f"Invalid values for filter '{name}': {', '.join(map(str, invalid))}")
+        elif kind == 'id':
+            try:
+                values = [int(v) for v in values]
+            except (TypeError, ValueError):
+                raise ReportPlanError(f"Filter '{name}' takes record ids")
+        elif kind == 'number':
+            if isinstance(value, list):
+                raise ReportPlanError(f"Filter '{name}' takes a single number")
+            try:
+                values = [Decimal(str(value))]
+            except InvalidOperation:
+                raise ReportPlanError(f"Filter '{name}' takes a number")
+        elif kind == 'bool':
+            if not isinstance(value, bool):
+                raise ReportPlanError(f"Filter '{name}' takes true or false")
+
+        if len(values) > 1:
+            return Q(**{f'{lookup}__in': values})
+        return Q(**{lookup: values[0]})
+
+    @staticmethod
+    def _date_bounds(date_range):
+        """Parse a template date range and check it against the maximum span."""
+        try:
+            start = TimeSeriesBuilder._to_datetime(date_range['start']) if date_range.get('start') else None
+            end = TimeSeriesBuilder._to_datetime(date_range['end']) if date_range.get('end') else None
+        except (TypeError, ValueError, OverflowError):
+            raise ReportPlanError("Date range must hold ISO 'start' and 'end' dates")
+        if start and end and start > end:
+            raise ReportPlanError('Date range start must not be after its end')
+        if start and (end or timezone.now()) - start > timedelta(days=CustomReportPlanner.max_date_span_days()):
+            raise ReportPlanError(
+                f"Custom reports can cover at most {CustomReportPlanner.max_date_span_days()} days"
+            )
+        return start, end
@@ -0,0 +1,182 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .jobs import ReportGenerator, timed_step
+from .models import ReportSchedule, GeneratedReport
+from .pdf import PdfRenderer
+from .utils import ReportExporter, ScheduledReportManager
+
+logger = logging.getLogger('reporting')
+RUNNER_SETTINGS = settings.ANALYTICS_SETTINGS.get('SCHEDULE_RUNNER', {})
+
+
+class ScheduleRunner:
+    """
+    Executes due report schedules in batches.
+
+    A batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED and its next_run
+    is advanced in the same short transaction, so any number of runners can
+    poll the table without picking up the same schedule twice. Delivery is
+    at most once: a runner that dies after claiming a batch skips that run.
+
+    Schedules asking for the same report with the same data scope share one
+    generation, which runs on a bounded thread pool. The batch is then mailed
+    to its recipients over a single SMTP connection.
+    """
+
+    def __init__(self, batch_size=None, workers=None):
+        self.batch_size = batch_size or RUNNER_SETTINGS.get('BATCH_SIZE', 50)
+        self.workers = workers or RUNNER_SETTINGS.get('WORKERS', 4)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='schedule-worker')
+
+    def run_once(self):
+        """Claim and run one batch of due schedules. Returns the number of schedules claimed."""
+        # The daemon outlives any single connection's CONN_MAX_AGE
+        close_old_connections()
+        schedules = self.claim_due()
+        if not schedules:
+            return 0
+
+        # One generation per distinct report, shared by every schedule that asks for it
+        groups = {}
+        for schedule in schedules:
+            params_hash = ReportGenerator.params_hash(schedule.template, schedule.creator)
+            groups.setdefault(params_hash, []).append(schedule)
+
+        futures = [
+            (group, params_hash, self._executor.submit(self._generate, group[0]))
+            for params_hash, group in groups.items()
+        ]
+
+        reports = []
+        for group, params_hash, future in futures:
+            result = future.result()
+            reports.extend(self._store(group, params_hash, result))
+
+        sent = self.deliver(reports)
+        logger.info('Ran %d report schedules (%d reports generated, %d emails sent)',
+                    len(schedules), len(groups), sent)
+        return len(schedules)
+
+    def claim_due(self):
+        """Lock a batch of due schedules, advance their next_run and return them."""
+        now = timezone.now()
+        with transaction.atomic():
+            schedules = list(
+                ReportSchedule.objects.select_for_update(skip_locked=True, of=('self',))
+                .select_related('template', 'creator')
+                .filter(is_active=True, next_run__lte=now)
+                .order_by('next_run')[:self.batch_size]
+            )
+            for schedule in schedules:
+                schedule.last_run = now
+                try:
+                    schedule.next_run = ScheduledReportManager.calculate_next_run(schedule)
+                except (TypeError, ValueError):
+                    # A schedule that cannot be placed would otherwise be claimed forever
+                    logger.error('Deactivating report schedule %s: invalid schedule configuration', schedule.id)
+                    schedule.is_active = False
+                    schedule.next_run = None
+            ReportSchedule.objects.bulk_update(schedules, ['last_run', 'next_run', 'is_active'])
+        return schedules
+
+    def deliver(self, reports):
+        """Email completed reports to their schedule's recipients over one SMTP connection."""
+        reports = [
+            (schedule, report) for schedule, report in reports
+            if report.status == 'completed' and schedule.recipients_list
+        ]
+        if not reports:
+            return 0
+
+        pdfs = [None] * len(reports)
+        if RUNNER_SETTINGS.get('ATTACH_PDF', True):
+            # The whole batch renders in parallel on the PDF process pool
+            try:
+                pdfs = [path for path, _ in PdfRenderer.render_batch([report for _, report in reports])]
+            except Exception:
+                logger.exception('Failed to render PDFs for %d scheduled reports', len(reports))
+
+        messages = [
+            self._build_message(schedule, report, pdf_path)
+            for (schedule, report), pdf_path in zip(reports, pdfs)
+        ]
+        try:
+            with get_connection() as mail_connection:
+                return mail_connection.send_messages(messages) or 0
+        except Exception:
+            logger.exception('Failed to deliver %d scheduled reports', len(messages))
+            return 0
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    @staticmethod
+    def _generate(schedule):
+        """Worker entry point: generate one report and return its data, summary and timings."""
+        timings = {}
+        started_at = timezone.now()
+        try:
+            with timed_step(timings, 'data'):
+                data = ReportGenerator.generate_data(schedule.template, schedule.creator)
+            with timed_step(timings, 'summary'):
+                summary = ReportGenerator.calculate_summary_stats(data)
+            return {'data': data, 'summary': summary, 'timings': timings,
+                    'started_at': started_at, 'completed_at': timezone.now()}
+        except Exception as e:
+            logger.exception('Scheduled report %s failed', schedule.id)
+            return {'error': str(e), 'timings': timings,
+                    'started_at': started_at, 'completed_at': timezone.now()}
+        finally:
+            # Pool threads must not hold on to their database connections
+            connection.close()
+
+    @staticmethod
+    def _store(schedules, params_hash, result):
+        """Create a GeneratedReport for each schedule from a shared generation result."""
+        packed_data = GeneratedReport.pack_data(result.get('data', {}))
+        reports = GeneratedReport.objects.bulk_create([
+            GeneratedReport(
+                template=schedule.template,
+                generated_by=schedule.creator,
+                params_hash=params_hash,
+                status='failed' if 'error' in result else 'completed',
+                error_message=result.get('error'),
+                **packed_data,
+                summary_stats=result.get('summary', {}),
+                section_timings=result['timings'],
+                started_at=result['started_at'],
+                completed_at=result['completed_at'],
+                execution_time=result['completed_at'] - result['started_at'],
+            )
+            for schedule in schedules
+        ])
+        return list(zip(schedules, reports))
+
+    @staticmethod
+    def _build_message(schedule, report, pdf_path=None):
+        template = schedule.template
+        generated_on = report.completed_at.strftime('%Y-%m-%d')
+        message = EmailMessage(
+            subject=f'{schedule.name} - {generated_on}',
+            body=(
+                f'Your scheduled report "{template.name}" was generated on {generated_on}.\n'
+                f'The report is attached.'
+            ),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=schedule.recipients_list,
+        )
+        csv_content = ReportExporter.render_csv(
+            ReportExporter.report_rows(report.data_dict, template.name, template.report_type, report.completed_at)
+        )
+        safe_name = ''.join(c for c in template.name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        message.attach(f'{safe_name}_{generated_on}.csv', csv_content, 'text/csv')
+        if pdf_path:
+            with open(pdf_path, 'rb') as pdf:
+                message.attach(f'{safe_name}_{generated_on}.pdf', pdf.read(), 'application/pdf')
+        return message
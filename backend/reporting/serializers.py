@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from .planner import CustomReportPlanner, ReportPlanError
+from .utils import ScheduledReportManager
 from .models import (
     ReportTemplate, GeneratedReport, ReportSchedule,
     DashboardWidget, UserDashboard, DashboardWidgetPosition,
@@ -36,7 +38,24 @@ class ReportTemplateSerializer(serializers.ModelSerializer):
             'is_public', 'is_active', 'created_at', 'updated_at'
         ]
         read_only_fields = ['creator', 'created_at', 'updated_at']
-    
+
+    def validate(self, attrs):
+        def current(name):
+            if name in attrs:
+                return attrs[name]
+            return getattr(self.instance, name) if self.instance else None
+
+        # Custom reports are checked against the planner's whitelist and cost guards up front
+        if current('report_type') == 'custom':
+            try:
+                CustomReportPlanner.compile(
+                    current('filters_dict'), current('metrics_list'),
+                    current('grouping_dict'), current('date_range_dict')
+                )
+            except ReportPlanError as e:
+                raise serializers.ValidationError({'non_field_errors': [str(e)]})
+        return attrs
+
     def create(self, validated_data):
         # Extract JSON fields
         filters_dict = validated_data.pop('filters_dict', {})
@@ -91,15 +110,31 @@ class GeneratedReportSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'template', 'template_id', 'generated_by', 'status',
             'execution_time', 'error_message', 'data', 'summary_stats',
+            'started_at', 'completed_at', 'section_timings',
             'csv_file_path', 'pdf_file_path', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['generated_by', 'created_at', 'updated_at']
+        read_only_fields = [
+            'generated_by', 'started_at', 'completed_at', 'section_timings', 'csv_file_path', 'pdf_file_path',
+            'created_at', 'updated_at'
+        ]
     
     def create(self, validated_data):
         validated_data['generated_by'] = self.context['request'].user
         return super().create(validated_data)
 
 
+class GeneratedReportListSerializer(GeneratedReportSerializer):
+    """Generated report without its payload, for list views."""
+    data = None
+    summary_stats = None
+
+    class Meta(GeneratedReportSerializer.Meta):
+        fields = [
+            field for field in GeneratedReportSerializer.Meta.fields
+            if field not in ('data', 'summary_stats')
+        ]
+
+
 class ReportScheduleSerializer(serializers.ModelSerializer):
     template = ReportTemplateSerializer(read_only=True)
     creator = UserBasicSerializer(read_only=True)
@@ -120,6 +155,8 @@ class ReportScheduleSerializer(serializers.ModelSerializer):
         validated_data['creator'] = self.context['request'].user
         instance = super().create(validated_data)
         instance.recipients_list = recipients_list
+        # The schedule runner only picks up schedules with a next_run
+        instance.next_run = ScheduledReportManager.calculate_next_run(instance) if instance.is_active else None
         instance.save()
         return instance
     
@@ -128,7 +165,8 @@ class ReportScheduleSerializer(serializers.ModelSerializer):
         instance = super().update(instance, validated_data)
         if recipients_list is not None:
             instance.recipients_list = recipients_list
-            instance.save()
+        instance.next_run = ScheduledReportManager.calculate_next_run(instance) if instance.is_active else None
+        instance.save()
         return instance
     
     def validate_day_of_week(self, value):
@@ -282,7 +320,7 @@ class CustomReportRequestSerializer(serializers.Serializer):
     ])
     date_range = serializers.DictField(required=False)
     grouping = serializers.ChoiceField(
-        choices=['day', 'week', 'month'],
+        choices=['day', 'week', 'month', 'quarter'],
         default='month'
     )
     filters = serializers.DictField(default=dict)
@@ -0,0 +1,148 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from sales.models import Sale
+from customers.models import Customer
+from tasks.models import Task
+from .cube import RollupCube
+from .artifacts import ReportArtifactStore
+from .models import SaleFact, TaskFact, CustomerFact, GeneratedReport
+from .utils import CacheManager
+
+
+def _sale_amount(values):
+    return values['amount'] or Decimal('0')
+
+
+# Sale facts
+@receiver(pre_save, sender=Sale)
+def snapshot_sale_fact(sender, instance, **kwargs):
+    """Remember which fact row the sale counted towards before this save."""
+    instance._original_fact = None
+    original = instance.original_values(*RollupCube.SALE_FIELDS, 'customer_id')
+    if original:
+        if original['customer_id'] == instance.customer_id:
+            region = instance.customer.region
+        else:
+            region = Customer.objects.filter(pk=original['customer_id']).values_list('region', flat=True).first()
+        instance._original_fact = (
+            RollupCube.sale_key(original, region),
+            _sale_amount(original),
+        )
+
+
+@receiver(post_save, sender=Sale)
+def update_sale_fact(sender, instance, created, **kwargs):
+    """Move the sale from its previous fact row to its current one."""
+    values = RollupCube.field_values(instance, RollupCube.SALE_FIELDS)
+    old_key, old_amount = getattr(instance, '_original_fact', None) or (None, None)
+    RollupCube.move(
+        SaleFact,
+        old_key,
+        RollupCube.sale_key(values, instance.customer.region),
+        old_amount,
+        _sale_amount(values)
+    )
+
+
+@receiver(pre_delete, sender=Sale)
+def snapshot_deleted_sale_fact(sender, instance, **kwargs):
+    """Capture the fact key while the customer row still exists."""
+    values = RollupCube.field_values(instance, RollupCube.SALE_FIELDS)
+    instance._original_fact = (
+        RollupCube.sale_key(values, instance.customer.region),
+        _sale_amount(values),
+    )
+
+
+@receiver(post_delete, sender=Sale)
+def remove_sale_fact(sender, instance, **kwargs):
+    """Take the deleted sale out of the cube."""
+    old_key, old_amount = getattr(instance, '_original_fact', None) or (None, None)
+    RollupCube.move(SaleFact, old_key, None, old_amount, None)
+
+
+# Task facts
+@receiver(pre_save, sender=Task)
+def snapshot_task_fact(sender, instance, **kwargs):
+    """Remember which fact row the task counted towards before this save."""
+    original = instance.original_values(*RollupCube.TASK_FIELDS)
+    instance._original_fact = RollupCube.task_key(original) if original else None
+
+
+@receiver(post_save, sender=Task)
+def update_task_fact(sender, instance, created, **kwargs):
+    """Move the task from its previous fact row to its current one."""
+    RollupCube.move(
+        TaskFact,
+        getattr(instance, '_original_fact', None),
+        RollupCube.task_key(RollupCube.field_values(instance, RollupCube.TASK_FIELDS))
+    )
+
+
+@receiver(post_delete, sender=Task)
+def remove_task_fact(sender, instance, **kwargs):
+    """Take the deleted task out of the cube."""
+    RollupCube.move(
+        TaskFact,
+        RollupCube.task_key(RollupCube.field_values(instance, RollupCube.TASK_FIELDS)),
+        None
+    )
+
+
+# Customer facts
+@receiver(pre_save, sender=Customer)
+def snapshot_customer_fact(sender, instance, **kwargs):
+    """Remember which fact row the customer counted towards before this save."""
+    original = instance.original_values(*RollupCube.CUSTOMER_FIELDS)
+    instance._original_fact = RollupCube.customer_key(original) if original else None
+
+
+@receiver(post_save, sender=Customer)
+def update_customer_fact(sender, instance, created, **kwargs):
+    """Move the customer to its current fact row, and its sales if the region changed."""
+    old_key = getattr(instance, '_original_fact', None)
+    new_key = RollupCube.customer_key(RollupCube.field_values(instance, RollupCube.CUSTOMER_FIELDS))
+    RollupCube.move(CustomerFact, old_key, new_key)
+
+    # Sale facts are keyed by the customer's region
+    if old_key and old_key['region'] != new_key['region']:
+        for values in instance.sales.values(*RollupCube.SALE_FIELDS):
+            RollupCube.move(
+                SaleFact,
+                RollupCube.sale_key(values, old_key['region']),
+                RollupCube.sale_key(values, new_key['region']),
+                _sale_amount(values),
+                _sale_amount(values)
+            )
+
+
+@receiver(post_delete, sender=Customer)
+def remove_customer_fact(sender, instance, **kwargs):
+    """Take the deleted customer out of the cube."""
+    RollupCube.move(
+        CustomerFact,
+        RollupCube.customer_key(RollupCube.field_values(instance, RollupCube.CUSTOMER_FIELDS)),
+        None
+    )
+
+
+# Analytics cache invalidation
+@receiver([post_save, post_delete], sender=Sale)
+@receiver([post_save, post_delete], sender=Task)
+@receiver([post_save, post_delete], sender=Customer)
+def bump_analytics_generation(sender, **kwargs):
+    """Invalidate cached analytics built from the changed model once the write commits."""
+    model_name = sender._meta.model_name
+    transaction.on_commit(lambda: CacheManager.bump_generation(model_name))
+
+
+# Stored report exports
+@receiver(post_delete, sender=GeneratedReport)
+def delete_report_artifacts(sender, instance, **kwargs):
+    """Remove a deleted report's rendered export files once the delete commits."""
+    report_id = instance.pk
+    transaction.on_commit(lambda: ReportArtifactStore.delete(report_id))
@@ -0,0 +1,590 @@
+import os
+import tempfile
+import threading
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from time import sleep
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from customers.models import Customer
+from sales.models import Sale
+from tasks.models import Task
+from .analytics import AnalyticsService
+from .artifacts import ReportArtifactStore
+from .caching import TieredCache
+from .cube import RollupCube
+from .forecast import OPEN_STAGES, UNSCHEDULED, PipelineForecaster
+from .jobs import ReportGenerator, ReportJobQueue, timed_step
+from .models import SaleFact, TaskFact, CustomerFact, DataGeneration, GeneratedReport, ReportTemplate
+from .utils import CacheManager
+
+User = get_user_model()
+
+
+def without_cube():
+    return override_settings(ANALYTICS_SETTINGS={**settings.ANALYTICS_SETTINGS, 'USE_ROLLUP_CUBE': False})
+
+
+def midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def fact_rows(model):
+    return sorted(
+        tuple(sorted((key, value) for key, value in row.items() if key != 'id'))
+        for row in model.objects.values()
+    )
+
+
+class RollupCubeParityTests(TestCase):
+    """Day-aligned analytics must not change when answered from the rollup cube."""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.localdate()
+        cls.today = today
+        cls.ann = User.objects.create_user('ann@example.com', 'pw', role='MANAGER', first_name='Ann')
+        cls.bob = User.objects.create_user('bob@example.com', 'pw', role='USER', first_name='Bob')
+        north = Customer.objects.create(name='North', email='north@example.com', region='NA', owner=cls.ann)
+        europe = Customer.objects.create(name='Europe', email='europe@example.com', region='EU', owner=cls.bob)
+
+        def sale(title, customer, user, status, amount, close=None, created_days_ago=0):
+            created = Sale.objects.create(
+                title=title, customer=customer, assigned_to=user, status=status,
+                amount=amount, expected_close_date=close
+            )
+            if created_days_ago:
+                Sale.objects.filter(pk=created.pk).update(
+                    created_at=timezone.now() - timedelta(days=created_days_ago)
+                )
+            return created
+
+        sale('Closing today', north, cls.ann, 'NEGOTIATION', Decimal('500'), close=today)
+        sale('Closing last week', europe, cls.bob, 'WON', Decimal('1200'), close=today - timedelta(days=7))
+        sale('Closing next month', north, cls.ann, 'NEW', Decimal('300'), close=today + timedelta(days=35))
+        # Undated sales fall back to created_at; today's is outside a range ending at midnight today
+        sale('Undated today', north, cls.ann, 'PROPOSAL', Decimal('700'))
+        sale('Undated last week', europe, cls.bob, 'CONTACTED', Decimal('90'), created_days_ago=8)
+        # A status whose only sale has no amount
+        sale('No amount', europe, cls.bob, 'LOST', None, close=today - timedelta(days=3))
+
+        Task.objects.create(title='Call', assigned_to=cls.ann, created_by=cls.ann, status='C')
+        Task.objects.create(title='Email', assigned_to=cls.bob, created_by=cls.ann, status='P')
+        RollupCube.rebuild()
+
+    def date_ranges(self):
+        return [
+            None,
+            {'start': midnight(self.today - timedelta(days=30)), 'end': midnight(self.today)},
+            {'start': midnight(self.today - timedelta(days=30)), 'end': midnight(self.today + timedelta(days=1))},
+            {'start': midnight(self.today - timedelta(days=5)), 'end': None},
+        ]
+
+    def assertSameWithoutCube(self, report):
+        for date_range in self.date_ranges():
+            with self.subTest(date_range=date_range):
+                self.assertTrue(RollupCube.can_answer(date_range))
+                from_cube = report(date_range)
+                with without_cube():
+                    self.assertFalse(RollupCube.can_answer(date_range))
+                    self.assertEqual(from_cube, report(date_range))
+
+    def test_sales_performance(self):
+        self.assertSameWithoutCube(
+            lambda date_range: AnalyticsService.get_sales_performance_data(self.ann, date_range, 'day')
+        )
+
+    def test_sales_performance_for_target_user(self):
+        self.assertSameWithoutCube(
+            lambda date_range: AnalyticsService.get_sales_performance_data(
+                self.ann, date_range, 'week', target_user=self.bob
+            )
+        )
+
+    def test_user_activity(self):
+        self.assertSameWithoutCube(
+            lambda date_range: AnalyticsService.get_user_activity_data(date_range, 'month')
+        )
+
+    def test_task_completion(self):
+        self.assertSameWithoutCube(
+            lambda date_range: AnalyticsService.get_task_completion_data(self.ann, date_range, 'day')
+        )
+
+    def test_undated_sale_created_on_end_day_is_excluded(self):
+        date_range = {'start': midnight(self.today - timedelta(days=30)), 'end': midnight(self.today)}
+        statuses = {
+            row['status'] for row in
+            AnalyticsService.get_sales_performance_data(self.ann, date_range)['sales_by_status']
+        }
+        self.assertIn('NEGOTIATION', statuses)
+        self.assertNotIn('PROPOSAL', statuses)
+
+    def test_missing_amounts_sum_to_zero(self):
+        for use_cube in (True, False):
+            with self.subTest(use_cube=use_cube), override_settings(
+                ANALYTICS_SETTINGS={**settings.ANALYTICS_SETTINGS, 'USE_ROLLUP_CUBE': use_cube}
+            ):
+                rows = AnalyticsService.get_sales_performance_data(self.ann)['sales_by_status']
+                lost = next(row for row in rows if row['status'] == 'LOST')
+                self.assertEqual(lost['total_amount'], 0)
+
+    def test_incremental_maintenance_matches_rebuild(self):
+        sale = Sale.objects.get(title='Undated today')
+        sale.expected_close_date = self.today + timedelta(days=2)
+        sale.amount = Decimal('650')
+        sale.save()
+        Sale.objects.get(title='Closing last week').delete()
+        moved = Sale.objects.get(title='Closing today')
+        moved.expected_close_date = None
+        moved.save()
+        customer = Customer.objects.get(name='Europe')
+        customer.region = 'APAC'
+        customer.save()
+        Task.objects.filter(title='Email').get().delete()
+
+        incremental = [fact_rows(model) for model in (SaleFact, TaskFact, CustomerFact)]
+        RollupCube.rebuild()
+        self.assertEqual(incremental, [fact_rows(model) for model in (SaleFact, TaskFact, CustomerFact)])
+
+
+class DashboardKpiTests(TestCase):
+
+    def test_trends_compare_equal_windows(self):
+        user = User.objects.create_user('kim@example.com', 'pw', role='ADMIN')
+        customer = Customer.objects.create(name='Acme', email='acme@example.com', owner=user)
+        for days_ago, amount in ((0, Decimal('100')), (40, Decimal('300')), (90, Decimal('50'))):
+            sale = Sale.objects.create(title='Deal', customer=customer, assigned_to=user, amount=amount)
+            Sale.objects.filter(pk=sale.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+        with override_settings(ANALYTICS_SETTINGS={**settings.ANALYTICS_SETTINGS, 'TREND_WINDOW_DAYS': 30}):
+            sales = AnalyticsService.get_dashboard_kpis(user)['sales']
+
+        self.assertEqual(sales['total_sales'], 3)
+        self.assertEqual(sales['trends']['total_sales'], {'current': 1, 'previous': 1, 'change_percentage': 0})
+        self.assertEqual(sales['trends']['total_amount']['current'], 100)
+        self.assertEqual(sales['trends']['total_amount']['previous'], 300)
+        # All-time totals have no previous window to compare with
+        self.assertFalse([key for key in sales if key.startswith('previous_')])
+
+
+class DataGenerationTests(TestCase):
+
+    def setUp(self):
+        CacheManager.local_generations.clear()
+
+    def test_bump_changes_cache_keys(self):
+        key = CacheManager.get_cache_key('global', 'sales_performance', {})
+        self.assertEqual(key, CacheManager.get_cache_key('global', 'sales_performance', {}))
+
+        CacheManager.bump_generation('sale')
+        self.assertNotEqual(key, CacheManager.get_cache_key('global', 'sales_performance', {}))
+        # Reports that do not read sales keep their keys
+        key = CacheManager.get_cache_key('global', 'task_completion', {})
+        CacheManager.bump_generation('sale')
+        self.assertEqual(key, CacheManager.get_cache_key('global', 'task_completion', {}))
+
+    def test_every_bump_moves_the_counter(self):
+        CacheManager.bump_generation('task')
+        first = DataGeneration.objects.get(name='task').value
+        for _ in range(3):
+            CacheManager.local_generations.clear()
+            CacheManager.bump_generation('task')
+        self.assertEqual(DataGeneration.objects.get(name='task').value, first + 3)
+        self.assertEqual(CacheManager.get_generations(['task']), {'task': first + 3})
+
+    def test_bump_after_reader_created_counter(self):
+        generation = CacheManager.get_generations(['customer'])['customer']
+        CacheManager.local_generations.clear()
+        CacheManager.bump_generation('customer')
+        self.assertEqual(CacheManager.get_generations(['customer'])['customer'], generation + 1)
+
+
+    def test_only_managers_clear_the_shared_cache(self):
+        from rest_framework.test import APIClient
+
+        user = User.objects.create_user('uma@example.com', 'pw', role='USER')
+        manager = User.objects.create_user('max@example.com', 'pw', role='MANAGER')
+        client = APIClient()
+        for person, shared_cleared in ((user, False), (manager, True)):
+            with self.subTest(role=person.role):
+                CacheManager.local_generations.clear()
+                before = CacheManager.get_generations(['scope:global', f'scope:user:{person.id}'])
+                client.force_authenticate(person)
+                self.assertEqual(client.post(reverse('reporting:analytics-clear-cache')).status_code, 200)
+                CacheManager.local_generations.clear()
+                after = CacheManager.get_generations(['scope:global', f'scope:user:{person.id}'])
+                self.assertNotEqual(after[f'scope:user:{person.id}'], before[f'scope:user:{person.id}'])
+                self.assertEqual(after['scope:global'] != before['scope:global'], shared_cleared)
+
+@skipUnless(connection.vendor == 'postgresql', 'needs concurrent database connections')
+class ConcurrentDataGenerationTests(TransactionTestCase):
+
+    def test_concurrent_bumps_are_not_lost(self):
+        CacheManager.bump_generation('sale')
+        start = DataGeneration.objects.get(name='sale').value
+        barrier = threading.Barrier(8)
+
+        def bump():
+            barrier.wait()
+            try:
+                for _ in range(25):
+                    CacheManager.bump_generation('sale')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=bump) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(DataGeneration.objects.get(name='sale').value, start + 200)
+
+
+class TieredCacheLockTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.tiered = TieredCache(wait_timeout=0.2)
+
+    def test_lock_is_released_after_computing(self):
+        entry = self.tiered.get_or_compute('report', lambda: {'total': 1}, 60)
+        self.assertEqual(entry.value, {'total': 1})
+        self.assertIsNone(cache.get('report' + TieredCache.LOCK_SUFFIX))
+
+    def test_lock_of_another_process_is_left_alone(self):
+        lock_key = 'report' + TieredCache.LOCK_SUFFIX
+        cache.add(lock_key, 'other-process', 60)
+
+        # The other process never stores a value, so we compute after waiting
+        entry = self.tiered.get_or_compute('report', lambda: {'total': 2}, 60)
+        self.assertEqual(entry.value, {'total': 2})
+        self.assertEqual(self.tiered.stats.snapshot()['wait_timeouts'], 1)
+        self.assertEqual(cache.get(lock_key), 'other-process')
+
+    def test_lock_taken_over_after_expiry_is_left_alone(self):
+        lock_key = 'report' + TieredCache.LOCK_SUFFIX
+
+        def slow_compute():
+            # Our lock expired and another process took it over meanwhile
+            cache.set(lock_key, 'other-process', 60)
+            return {'total': 3}
+
+        self.tiered.get_or_compute('report', slow_compute, 60)
+        self.assertEqual(cache.get(lock_key), 'other-process')
+
+
+class ReportJobQueueTests(TransactionTestCase):
+    """Submits run on the real worker pool, so data has to be committed."""
+
+    def setUp(self):
+        ReportJobQueue._jobs.clear()
+        self.user = User.objects.create_user('lee@example.com', 'pw', role='ADMIN')
+        self.template = ReportTemplate.objects.create(
+            name='Sales', report_type='sales_performance', creator=self.user
+        )
+
+    def wait_for(self, report):
+        for _ in range(100):
+            report.refresh_from_db()
+            if report.status not in GeneratedReport.IN_FLIGHT_STATUSES:
+                return report
+            sleep(0.05)
+        self.fail(f'Report {report.pk} is still {report.status}')
+
+    def test_rolled_back_submit_leaves_no_job(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            ReportJobQueue.submit(self.template, self.user)
+            raise RuntimeError
+        self.assertEqual(ReportJobQueue._jobs, {})
+        self.assertFalse(GeneratedReport.objects.exists())
+
+        report = self.wait_for(ReportJobQueue.submit(self.template, self.user))
+        self.assertEqual(report.status, 'completed')
+
+    def test_timed_out_job_is_not_joined(self):
+        # A worker that started an hour ago and never came back
+        params_hash = ReportGenerator.params_hash(self.template, self.user)
+        hung = GeneratedReport.objects.create(template=self.template, generated_by=self.user, status='processing')
+        GeneratedReport.objects.filter(pk=hung.pk).update(
+            params_hash=params_hash, created_at=timezone.now() - timedelta(hours=1)
+        )
+        ReportJobQueue._jobs[params_hash] = {
+            'reports': {hung.pk},
+            'queued_at': timezone.now() - timedelta(hours=1),
+            'started_at': timezone.now() - timedelta(hours=1),
+        }
+
+        report = ReportJobQueue.submit(self.template, self.user)
+        self.assertNotEqual(report.pk, hung.pk)
+        self.assertEqual(self.wait_for(report).status, 'completed')
+        hung.refresh_from_db()
+        self.assertEqual(hung.status, 'processing')
+
+    def test_abandoned_reports_are_failed(self):
+        report = GeneratedReport.objects.create(template=self.template, generated_by=self.user, status='pending')
+        recent = GeneratedReport.objects.create(template=self.template, generated_by=self.user, status='pending')
+        GeneratedReport.objects.filter(pk=report.pk).update(created_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(ReportJobQueue.fail_abandoned(), 1)
+        report.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual(report.status, 'failed')
+        self.assertEqual(recent.status, 'pending')
+
+    def test_timed_step_counts_queries(self):
+        timings = {}
+        with timed_step(timings, 'data'):
+            User.objects.count()
+            ReportTemplate.objects.count()
+        self.assertEqual(timings['data']['queries'], 2)
+
+
+class RawExportVisibilityTests(TestCase):
+    """Raw task exports must show the same tasks as the task endpoints."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('ada@example.com', 'pw', role='ADMIN')
+        cls.manager = User.objects.create_user('max@example.com', 'pw', role='MANAGER')
+        cls.user = User.objects.create_user('uma@example.com', 'pw', role='USER')
+        Task.objects.create(title='Delegated', assigned_to=cls.user, created_by=cls.manager, status='P')
+        Task.objects.create(title='Own', assigned_to=cls.manager, created_by=cls.admin, status='P')
+        Task.objects.create(title='Other', assigned_to=cls.user, created_by=cls.admin, status='C')
+        Task.objects.create(title='Admin', assigned_to=cls.admin, created_by=cls.admin, status='IP')
+        cls.template = ReportTemplate.objects.create(
+            name='Tasks', report_type='task_completion', creator=cls.admin
+        )
+
+    def test_tasks_follow_task_visibility(self):
+        from tasks.views import get_visible_tasks
+        from .utils import ReportExporter
+
+        for user in (self.admin, self.manager, self.user):
+            with self.subTest(role=user.role):
+                exported = ReportExporter.raw_queryset('tasks', self.template, user)
+                self.assertEqual(
+                    sorted(exported.values_list('title', flat=True)),
+                    sorted(get_visible_tasks(user).values_list('title', flat=True)),
+                )
+
+
+def served(response):
+    body = b''.join(response.streaming_content) if response.streaming else response.content
+    response.close()
+    return response.status_code, body
+
+
+class ArtifactRangeTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'report.csv')
+        with open(self.path, 'wb') as file:
+            file.write(b'0123456789')
+
+    def serve(self, range_header):
+        request = RequestFactory().get('/', HTTP_RANGE=range_header)
+        return served(ReportArtifactStore.serve(request, lambda: (self.path, 'abc'), 'csv', 'report.csv'))
+
+    def test_single_ranges(self):
+        self.assertEqual(self.serve('bytes=2-4'), (206, b'234'))
+        self.assertEqual(self.serve('bytes=7-'), (206, b'789'))
+        self.assertEqual(self.serve('bytes=-3'), (206, b'789'))
+        self.assertEqual(self.serve('bytes=8-20'), (206, b'89'))
+
+    def test_unsupported_or_malformed_ranges_send_the_whole_file(self):
+        for header in ('bytes=0-1,4-5', 'bytes=5-2', 'bytes=', 'bytes=a-b', 'items=0-1'):
+            with self.subTest(header=header):
+                self.assertEqual(self.serve(header), (200, b'0123456789'))
+
+    def test_unsatisfiable_ranges(self):
+        for header in ('bytes=10-', 'bytes=20-30', 'bytes=-0'):
+            with self.subTest(header=header):
+                self.assertEqual(self.serve(header)[0], 416)
+
+
+class ArtifactStoreTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        user = User.objects.create_user('ida@example.com', 'pw', role='ADMIN')
+        template = ReportTemplate.objects.create(name='Sales', report_type='sales_performance', creator=user)
+        self.report = GeneratedReport.objects.create(
+            template=template, generated_by=user, status='completed', data={'total': 1}
+        )
+
+    def render(self, options):
+        return ReportArtifactStore.get_or_render(
+            self.report, 'pdf', lambda: f'{self.report.data} {options}', options
+        )[0]
+
+    def test_only_exports_with_the_same_options_are_superseded(self):
+        with_charts = self.render({'charts': True})
+        without_charts = self.render({'charts': False})
+        self.assertTrue(os.path.exists(with_charts))
+        self.assertTrue(os.path.exists(without_charts))
+
+        self.report.data_dict = {'total': 2}
+        updated = self.render({'charts': True})
+        self.assertNotEqual(updated, with_charts)
+        self.assertFalse(os.path.exists(with_charts))
+        self.assertTrue(os.path.exists(without_charts))
+
+    def test_stored_export_is_found_without_loading_the_data(self):
+        path = self.render({'charts': True})
+        report = GeneratedReport.objects.select_related('template').defer('data', 'data_blob').get(pk=self.report.pk)
+        with self.assertNumQueries(0):
+            found, _ = ReportArtifactStore.get_or_render(report, 'pdf', self.fail, {'charts': True})
+        self.assertEqual(found, path)
+
+    def test_removed_file_is_rendered_again(self):
+        fetches = []
+
+        def fetch():
+            # The file disappears between rendering and serving
+            path, digest = ReportArtifactStore.get_or_render(self.report, 'csv', lambda: 'a,b\n')
+            if not fetches:
+                os.remove(path)
+            fetches.append(path)
+            return path, digest
+
+        response = ReportArtifactStore.serve(RequestFactory().get('/'), fetch, 'csv', 'report.csv')
+        self.assertEqual(served(response), (200, b'a,b\n'))
+        self.assertEqual(len(fetches), 2)
+
+
+class CustomReportDateRangeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cy@example.com', 'pw', role='ADMIN')
+        customer = Customer.objects.create(name='Acme', email='acme@example.com', region='NA', owner=cls.user)
+        today = timezone.localdate()
+        for title, close in (('Next quarter', today + timedelta(days=90)), ('Ancient', today - timedelta(days=2000))):
+            Sale.objects.create(
+                title=title, customer=customer, assigned_to=cls.user, status='NEW', amount=100,
+                expected_close_date=close
+            )
+
+    def run_report(self, date_range):
+        from .planner import CustomReportPlanner
+
+        template = ReportTemplate.objects.create(
+            name='Pipeline', report_type='custom', creator=self.user,
+            filters={'source': 'sales'}, metrics=['count'], date_range=date_range
+        )
+        return CustomReportPlanner.run(template, self.user)['summary']['count']
+
+    def test_open_end_keeps_future_close_dates(self):
+        self.assertEqual(self.run_report({}), 1)
+        start = (timezone.localdate() - timedelta(days=30)).isoformat()
+        self.assertEqual(self.run_report({'start': start}), 1)
+
+    def test_explicit_end_still_applies(self):
+        end = timezone.localdate().isoformat()
+        self.assertEqual(self.run_report({'end': end}), 0)
+
+
+class PipelineForecastTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.localdate()
+        cls.this_month = today.strftime('%Y-%m')
+        next_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+        cls.next_month = next_month.strftime('%Y-%m')
+        cls.ann = User.objects.create_user('ann@example.com', 'pw', role='MANAGER', first_name='Ann')
+        cls.bob = User.objects.create_user('bob@example.com', 'pw', role='USER', first_name='Bob')
+        north = Customer.objects.create(name='North', email='north@example.com', region='NA', owner=cls.ann)
+        europe = Customer.objects.create(name='Europe', email='europe@example.com', region='EU', owner=cls.bob)
+
+        def sale(customer, user, status, amount, close=None, **fields):
+            return Sale.objects.create(
+                title=status.title(), customer=customer, assigned_to=user, status=status,
+                amount=amount, expected_close_date=close, **fields
+            )
+
+        for status in ('WON', 'WON', 'WON', 'LOST'):
+            sale(north, cls.ann, status, Decimal('10'))
+        sale(europe, cls.bob, 'LOST', Decimal('10'))
+        # Closed before the lookback window
+        old = sale(europe, cls.bob, 'WON', Decimal('10'))
+        Sale.objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(days=400))
+
+        sale(north, cls.ann, 'NEGOTIATION', Decimal('100'), close=today)
+        sale(europe, cls.ann, 'NEW', Decimal('200'), close=next_month)
+        sale(europe, cls.bob, 'PROPOSAL', Decimal('50'), close=today - timedelta(days=60))
+        sale(north, cls.bob, 'CONTACTED', Decimal('80'))
+        sale(north, cls.bob, 'NEW', None)
+        sale(north, cls.ann, 'NEW', Decimal('1000'), close=today, is_archived=True)
+
+    # 3 of 5 closed deals won; Ann won 3 of 4 and Bob 0 of 1, each shrunk with a strength of 10
+    win_rate = 4 / 7
+    ann_rate = (3 + 10 * win_rate) / (4 + 10)
+    bob_rate = (0 + 10 * win_rate) / (1 + 10)
+
+    def weighted(self, *deals):
+        return sum(amount * rate ** ((4 - OPEN_STAGES.index(stage)) / 4) for amount, rate, stage in deals)
+
+    def assertRow(self, row, key, deals, pipeline, weighted):
+        self.assertEqual((row.get('key'), row['deals'], row['pipeline_value']), (key, deals, pipeline))
+        self.assertAlmostEqual(row['weighted_value'], weighted, delta=0.01)
+
+    def test_win_rates(self):
+        rates = PipelineForecaster.win_rates(Sale.objects.all())
+        self.assertEqual(rates['closed'], 5)
+        self.assertAlmostEqual(rates['global'], self.win_rate)
+        self.assertAlmostEqual(rates['owners'][self.ann.pk], self.ann_rate)
+        self.assertAlmostEqual(rates['owners'][self.bob.pk], self.bob_rate)
+
+    def test_stage_probabilities(self):
+        probabilities = PipelineForecaster.forecast()['stage_probabilities']
+        self.assertEqual(list(probabilities), list(OPEN_STAGES))
+        self.assertAlmostEqual(probabilities['NEW'], self.win_rate)
+        self.assertAlmostEqual(probabilities['PROPOSAL'], self.win_rate ** 0.5)
+        self.assertAlmostEqual(probabilities['NEGOTIATION'], self.win_rate ** 0.25)
+
+    def test_breakdowns(self):
+        forecast = PipelineForecaster.forecast()
+        ann_negotiation = (100, self.ann_rate, 'NEGOTIATION')
+        ann_new = (200, self.ann_rate, 'NEW')
+        bob_proposal = (50, self.bob_rate, 'PROPOSAL')
+        bob_contacted = (80, self.bob_rate, 'CONTACTED')
+
+        self.assertRow(forecast['totals'], None, 5, 430, self.weighted(
+            ann_negotiation, ann_new, bob_proposal, bob_contacted
+        ))
+        # Undated deals are unscheduled, overdue ones are still expected this month
+        by_month = forecast['by_month']
+        self.assertEqual(len(by_month), 3)
+        self.assertRow(by_month[0], UNSCHEDULED, 2, 80, self.weighted(bob_contacted))
+        self.assertRow(by_month[1], self.this_month, 2, 150, self.weighted(ann_negotiation, bob_proposal))
+        self.assertRow(by_month[2], self.next_month, 1, 200, self.weighted(ann_new))
+
+        by_owner = forecast['by_owner']
+        self.assertEqual(len(by_owner), 2)
+        self.assertRow(by_owner[0], self.ann.pk, 2, 300, self.weighted(ann_negotiation, ann_new))
+        self.assertRow(by_owner[1], self.bob.pk, 3, 130, self.weighted(bob_proposal, bob_contacted))
+
+        by_region = forecast['by_region']
+        self.assertEqual(len(by_region), 2)
+        self.assertRow(by_region[0], 'EU', 2, 250, self.weighted(ann_new, bob_proposal))
+        self.assertRow(by_region[1], 'NA', 3, 180, self.weighted(ann_negotiation, bob_contacted))
+
+    def test_users_only_forecast_their_own_deals(self):
+        forecast = PipelineForecaster.forecast(self.bob)
+        self.assertEqual(forecast['closed_deals'], 1)
+        self.assertAlmostEqual(forecast['win_rate'], 1 / 3)
+        self.assertEqual([row['key'] for row in forecast['by_owner']], [self.bob.pk])
+        self.assertEqual(forecast['totals']['deals'], 3)
@@ -1,26 +1,91 @@
+import calendar
 import csv
 import json
 import io
 from datetime import datetime
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.template.loader import render_to_string
 from django.conf import settings
 import base64
 
+from .caching import LocalCache, TieredCache
+
+LOCAL_CACHE_SETTINGS = settings.ANALYTICS_SETTINGS.get('LOCAL_CACHE', {})
+REVALIDATE_SETTINGS = settings.ANALYTICS_SETTINGS.get('STALE_WHILE_REVALIDATE', {})
+
 class ReportExporter:
     """Utility class for exporting reports in various formats."""
+    STREAM_CHUNK_BYTES = 64 * 1024
+    # Rows fetched per round trip when streaming raw records
+    RAW_CHUNK_SIZE = 2000
+    # Columns of the raw-row export: (header, values_list lookup)
+    RAW_COLUMNS = {
+        'sales': [
+            ('ID', 'id'), ('Title', 'title'), ('Customer', 'customer__name'), ('Status', 'status'),
+            ('Priority', 'priority'), ('Amount', 'amount'), ('Expected Close Date', 'expected_close_date'),
+            ('Assigned To', 'assigned_to__username'), ('Archived', 'is_archived'), ('Created At', 'created_at'),
+        ],
+        'tasks': [
+            ('ID', 'id'), ('Title', 'title'), ('Status', 'status'), ('Priority', 'priority'),
+            ('Due Date', 'due_date'), ('Assigned To', 'assigned_to__username'),
+            ('Created By', 'created_by__username'), ('Created At', 'created_at'), ('Updated At', 'updated_at'),
+        ],
+        'customers': [
+            ('ID', 'id'), ('Name', 'name'), ('Company', 'company'), ('Email', 'email'), ('Region', 'region'),
+            ('Engagement Level', 'engagement_level'), ('Status', 'status'), ('Owner', 'owner__username'),
+            ('Last Contact Date', 'last_contact_date'), ('Created At', 'created_at'),
+        ],
+    }
+    RAW_SOURCES = {
+        'sales_performance': 'sales',
+        'conversion_ratios': 'sales',
+        'task_completion': 'tasks',
+        'customer_engagement': 'customers',
+    }
     
     @staticmethod
-    def export_to_csv(report_data, filename=None, report_name=None, report_type=None):
+    def export_to_csv(report_data, filename=None, report_name=None, report_type=None, generated_at=None):
         """Export report data to CSV format as proper tabular data."""
+        rows = ReportExporter.report_rows(report_data, report_name, report_type, generated_at)
+        return ReportExporter.csv_response(rows, filename)
+    
+    @staticmethod
+    def export_raw_csv(template, user, filename=None):
+        """Export the Sale, Task or Customer rows behind a report as CSV."""
+        return ReportExporter.csv_response(ReportExporter.raw_rows(template, user), filename)
+    
+    @staticmethod
+    def csv_response(rows, filename=None):
+        """Stream rows to the client as a CSV attachment."""
         if not filename:
             filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         
-        response = HttpResponse(content_type='text/csv')
+        response = StreamingHttpResponse(ReportExporter.stream_csv(rows), content_type='text/csv')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        writer = csv.writer(response)
-        
+        return response
+    
+    @staticmethod
+    def render_csv(rows):
+        """Render rows into a CSV string, e.g. for email attachments."""
+        return ''.join(ReportExporter.stream_csv(rows))
+    
+    @staticmethod
+    def stream_csv(rows):
+        """Encode rows as CSV, yielding chunks of roughly STREAM_CHUNK_BYTES."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= ReportExporter.STREAM_CHUNK_BYTES:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    
+    @staticmethod
+    def report_rows(report_data, report_name=None, report_type=None, generated_at=None):
+        """Yield the CSV rows of a report's aggregated data."""
         # Helper function to format currency
         def format_currency(amount):
             if isinstance(amount, (int, float)):
@@ -51,16 +116,16 @@ class ReportExporter:
                 return str(date_str)
         
         # Report Header Information
-        writer.writerow(['Report Information', '', '', ''])
-        writer.writerow(['Report Name', report_name or 'Unnamed Report', '', ''])
-        writer.writerow(['Report Type', (report_type.replace('_', ' ').title() if report_type else 'Unknown'), '', ''])
-        writer.writerow(['Generated On', datetime.now().strftime('%Y-%m-%d %H:%M:%S'), '', ''])
-        writer.writerow(['', '', '', ''])  # Empty row for separation
+        yield ['Report Information', '', '', '']
+        yield ['Report Name', report_name or 'Unnamed Report', '', '']
+        yield ['Report Type', (report_type.replace('_', ' ').title() if report_type else 'Unknown'), '', '']
+        yield ['Generated On', (generated_at or datetime.now()).strftime('%Y-%m-%d %H:%M:%S'), '', '']
+        yield ['', '', '', '']  # Empty row for separation
         
         # Executive Summary Table
         if 'summary' in report_data:
-            writer.writerow(['EXECUTIVE SUMMARY', '', '', ''])
-            writer.writerow(['Metric', 'Value', '', ''])
+            yield ['EXECUTIVE SUMMARY', '', '', '']
+            yield ['Metric', 'Value', '', '']
             
             summary = report_data['summary']
             
@@ -76,9 +141,9 @@ class ReportExporter:
                 else:
                     formatted_value = str(value)
                 
-                writer.writerow([label, formatted_value, '', ''])
+                yield [label, formatted_value, '', '']
             
-            writer.writerow(['', '', '', ''])  # Empty row for separation
+            yield ['', '', '', '']  # Empty row for separation
         
         # Time Series Data Tables
         time_series_keys = ['sales_over_time', 'completion_over_time', 'acquisition_over_time']
@@ -95,8 +160,8 @@ class ReportExporter:
                     headers = ['Period', 'New Customers', 'Total Customers', '']
                 
                 # Write section title
-                writer.writerow([title, '', '', ''])
-                writer.writerow(headers)
+                yield [title, '', '', '']
+                yield headers
                 
                 for item in report_data[key]:
                     row_data = [format_date(item.get('period', ''))]
@@ -120,9 +185,9 @@ class ReportExporter:
                             ''
                         ])
                     
-                    writer.writerow(row_data)
+                    yield row_data
                 
-                writer.writerow(['', '', '', ''])  # Empty row for separation
+                yield ['', '', '', '']  # Empty row for separation
         
         # Status Breakdown Tables
         status_keys = ['sales_by_status', 'task_by_status', 'customer_status']
@@ -138,8 +203,8 @@ class ReportExporter:
                     title = 'CUSTOMERS BY STATUS'
                     headers = ['Status', 'Count', 'Percentage', '']
                 
-                writer.writerow([title, '', '', ''])
-                writer.writerow(headers)
+                yield [title, '', '', '']
+                yield headers
                 
                 total_count = sum(item.get('count', 0) for item in report_data[key])
                 
@@ -163,16 +228,16 @@ class ReportExporter:
                             ''
                         ])
                     
-                    writer.writerow(row_data)
+                    yield row_data
                 
-                writer.writerow(['', '', '', ''])  # Empty row for separation
+                yield ['', '', '', '']  # Empty row for separation
         
         # Priority Breakdown Tables
         priority_keys = ['sales_by_priority', 'task_by_priority']
         for key in priority_keys:
             if key in report_data and report_data[key]:
-                writer.writerow(['BREAKDOWN BY PRIORITY', '', '', ''])
-                writer.writerow(['Priority', 'Count', 'Percentage', ''])
+                yield ['BREAKDOWN BY PRIORITY', '', '', '']
+                yield ['Priority', 'Count', 'Percentage', '']
                 
                 total_count = sum(item.get('count', 0) for item in report_data[key])
                 
@@ -180,19 +245,19 @@ class ReportExporter:
                     count = item.get('count', 0)
                     percentage = (count / total_count * 100) if total_count > 0 else 0
                     
-                    writer.writerow([
+                    yield [
                         item.get('priority', '').title(),
                         format_number(count),
                         format_percentage(percentage),
                         ''
-                    ])
+                    ]
                 
-                writer.writerow(['', '', '', ''])  # Empty row for separation
+                yield ['', '', '', '']  # Empty row for separation
         
         # Top Performers Table
         if 'top_performers' in report_data and report_data['top_performers']:
-            writer.writerow(['TOP PERFORMERS', '', '', ''])
-            writer.writerow(['Name', 'Total Sales', 'Total Revenue', 'Won Sales', 'Win Rate'])
+            yield ['TOP PERFORMERS', '', '', '']
+            yield ['Name', 'Total Sales', 'Total Revenue', 'Won Sales', 'Win Rate']
             
             for item in report_data['top_performers']:
                 name = f"{item.get('assigned_to__first_name', '')} {item.get('assigned_to__last_name', '')}".strip()
@@ -203,16 +268,39 @@ class ReportExporter:
                 won_sales = item.get('won_sales', 0)
                 win_rate = (won_sales / total_sales * 100) if total_sales > 0 else 0
                 
-                writer.writerow([
+                yield [
                     name,
                     format_number(total_sales),
                     format_currency(item.get('total_amount', 0)),
                     format_number(won_sales),
                     format_percentage(win_rate)
-                ])
+                ]
             
-            writer.writerow(['', '', '', '', ''])  # Empty row for separation
-        
+            yield ['', '', '', '', '']  # Empty row for separation
+
+        # Custom Report Results Table
+        if report_data.get('columns') and 'rows' in report_data:
+            columns = report_data['columns']
+            yield ['REPORT RESULTS'] + [''] * (len(columns) - 1)
+            yield [column['label'] for column in columns]
+
+            for item in report_data['rows']:
+                row_data = []
+                for column in columns:
+                    key = column['key']
+                    value = item.get(key)
+                    if key == 'period':
+                        row_data.append(format_date(value))
+                    elif 'amount' in key or 'value' in key:
+                        row_data.append(format_currency(value or 0))
+                    elif isinstance(value, (int, float)):
+                        row_data.append(format_number(value))
+                    else:
+                        row_data.append('' if value is None else str(value))
+                yield row_data
+
+            yield [''] * len(columns)  # Empty row for separation
+
         # User Performance Table
         if 'users' in report_data and report_data['users']:
             # Determine headers based on data type
@@ -220,13 +308,13 @@ class ReportExporter:
             headers = ['User Name']
             
             if 'total_sales' in sample_user:
-                writer.writerow(['INDIVIDUAL USER PERFORMANCE - SALES', '', '', '', ''])
+                yield ['INDIVIDUAL USER PERFORMANCE - SALES', '', '', '', '']
                 headers.extend(['Total Sales', 'Total Revenue', 'Won Sales', 'Win Rate'])
             elif 'total_tasks' in sample_user:
-                writer.writerow(['INDIVIDUAL USER PERFORMANCE - TASKS', '', '', '', ''])
+                yield ['INDIVIDUAL USER PERFORMANCE - TASKS', '', '', '', '']
                 headers.extend(['Total Tasks', 'Completed Tasks', 'Completion Rate', ''])
             
-            writer.writerow(headers)
+            yield headers
             
             for user in report_data['users']:
                 name = f"{user.get('first_name', '')} {user.get('last_name', '')}".strip()
@@ -258,12 +346,68 @@ class ReportExporter:
                         ''
                     ])
                 
-                writer.writerow(row_data)
+                yield row_data
             
-            writer.writerow(['', '', '', '', ''])  # Empty row for separation
+            yield ['', '', '', '', '']  # Empty row for separation
         
-        return response
     
+    @staticmethod
+    def raw_rows(template, user, max_rows=None):
+        """
+        Yield the header and records behind a report, at most MAX_EXPORT_ROWS of them.
+
+        Records are read with a server-side cursor in RAW_CHUNK_SIZE batches,
+        so memory use does not grow with the size of the export. A note row
+        is appended when the export was truncated.
+        """
+        source = ReportExporter.RAW_SOURCES.get(template.report_type)
+        if source is None:
+            raise ValueError(f"Raw export is not available for {template.report_type} reports")
+        if max_rows is None:
+            max_rows = settings.ANALYTICS_SETTINGS.get('MAX_EXPORT_ROWS', 10000)
+
+        columns = ReportExporter.RAW_COLUMNS[source]
+        queryset = ReportExporter.raw_queryset(source, template, user).order_by('id')
+        # Fetch one row past the cap to tell whether anything was cut off
+        records = queryset.values_list(*[lookup for _, lookup in columns])[:max_rows + 1]
+
+        yield [header for header, _ in columns]
+        for count, record in enumerate(records.iterator(chunk_size=ReportExporter.RAW_CHUNK_SIZE)):
+            if count == max_rows:
+                yield [f'Export truncated after {max_rows:,} rows; narrow the report date range to export the rest']
+                break
+            yield record
+
+    @staticmethod
+    def raw_queryset(source, template, user, date_range=None):
+        """
+        Records behind a report, limited to what the user may see record by record.
+
+        date_range, when given, replaces the template's own date range.
+        """
+        from customers.models import Customer
+        from sales.models import Sale
+        from tasks.views import get_visible_tasks
+        from .analytics import AnalyticsService
+        from .jobs import ReportGenerator
+
+        template_date_range, _, target_user_id = ReportGenerator.get_parameters(template)
+        date_range = date_range or template_date_range
+
+        # Same role rules as the sales, task and customer list endpoints
+        if source == 'sales':
+            queryset = AnalyticsService._filter_sales_by_date(Sale.objects.all(), date_range)
+            if user.role == 'USER':
+                queryset = queryset.filter(assigned_to=user)
+        elif source == 'tasks':
+            queryset = AnalyticsService._filter_by_created(get_visible_tasks(user), date_range)
+        else:
+            return AnalyticsService._filter_by_created(Customer.objects.all(), date_range)
+
+        if target_user_id:
+            queryset = queryset.filter(assigned_to_id=target_user_id)
+        return queryset
+
     @staticmethod
     def prepare_chart_data_for_pdf(report_data):
         """Prepare chart data in a format suitable for PDF generation."""
@@ -352,7 +496,7 @@ class ScheduledReportManager:
                 next_run += timedelta(days=1)
         
         elif schedule.frequency == 'weekly':
-            days_ahead = schedule.day_of_week - now.weekday()
+            days_ahead = (schedule.day_of_week or 0) - now.weekday()
             if days_ahead <= 0:
                 days_ahead += 7
             next_run = now + timedelta(days=days_ahead)
@@ -361,54 +505,177 @@ class ScheduledReportManager:
                                       second=0, microsecond=0)
         
         elif schedule.frequency == 'monthly':
-            next_run = now.replace(day=schedule.day_of_month,
-                                 hour=schedule.scheduled_time.hour,
-                                 minute=schedule.scheduled_time.minute,
-                                 second=0, microsecond=0)
+            next_run = ScheduledReportManager._at_day_of_month(schedule, now.year, now.month)
             if next_run <= now:
-                if now.month == 12:
-                    next_run = next_run.replace(year=now.year + 1, month=1)
-                else:
-                    next_run = next_run.replace(month=now.month + 1)
+                year, month = (now.year + 1, 1) if now.month == 12 else (now.year, now.month + 1)
+                next_run = ScheduledReportManager._at_day_of_month(schedule, year, month)
         
         else:  # quarterly
-            months_ahead = 3 - (now.month % 3)
-            if months_ahead == 3:
-                months_ahead = 0
-            target_month = now.month + months_ahead
-            target_year = now.year
-            if target_month > 12:
-                target_month -= 12
-                target_year += 1
-            
-            next_run = now.replace(year=target_year, month=target_month,
-                                 day=schedule.day_of_month,
-                                 hour=schedule.scheduled_time.hour,
-                                 minute=schedule.scheduled_time.minute,
-                                 second=0, microsecond=0)
+            # Quarterly reports run in March, June, September and December
+            year, month = now.year, now.month + (-now.month % 3)
+            next_run = ScheduledReportManager._at_day_of_month(schedule, year, month)
+            if next_run <= now:
+                year, month = (year + 1, 3) if month == 12 else (year, month + 3)
+                next_run = ScheduledReportManager._at_day_of_month(schedule, year, month)
         
         return next_run
 
+    @staticmethod
+    def _at_day_of_month(schedule, year, month):
+        """Scheduled time on day_of_month of the given month, clamped to the month's last day."""
+        from django.utils import timezone
+        day = min(schedule.day_of_month or 1, calendar.monthrange(year, month)[1])
+        return timezone.now().replace(year=year, month=month, day=day,
+                                      hour=schedule.scheduled_time.hour,
+                                      minute=schedule.scheduled_time.minute,
+                                      second=0, microsecond=0)
+
 
 class CacheManager:
-    """Manager for handling analytics data caching."""
-    
+    """
+    Manager for handling analytics data caching.
+
+    Every cache key embeds the current generation of the data it was computed
+    from. Writes to a model bump its generation, so stale entries are never
+    read again and simply expire; nothing has to be enumerated or deleted.
+    Generations are DataGeneration rows, so bumps are atomic whatever the
+    cache backend.
+
+    Entries live in a per-process LRU in front of the shared cache backend.
+    Generations are also kept locally for a couple of seconds, so a warm hit
+    needs no round trip to the shared backend at all.
+    """
+    tiered = TieredCache(
+        max_entries=LOCAL_CACHE_SETTINGS.get('MAX_ENTRIES', 256),
+        local_ttl=LOCAL_CACHE_SETTINGS.get('TIMEOUT', 30),
+        lock_timeout=LOCAL_CACHE_SETTINGS.get('LOCK_TIMEOUT', 30),
+        wait_timeout=LOCAL_CACHE_SETTINGS.get('WAIT_TIMEOUT', 10),
+        refresh_workers=REVALIDATE_SETTINGS.get('REFRESH_WORKERS', 2),
+        max_pending_refreshes=REVALIDATE_SETTINGS.get('MAX_PENDING_REFRESHES', 16),
+    )
+    local_generations = LocalCache(max_entries=1024)
+    GENERATION_TTL = LOCAL_CACHE_SETTINGS.get('GENERATION_TIMEOUT', 2)
+
+    # Models each analytics endpoint reads from
+    REPORT_MODELS = {
+        'dashboard_kpis': ('sale', 'task', 'customer'),
+        'sales_performance': ('sale',),
+        'customer_engagement': ('customer',),
+        'task_completion': ('task',),
+        'conversion_ratios': ('sale', 'customer'),
+        'user_activity': ('sale', 'task', 'customer'),
+        'user_sales_performance': ('sale',),
+        'user_task_performance': ('task',),
+        # Refreshed daily rather than on every sale write
+        'pipeline_forecast': (),
+    }
+    ALL_MODELS = ('sale', 'task', 'customer')
+
     @staticmethod
-    def get_cache_key(user_id, report_type, params):
-        """Generate a cache key for analytics data."""
+    def get_cache_key(scope, report_type, params):
+        """
+        Generate a cache key for analytics data at the current data generation.
+
+        scope is the data scope from AnalyticsService.get_cache_scope, so all
+        users who see the same data share one entry.
+        """
         import hashlib
+        models = CacheManager.REPORT_MODELS.get(report_type, CacheManager.ALL_MODELS)
+        generations = CacheManager.get_generations([*models, f'scope:{scope}'])
         params_str = json.dumps(params, sort_keys=True, default=str)
-        key_data = f"{user_id}:{report_type}:{params_str}"
+        generations_str = json.dumps(generations, sort_keys=True)
+        key_data = f"{scope}:{report_type}:{params_str}:{generations_str}"
         return f"analytics:{hashlib.md5(key_data.encode()).hexdigest()}"
-    
+
+    @staticmethod
+    def get_generations(names):
+        """Return the current generation of each name, with one query for those not held locally."""
+        from .models import DataGeneration
+        generations = {}
+        for name in names:
+            found, value = CacheManager.local_generations.get(name)
+            if found:
+                generations[name] = value
+        missing = [name for name in names if name not in generations]
+
+        if missing:
+            generations.update(
+                DataGeneration.objects.filter(name__in=missing).values_list('name', 'value')
+            )
+            for name in missing:
+                if name not in generations:
+                    CacheManager._create_generation(name)
+                    generations[name] = CacheManager._read_generation(name)
+                CacheManager.local_generations.set(name, generations[name], CacheManager.GENERATION_TTL)
+        return generations
+
+    @staticmethod
+    def bump_generation(name):
+        """Invalidate every analytics entry that depends on name."""
+        from django.db.models import F
+        from .models import DataGeneration
+        counter = DataGeneration.objects.filter(name=name)
+        # One atomic UPDATE, so concurrent bumps each move the counter
+        if not counter.update(value=F('value') + 1) and not CacheManager._create_generation(name):
+            # A reader created the counter in the meantime and may already be using it
+            counter.update(value=F('value') + 1)
+        CacheManager.local_generations.set(name, CacheManager._read_generation(name), CacheManager.GENERATION_TTL)
+
+    @staticmethod
+    def _create_generation(name):
+        """Create a missing generation counter; returns False if another writer created it first."""
+        import time
+        from django.db import IntegrityError, transaction
+        from .models import DataGeneration
+        try:
+            with transaction.atomic():
+                # Seed from the clock so a recreated counter never reuses an old generation
+                DataGeneration.objects.create(name=name, value=time.time_ns())
+        except IntegrityError:
+            return False
+        return True
+
+    @staticmethod
+    def _read_generation(name):
+        from .models import DataGeneration
+        return DataGeneration.objects.filter(name=name).values_list('value', flat=True).first()
+
+    @staticmethod
+    def get_timeouts(report_type):
+        """
+        Return the (soft, hard) TTL of an analytics endpoint.
+
+        The soft TTL comes from ANALYTICS_SETTINGS['CACHE_TIMEOUT']; past it,
+        entries are served stale until the hard TTL while they are refreshed.
+        """
+        soft = settings.ANALYTICS_SETTINGS.get('CACHE_TIMEOUT', {}).get(report_type, 300)
+        return soft, int(soft * REVALIDATE_SETTINGS.get('HARD_TIMEOUT_FACTOR', 4))
+
     @staticmethod
     def cache_analytics_data(key, data, timeout=300):
         """Cache analytics data with timeout."""
-        from django.core.cache import cache
-        cache.set(key, data, timeout)
+        CacheManager.tiered.set(key, data, timeout)
     
     @staticmethod
     def get_cached_analytics_data(key):
         """Retrieve cached analytics data."""
-        from django.core.cache import cache
-        return cache.get(key) 
\ No newline at end of file
+        return CacheManager.tiered.get(key)
+
+    @staticmethod
+    def get_or_compute(key, compute, report_type):
+        """
+        Return a CachedValue for an analytics endpoint's data.
+
+        Only one worker computes a missing entry; stale entries are returned
+        at once and refreshed in the background.
+        """
+        soft, hard = CacheManager.get_timeouts(report_type)
+        return CacheManager.tiered.get_or_compute(key, compute, soft, hard)
+
+    @staticmethod
+    def get_stats():
+        """Return this process's cache counters and local cache size."""
+        stats = CacheManager.tiered.stats.snapshot()
+        stats['local_entries'] = len(CacheManager.tiered.local)
+        stats['local_max_entries'] = CacheManager.tiered.local.max_entries
+        return stats
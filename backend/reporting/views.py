@@ -17,12 +17,16 @@ from .models import (
     ReportShare
 )
 from .serializers import (
-    ReportTemplateSerializer, GeneratedReportSerializer, ReportScheduleSerializer,
+    ReportTemplateSerializer, GeneratedReportSerializer, GeneratedReportListSerializer, ReportScheduleSerializer,
     DashboardWidgetSerializer, UserDashboardSerializer, DashboardWidgetPositionSerializer,
     ReportShareSerializer, AnalyticsDataSerializer, DashboardKPISerializer,
     CustomReportRequestSerializer, ReportExportSerializer
 )
 from .analytics import AnalyticsService
+from .forecast import PipelineForecaster
+from .jobs import ReportJobQueue
+from .artifacts import ReportArtifactStore
+from .pdf import PdfRenderer
 from .utils import ReportExporter, CacheManager
 
 User = get_user_model()
@@ -44,39 +48,11 @@ class ReportTemplateViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def generate(self, request, pk=None):
-        """Generate a report from this template."""
+        """Queue generation of a report from this template; poll the returned report for progress."""
         try:
             template = self.get_object()
-            
-            # Create a generated report instance
-            report_data = {
-                'template_id': template.id,
-                'status': 'processing'
-            }
-            
-            serializer = GeneratedReportSerializer(data=report_data, context={'request': request})
-            if serializer.is_valid():
-                report = serializer.save()
-                
-                try:
-                    # Generate the actual report data
-                    analytics_data = self._generate_report_data(template, request.user)
-                    
-                    # Update the report with generated data
-                    report.data_dict = analytics_data
-                    report.status = 'completed'
-                    report.summary_stats_dict = self._calculate_summary_stats(analytics_data)
-                    report.save()
-                    
-                    return Response(GeneratedReportSerializer(report).data)
-                except Exception as e:
-                    report.status = 'failed'
-                    report.error_message = str(e)
-                    report.save()
-                    return Response({'error': f'Report generation failed: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            else:
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-                
+            report = ReportJobQueue.submit(template, request.user)
+            return Response(GeneratedReportSerializer(report).data, status=status.HTTP_202_ACCEPTED)
         except Exception as e:
             return Response({'error': f'Template generation failed: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -104,51 +80,6 @@ class ReportTemplateViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    def _generate_report_data(self, template, user):
-        """Generate report data based on template configuration."""
-        try:
-            date_range = template.date_range_dict if template.date_range_dict else None
-            
-            grouping = template.grouping_dict.get('period', 'month') if template.grouping_dict else 'month'
-            
-            # Filter by user if specified in template filters
-            target_user = None
-            if template.filters_dict.get('user_id'):
-                try:
-                    target_user = User.objects.get(id=template.filters_dict['user_id'])
-                except User.DoesNotExist:
-                    # If the specified user doesn't exist, use None and fall back to current user
-                    target_user = None
-            
-            if template.report_type == 'sales_performance':
-                return AnalyticsService.get_sales_performance_data(user, date_range, grouping, target_user=target_user)
-            elif template.report_type == 'customer_engagement':
-                return AnalyticsService.get_customer_engagement_data(user, date_range, grouping)
-            elif template.report_type == 'task_completion':
-                return AnalyticsService.get_task_completion_data(user, date_range, grouping, target_user=target_user)
-            elif template.report_type == 'conversion_ratios':
-                return AnalyticsService.get_conversion_ratios(user, date_range)
-            elif template.report_type == 'user_activity':
-                return AnalyticsService.get_user_activity_data(date_range, grouping)
-            else:
-                error_msg = f"Unknown report type: {template.report_type}"
-                raise ValueError(error_msg)
-                
-        except Exception as e:
-            raise
-
-    def _calculate_summary_stats(self, data):
-        """Calculate summary statistics from report data."""
-        summary = {}
-        if 'summary' in data:
-            summary = data['summary']
-        
-        # Add generation metadata
-        summary['generated_at'] = timezone.now().isoformat()
-        summary['data_points'] = len(data.get('sales_over_time', []))
-        
-        return summary
-
 
 class GeneratedReportViewSet(viewsets.ModelViewSet):
     """
@@ -156,13 +87,30 @@ class GeneratedReportViewSet(viewsets.ModelViewSet):
     """
     serializer_class = GeneratedReportSerializer
     permission_classes = [IsAuthenticated]
+    # Actions that never read the report payload; exports only load it when rendering a new file
+    PAYLOAD_FREE_ACTIONS = ('list', 'progress', 'cancel', 'delete_report', 'share', 'export_csv', 'export_pdf')
 
     def get_queryset(self):
-        return GeneratedReport.objects.filter(generated_by=self.request.user)
+        queryset = GeneratedReport.objects.filter(generated_by=self.request.user).select_related(
+            'template__creator', 'generated_by'
+        )
+        if self.action in self.PAYLOAD_FREE_ACTIONS:
+            queryset = queryset.defer('data', 'data_blob', 'summary_stats')
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return GeneratedReportListSerializer
+        return GeneratedReportSerializer
 
     @action(detail=True, methods=['get'])
     def export_csv(self, request, pk=None):
-        """Export report as CSV."""
+        """
+        Export report as CSV.
+
+        ?mode=raw exports the sale, task or customer records behind the report
+        instead of its aggregated figures.
+        """
         report = self.get_object()
         
         if report.status != 'completed':
@@ -172,11 +120,40 @@ class GeneratedReportViewSet(viewsets.ModelViewSet):
         safe_template_name = "".join(c for c in report.template.name if c.isalnum() or c in (' ', '-', '_')).rstrip()
         filename = f"{safe_template_name}_{report.created_at.strftime('%Y%m%d_%H%M%S')}.csv"
         
-        return ReportExporter.export_to_csv(
-            report_data=report.data_dict,
-            filename=filename,
-            report_name=report.template.name,
-            report_type=report.template.report_type
+        if request.query_params.get('mode') == 'raw':
+            if report.template.report_type not in ReportExporter.RAW_SOURCES:
+                return Response(
+                    {'error': 'Raw export is not available for this report type'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            return ReportExporter.export_raw_csv(
+                report.template, request.user, filename=filename.replace('.csv', '_rows.csv')
+            )
+        
+        # Rendered once per report content, then served from disk
+        return ReportArtifactStore.serve(request, lambda: ReportArtifactStore.get_or_render(
+            report, 'csv', lambda: ReportExporter.render_csv(ReportExporter.report_rows(
+                report.data_dict,
+                report_name=report.template.name,
+                report_type=report.template.report_type,
+                generated_at=report.completed_at or report.created_at
+            ))
+        ), 'csv', filename)
+
+    @action(detail=True, methods=['get'])
+    def export_pdf(self, request, pk=None):
+        """Export report as PDF, rendered once on the PDF process pool."""
+        report = self.get_object()
+        
+        if report.status != 'completed':
+            return Response({'error': 'Report is not completed'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        safe_template_name = "".join(c for c in report.template.name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        filename = f"{safe_template_name}_{report.created_at.strftime('%Y%m%d_%H%M%S')}.pdf"
+        include_charts = request.query_params.get('include_charts', 'true').lower() != 'false'
+        
+        return ReportArtifactStore.serve(
+            request, lambda: PdfRenderer.render(report, include_charts=include_charts), 'pdf', filename
         )
 
     @action(detail=True, methods=['post'])
@@ -196,6 +173,32 @@ class GeneratedReportViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        """Lightweight status of a report for polling, without the report data."""
+        report = self.get_object()
+        if report.status in GeneratedReport.IN_FLIGHT_STATUSES and ReportJobQueue.fail_abandoned(
+            GeneratedReport.objects.filter(pk=report.pk)
+        ):
+            report.refresh_from_db()
+        return Response({
+            'id': report.id,
+            'status': report.status,
+            'started_at': report.started_at,
+            'completed_at': report.completed_at,
+            'execution_time': report.execution_time,
+            'section_timings': report.section_timings,
+            'error_message': report.error_message,
+        })
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel a pending or processing report."""
+        report = self.get_object()
+        if not ReportJobQueue.cancel(report):
+            return Response({'error': f'Report is already {report.status}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'id': report.id, 'status': 'cancelled'})
+
     @action(detail=True, methods=['delete'])
     def delete_report(self, request, pk=None):
         """Delete a generated report."""
@@ -225,39 +228,25 @@ class AnalyticsViewSet(viewsets.ViewSet):
     def dashboard_kpis(self, request):
         """Get KPI data for dashboard widgets with caching."""
         try:
-            # Check if cache-busting parameter is present
-            cache_bust = request.query_params.get('_t')
-            
-            cache_key = None
-            cached_data = None
-            
-            # Only use cache if no cache-busting parameter
-            if not cache_bust:
-                # Check cache first
-                cache_key = CacheManager.get_cache_key(
-                    request.user.id, 
-                    'dashboard_kpis', 
-                    {}
-                )
-                cached_data = CacheManager.get_cached_analytics_data(cache_key)
-                
-                if cached_data:
-                    return Response(cached_data)
-            
-            # Generate fresh data
-            kpis = AnalyticsService.get_dashboard_kpis(request.user)
-            response_data = {
-                'sales': kpis['sales'],
-                'tasks': kpis['tasks'],
-                'customers': kpis['customers'],
-                'generated_at': timezone.now()
-            }
-            
-            # Cache the result for 5 minutes (only if no cache-busting)
-            if not cache_bust and cache_key:
-                CacheManager.cache_analytics_data(cache_key, response_data, 300)
-            
-            return Response(response_data)
+            def compute():
+                kpis = AnalyticsService.get_dashboard_kpis(request.user)
+                return {
+                    'sales': kpis['sales'],
+                    'tasks': kpis['tasks'],
+                    'customers': kpis['customers'],
+                    'generated_at': timezone.now()
+                }
+
+            # Skip the cache if a cache-busting parameter is present
+            if request.query_params.get('_t'):
+                return Response(compute())
+
+            cache_key = CacheManager.get_cache_key(
+                AnalyticsService.get_cache_scope('dashboard_kpis', request.user), 
+                'dashboard_kpis', 
+                {}
+            )
+            return self._cached_response(cache_key, compute, 'dashboard_kpis')
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -273,74 +262,49 @@ class AnalyticsViewSet(viewsets.ViewSet):
             if str(request.user.id) != str(user_id):
                 return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        # Check cache
         cache_params = {'date_range': date_range, 'grouping': grouping}
         if user_id:
             cache_params['user_id'] = user_id
             
         cache_key = CacheManager.get_cache_key(
-            request.user.id,
+            AnalyticsService.get_cache_scope('sales_performance', request.user, user_id),
             'sales_performance',
             cache_params
         )
-        cached_data = CacheManager.get_cached_analytics_data(cache_key)
-        
-        if cached_data:
-            return Response(cached_data)
-        
-        # Generate fresh data
-        target_user = None
-        if user_id:
-            try:
-                target_user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
-        
-        data = AnalyticsService.get_sales_performance_data(
-            request.user, 
-            date_range, 
-            grouping, 
-            target_user=target_user
-        )
-        
-        # Cache for 10 minutes
-        CacheManager.cache_analytics_data(cache_key, data, 600)
+
+        def compute():
+            target_user = User.objects.get(id=user_id) if user_id else None
+            return AnalyticsService.get_sales_performance_data(
+                request.user, 
+                date_range, 
+                grouping, 
+                target_user=target_user
+            )
         
-        return Response(data)
+        try:
+            return self._cached_response(cache_key, compute, 'sales_performance')
+        except User.DoesNotExist:
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
     @action(detail=False, methods=['get'])
     def customer_engagement(self, request):
         """Get customer engagement data with caching."""
         date_range = self._parse_date_range(request.query_params)
         grouping = request.query_params.get('grouping', 'month')
+
+        def compute():
+            return AnalyticsService.get_customer_engagement_data(request.user, date_range, grouping)
         
-        # Check for cache-busting parameters
-        cache_bust = request.query_params.get('_t') or request.query_params.get('_cacheBust')
-        
-        # Only use cache if no cache-busting parameter is present
-        if not cache_bust:
-            cache_key = CacheManager.get_cache_key(
-                request.user.id,
-                'customer_engagement',
-                {'date_range': date_range, 'grouping': grouping}
-            )
-            cached_data = CacheManager.get_cached_analytics_data(cache_key)
-            
-            if cached_data:
-                return Response(cached_data)
-        
-        data = AnalyticsService.get_customer_engagement_data(request.user, date_range, grouping)
-        
-        # Cache for 10 minutes (only if no cache-busting)
-        if not cache_bust:
-            cache_key = CacheManager.get_cache_key(
-                request.user.id,
-                'customer_engagement',
-                {'date_range': date_range, 'grouping': grouping}
-            )
-            CacheManager.cache_analytics_data(cache_key, data, 600)
-        
-        return Response(data)
+        # Skip the cache if a cache-busting parameter is present
+        if request.query_params.get('_t') or request.query_params.get('_cacheBust'):
+            return Response(compute())
+
+        cache_key = CacheManager.get_cache_key(
+            AnalyticsService.get_cache_scope('customer_engagement', request.user),
+            'customer_engagement',
+            {'date_range': date_range, 'grouping': grouping}
+        )
+        return self._cached_response(cache_key, compute, 'customer_engagement')
 
     @action(detail=False, methods=['get'])
     def task_completion(self, request):
@@ -349,58 +313,37 @@ class AnalyticsViewSet(viewsets.ViewSet):
         grouping = request.query_params.get('grouping', 'month')
         user_id = request.query_params.get('user_id')
         
-        # Check for cache-busting parameters
-        cache_bust = request.query_params.get('_t') or request.query_params.get('_cacheBust')
-        
         # For regular users, they can only see their own data
         if user_id and not request.user.is_staff:
             if str(request.user.id) != str(user_id):
                 return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
-        
-        # Only use cache if no cache-busting parameter is present
-        if not cache_bust:
-            cache_params = {'date_range': date_range, 'grouping': grouping}
-            if user_id:
-                cache_params['user_id'] = user_id
-                
-            cache_key = CacheManager.get_cache_key(
-                request.user.id,
-                'task_completion',
-                cache_params
+
+        def compute():
+            target_user = User.objects.get(id=user_id) if user_id else None
+            return AnalyticsService.get_task_completion_data(
+                request.user, 
+                date_range, 
+                grouping, 
+                target_user=target_user
             )
-            cached_data = CacheManager.get_cached_analytics_data(cache_key)
-            
-            if cached_data:
-                return Response(cached_data)
-        
-        target_user = None
-        if user_id:
-            try:
-                target_user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        data = AnalyticsService.get_task_completion_data(
-            request.user, 
-            date_range, 
-            grouping, 
-            target_user=target_user
-        )
-        
-        # Cache for 10 minutes (only if no cache-busting)
-        if not cache_bust:
+        try:
+            # Skip the cache if a cache-busting parameter is present
+            if request.query_params.get('_t') or request.query_params.get('_cacheBust'):
+                return Response(compute())
+
             cache_params = {'date_range': date_range, 'grouping': grouping}
             if user_id:
                 cache_params['user_id'] = user_id
                 
             cache_key = CacheManager.get_cache_key(
-                request.user.id,
+                AnalyticsService.get_cache_scope('task_completion', request.user, user_id),
                 'task_completion',
                 cache_params
             )
-            CacheManager.cache_analytics_data(cache_key, data, 600)
-        
-        return Response(data)
+            return self._cached_response(cache_key, compute, 'task_completion')
+        except User.DoesNotExist:
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
     @action(detail=False, methods=['get'])
     def conversion_ratios(self, request):
@@ -408,19 +351,29 @@ class AnalyticsViewSet(viewsets.ViewSet):
         date_range = self._parse_date_range(request.query_params)
         
         cache_key = CacheManager.get_cache_key(
-            request.user.id,
+            AnalyticsService.get_cache_scope('conversion_ratios', request.user),
             'conversion_ratios',
             {'date_range': date_range}
         )
-        cached_data = CacheManager.get_cached_analytics_data(cache_key)
-        
-        if cached_data:
-            return Response(cached_data)
-        
-        data = AnalyticsService.get_conversion_ratios(request.user, date_range)
-        CacheManager.cache_analytics_data(cache_key, data, 600)
-        
-        return Response(data)
+        return self._cached_response(
+            cache_key,
+            lambda: AnalyticsService.get_conversion_ratios(request.user, date_range),
+            'conversion_ratios'
+        )
+
+    @action(detail=False, methods=['get'])
+    def pipeline_forecast(self, request):
+        """Get the weighted pipeline forecast, computed once a day."""
+        cache_key = CacheManager.get_cache_key(
+            AnalyticsService.get_cache_scope('pipeline_forecast', request.user),
+            'pipeline_forecast',
+            {'date': timezone.localdate()}
+        )
+        return self._cached_response(
+            cache_key,
+            lambda: PipelineForecaster.forecast(request.user),
+            'pipeline_forecast'
+        )
 
     @action(detail=False, methods=['get'])
     def user_activity(self, request):
@@ -432,19 +385,15 @@ class AnalyticsViewSet(viewsets.ViewSet):
         grouping = request.query_params.get('grouping', 'month')
         
         cache_key = CacheManager.get_cache_key(
-            'all_users',
+            AnalyticsService.get_cache_scope('user_activity', request.user),
             'user_activity',
             {'date_range': date_range, 'grouping': grouping}
         )
-        cached_data = CacheManager.get_cached_analytics_data(cache_key)
-        
-        if cached_data:
-            return Response(cached_data)
-        
-        data = AnalyticsService.get_user_activity_data(date_range, grouping)
-        CacheManager.cache_analytics_data(cache_key, data, 900)  # Cache for 15 minutes
-        
-        return Response(data)
+        return self._cached_response(
+            cache_key,
+            lambda: AnalyticsService.get_user_activity_data(date_range, grouping),
+            'user_activity'
+        )
 
     @action(detail=False, methods=['get'])
     def user_sales_performance(self, request):
@@ -453,19 +402,15 @@ class AnalyticsViewSet(viewsets.ViewSet):
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
         cache_key = CacheManager.get_cache_key(
-            'all_users',
+            AnalyticsService.get_cache_scope('user_sales_performance', request.user),
             'user_sales_performance',
             {}
         )
-        cached_data = CacheManager.get_cached_analytics_data(cache_key)
-        
-        if cached_data:
-            return Response(cached_data)
-        
-        data = AnalyticsService.get_user_sales_performance()
-        CacheManager.cache_analytics_data(cache_key, data, 900)  # Cache for 15 minutes
-        
-        return Response(data)
+        return self._cached_response(
+            cache_key,
+            AnalyticsService.get_user_sales_performance,
+            'user_sales_performance'
+        )
 
     @action(detail=False, methods=['get'])
     def user_task_performance(self, request):
@@ -474,88 +419,38 @@ class AnalyticsViewSet(viewsets.ViewSet):
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
         cache_key = CacheManager.get_cache_key(
-            'all_users',
+            AnalyticsService.get_cache_scope('user_task_performance', request.user),
             'user_task_performance',
             {}
         )
-        cached_data = CacheManager.get_cached_analytics_data(cache_key)
-        
-        if cached_data:
-            return Response(cached_data)
-        
-        data = AnalyticsService.get_user_task_performance()
-        CacheManager.cache_analytics_data(cache_key, data, 900)  # Cache for 15 minutes
-        
-        return Response(data)
+        return self._cached_response(
+            cache_key,
+            AnalyticsService.get_user_task_performance,
+            'user_task_performance'
+        )
+
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """Get analytics cache counters for this server process (manager/admin only)."""
+        if not request.user.role in ['ADMIN', 'MANAGER']:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+        return Response(CacheManager.get_stats())
 
     @action(detail=False, methods=['post'])
     def clear_cache(self, request):
         """Clear analytics cache for the current user."""
         try:
-            from django.core.cache import cache
-            
-            # For database cache, we need to clear specific known cache keys
-            # instead of trying to iterate through all keys
-            cache_prefixes = [
-                'dashboard_kpis',
-                'sales_performance', 
-                'customer_engagement',
-                'task_completion',
-                'conversion_ratios'
-            ]
-            
-            user_id = request.user.id
-            cleared_keys = []
-            
-            # Clear user-specific cache keys
-            for prefix in cache_prefixes:
-                # Try different variations of cache keys that might exist
-                possible_keys = [
-                    f"analytics:{user_id}:{prefix}:",
-                    f"analytics:{user_id}:{prefix}:{{}}",
-                    f"analytics:{user_id}:{prefix}:*",
-                ]
-                
-                for key_pattern in possible_keys:
-                    try:
-                        cache.delete(key_pattern)
-                        cleared_keys.append(key_pattern)
-                    except:
-                        pass  # Key might not exist, which is fine
-            
-            # Also clear some common cache keys that might exist
-            common_keys = [
-                f"analytics:{user_id}:dashboard_kpis:",
-                f"analytics:all_users:user_activity:",
-            ]
-            
-            for key in common_keys:
-                try:
-                    cache.delete(key)
-                    cleared_keys.append(key)
-                except:
-                    pass
-            
-            # Alternative approach: Use cache versioning to effectively clear cache
-            # This increments the cache version, making old cached data inaccessible
-            from django.core.cache.utils import make_key
-            from django.conf import settings
-            
-            # Try to clear using cache.clear() if available (works with some backends)
-            try:
-                if hasattr(cache, 'clear'):
-                    cache.clear()
-                    return Response({
-                        'message': 'All cache cleared successfully',
-                        'method': 'cache.clear()'
-                    })
-            except:
-                pass
-            
+            # Moving to a new generation makes every cached entry of a scope unreachable
+            CacheManager.bump_generation(f'scope:user:{request.user.id}')
+
+            # Shared entries are cached for everyone; only managers and admins may refresh them
+            if request.user.is_staff or getattr(request.user, 'role', None) in ['ADMIN', 'MANAGER']:
+                CacheManager.bump_generation('scope:global')
+
             return Response({
-                'message': 'Cache clearing attempted',
-                'cleared_keys': len(cleared_keys),
-                'method': 'individual_key_deletion'
+                'message': 'Analytics cache cleared successfully',
+                'method': 'generation_bump'
             })
             
         except Exception as e:
@@ -569,6 +464,14 @@ class AnalyticsViewSet(viewsets.ViewSet):
                 'error': str(e)
             }, status=200)  # Still return 200 since this is not critical
 
+    def _cached_response(self, cache_key, compute, report_type):
+        """Respond with cached analytics data, saying how old it is and how it was served."""
+        entry = CacheManager.get_or_compute(cache_key, compute, report_type)
+        response = Response(entry.value)
+        response['Age'] = str(entry.age)
+        response['X-Cache-Status'] = entry.state
+        return response
+
     def _parse_date_range(self, params):
         """Parse date range from query parameters."""
         start_date = params.get('start_date')
@@ -616,35 +519,17 @@ class ReportScheduleViewSet(viewsets.ModelViewSet):
         schedule = self.get_object()
         
         try:
-            # Generate report from template
-            report_data = {
-                'template_id': schedule.template.id,
-                'status': 'processing'
-            }
+            report = ReportJobQueue.submit(schedule.template, request.user)
             
-            serializer = GeneratedReportSerializer(data=report_data, context={'request': request})
-            if serializer.is_valid():
-                report = serializer.save()
-                
-                # Use template generation logic
-                template_viewset = ReportTemplateViewSet()
-                analytics_data = template_viewset._generate_report_data(schedule.template, request.user)
-                
-                report.data_dict = analytics_data
-                report.status = 'completed'
-                report.summary_stats_dict = template_viewset._calculate_summary_stats(analytics_data)
-                report.save()
-                
-                # Update schedule last run time
-                schedule.last_run = timezone.now()
-                schedule.save()
-                
-                return Response({
-                    'message': 'Report generated successfully',
-                    'report_id': report.id
-                })
+            # Update schedule last run time
+            schedule.last_run = timezone.now()
+            schedule.save()
             
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'message': 'Report generation started',
+                'report_id': report.id,
+                'status': report.status
+            }, status=status.HTTP_202_ACCEPTED)
             
         except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR) 
\ No newline at end of file
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,191 @@
+"""
+Bulk status transitions, reassignment and archiving of sales.
+
+Each operation runs in one transaction: the visible sales are locked and
+loaded with one query, written back with one bulk_update and their audit
+notes with one bulk_create. bulk_update skips the model signals, so the
+rollup cube, the change feed and the analytics cache are maintained here
+directly, and notifications are sent once per recipient instead of once per
+sale.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from api.changes import ChangeFeed
+from notifications.services import NotificationService
+from reporting.cube import RollupCube
+from reporting.models import SaleFact
+from reporting.utils import CacheManager
+from .models import Sale, SaleNote
+
+User = get_user_model()
+
+
+class BulkSaleOperations:
+    """Applies one change to many sales and reports the outcome per sale."""
+
+    @staticmethod
+    def transition_status(user, sale_ids, status):
+        def change(sale):
+            sale.status = status
+
+        def note(sale, original):
+            return f"Status changed from {original['status']} to {status}"
+
+        def notify(changed):
+            if status == 'WON':
+                BulkSaleOperations._notify_won(changed)
+
+        return BulkSaleOperations._apply(user, sale_ids, {'status': status}, change, note, notify)
+
+    @staticmethod
+    def reassign(user, sale_ids, assignee):
+        def change(sale):
+            sale.assigned_to = assignee
+
+        def note(sale, original):
+            previous = BulkSaleOperations._user_label(original['assigned_to'])
+            return f"Reassigned from {previous} to {BulkSaleOperations._user_label(assignee)}"
+
+        def notify(changed):
+            BulkSaleOperations._notify_reassigned(assignee, changed)
+
+        return BulkSaleOperations._apply(
+            user, sale_ids, {'assigned_to_id': assignee.id}, change, note, notify
+        )
+
+    @staticmethod
+    def archive(user, sale_ids, is_archived=True):
+        def change(sale):
+            sale.is_archived = is_archived
+
+        def note(sale, original):
+            return 'Archived' if is_archived else 'Restored from archive'
+
+        return BulkSaleOperations._apply(
+            user, sale_ids, {'is_archived': is_archived}, change, note, lambda changed: None
+        )
+
+    @staticmethod
+    def _apply(user, sale_ids, target, change, note, notify):
+        """
+        Change every sale in sale_ids the user can see that differs from target.
+
+        Sales the user cannot see are reported as not_found, like the detail
+        endpoint does.
+        """
+        now = timezone.now()
+        fields = [name.removesuffix('_id') for name in target] + ['updated_at']
+
+        with transaction.atomic():
+            queryset = Sale.objects.select_related('customer', 'assigned_to').select_for_update(of=('self',))
+            if user.role == 'USER':
+                queryset = queryset.filter(assigned_to=user)
+            sales = queryset.in_bulk(sale_ids)
+
+            results = []
+            changed = []
+            originals = {}
+            for sale_id in sale_ids:
+                sale = sales.get(sale_id)
+                if sale is None:
+                    results.append({'id': sale_id, 'result': 'not_found'})
+                    continue
+                if all(getattr(sale, name) == value for name, value in target.items()):
+                    results.append({'id': sale_id, 'result': 'unchanged'})
+                    continue
+
+                previous = {name: getattr(sale, name) for name in target}
+                originals[sale.pk] = {
+                    'fact': BulkSaleOperations._fact(sale),
+                    'visibility': ChangeFeed.visibility(sale),
+                    'status': sale.status,
+                    'assigned_to': sale.assigned_to,
+                }
+                change(sale)
+                sale.updated_at = now
+                changed.append(sale)
+                results.append({'id': sale_id, 'result': 'updated', 'previous': previous})
+
+            if changed:
+                Sale.objects.bulk_update(changed, fields)
+                SaleNote.objects.bulk_create([
+                    SaleNote(sale=sale, author=user, content=note(sale, originals[sale.pk]), is_update=True)
+                    for sale in changed
+                ])
+                moves = []
+                for sale in changed:
+                    old_key, old_amount = originals[sale.pk]['fact']
+                    new_key, new_amount = BulkSaleOperations._fact(sale)
+                    moves.append((old_key, new_key, old_amount, new_amount))
+                RollupCube.move_many(SaleFact, moves)
+                ChangeFeed.record_many(changed, {pk: original['visibility'] for pk, original in originals.items()})
+                notify(changed)
+                transaction.on_commit(lambda: CacheManager.bump_generation('sale'))
+
+        counts = defaultdict(int)
+        for result in results:
+            counts[result['result']] += 1
+        return {
+            'updated': counts['updated'],
+            'unchanged': counts['unchanged'],
+            'not_found': counts['not_found'],
+            'results': results,
+        }
+
+    @staticmethod
+    def _fact(sale):
+        """(fact key, amount) the sale currently counts towards."""
+        values = RollupCube.field_values(sale, RollupCube.SALE_FIELDS)
+        return RollupCube.sale_key(values, sale.customer.region), values['amount'] or Decimal('0')
+
+    @staticmethod
+    def _user_label(user):
+        return f"{user.first_name} {user.last_name}".strip() or user.email
+
+    @staticmethod
+    def _notify_won(sales):
+        """One notification per manager for all the deals won in this operation."""
+        total = sum((sale.amount or Decimal('0') for sale in sales), Decimal('0'))
+        count = len(sales)
+        message = (
+            f"{sales[0].title} with {sales[0].customer.name} has been won, worth ${total}"
+            if count == 1 else
+            f"{count} deals have been won, worth ${total} in total"
+        )
+        for manager in User.objects.filter(role='MANAGER'):
+            NotificationService.create_notification(
+                recipient=manager,
+                title="Sale Won!" if count == 1 else f"{count} Sales Won!",
+                message=message,
+                category_name="sale",
+                priority="high",
+                related_object=sales[0] if count == 1 else None,
+                action_url=f"/sales/{sales[0].id}" if count == 1 else "/sales",
+                icon="AttachMoney",
+                color="#4caf50"
+            )
+
+    @staticmethod
+    def _notify_reassigned(assignee, sales):
+        """One notification for the new assignee covering every sale handed over."""
+        count = len(sales)
+        NotificationService.create_notification(
+            recipient=assignee,
+            title="Sales Opportunity Assigned" if count == 1 else f"{count} Sales Opportunities Assigned",
+            message=(
+                f"You have been assigned the sales opportunity {sales[0].title}"
+                if count == 1 else
+                f"You have been assigned {count} sales opportunities"
+            ),
+            category_name="sale",
+            priority="medium",
+            related_object=sales[0] if count == 1 else None,
+            action_url=f"/sales/{sales[0].id}" if count == 1 else "/sales",
+            icon="AttachMoney",
+            color="#ff9800"
+        )
@@ -1,8 +1,9 @@
 from django.db import models
 from django.conf import settings
+from crm.tracking import FieldTrackerMixin
 from customers.models import Customer, TimeStampedModel
 
-class Sale(TimeStampedModel):
+class Sale(FieldTrackerMixin, TimeStampedModel):
     """
     Sales model for tracking sales opportunities.
     """
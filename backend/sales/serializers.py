@@ -30,7 +30,6 @@ class SaleSerializer(serializers.ModelSerializer):
     created_at = serializers.DateTimeField(format="%d/%m/%Y %H:%M", read_only=True)
     updated_at = serializers.DateTimeField(format="%d/%m/%Y %H:%M", read_only=True)
     expected_close_date = serializers.DateField(format="%Y-%m-%d", required=False, allow_null=True)
-    notes = SaleNoteSerializer(many=True, read_only=True)
     
     # Add related fields
     assigned_to_details = UserSerializer(source='assigned_to', read_only=True)
@@ -83,4 +82,50 @@ class SaleSerializer(serializers.ModelSerializer):
             Customer.objects.get(pk=value.id)
         except Customer.DoesNotExist:
             raise serializers.ValidationError("Selected customer does not exist")
-        return value 
\ No newline at end of file
+        return value 
+
+
+class SaleListSerializer(SaleSerializer):
+    """Sale without its notes, for list views; note_count is annotated by the queryset."""
+    note_count = serializers.IntegerField(read_only=True)
+
+
+class SaleDetailSerializer(SaleListSerializer):
+    """
+    Sale with the newest page of its notes.
+
+    The view passes the page as notes_page in the context, and a link to the
+    next page of the notes endpoint as notes_next.
+    """
+    notes = serializers.SerializerMethodField()
+    notes_next = serializers.SerializerMethodField()
+
+    def get_notes(self, obj):
+        return SaleNoteSerializer(self.context.get('notes_page', []), many=True).data
+
+    def get_notes_next(self, obj):
+        return self.context.get('notes_next')
+
+
+class BulkSaleSerializer(serializers.Serializer):
+    """Sale ids for a bulk operation; duplicates are dropped, order is kept."""
+    MAX_IDS = 500
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_IDS
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
+class BulkSaleStatusSerializer(BulkSaleSerializer):
+    status = serializers.ChoiceField(choices=Sale.STATUS_CHOICES)
+
+
+class BulkSaleReassignSerializer(BulkSaleSerializer):
+    assigned_to = serializers.PrimaryKeyRelatedField(queryset=User.objects.filter(is_active=True))
+
+
+class BulkSaleArchiveSerializer(BulkSaleSerializer):
+    is_archived = serializers.BooleanField(default=True)
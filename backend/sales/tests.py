@@ -0,0 +1,139 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import Sum
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import ChangeLogEntry
+from customers.models import Customer
+from reporting.cube import RollupCube
+from reporting.models import SaleFact
+from .bulk import BulkSaleOperations
+from .models import Sale, SaleNote
+
+User = get_user_model()
+
+
+class BulkSaleOperationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('mia@example.com', 'pw', role='MANAGER', first_name='Mia')
+        cls.bob = User.objects.create_user('bob@example.com', 'pw', role='USER', first_name='Bob')
+        cls.cat = User.objects.create_user('cat@example.com', 'pw', role='USER', first_name='Cat')
+        north = Customer.objects.create(name='North', email='north@example.com', region='NA', owner=cls.manager)
+        europe = Customer.objects.create(name='Europe', email='europe@example.com', region='EU', owner=cls.bob)
+        today = timezone.localdate()
+        cls.bobs = [
+            Sale.objects.create(
+                title=f'Bob {number}', customer=customer, assigned_to=cls.bob, status='NEW',
+                amount=Decimal(amount), expected_close_date=today
+            )
+            for number, (customer, amount) in enumerate(((north, '100'), (europe, '250'), (north, '40')))
+        ]
+        cls.cats = Sale.objects.create(
+            title='Cat 0', customer=europe, assigned_to=cls.cat, status='NEW', amount=Decimal('75')
+        )
+        RollupCube.rebuild()
+
+    def setUp(self):
+        self.first_entry = (ChangeLogEntry.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+
+    def entries(self, sale):
+        return list(
+            ChangeLogEntry.objects.filter(id__gte=self.first_entry, model='sale', object_id=sale.pk)
+            .order_by('id').values_list('action', 'assignee', 'audience')
+        )
+
+    def assert_cube_matches_rebuild(self):
+        incremental = sorted(SaleFact.objects.values_list(
+            'day', 'undated', 'assigned_to_id', 'status', 'priority', 'region', 'count', 'amount'
+        ))
+        RollupCube.rebuild()
+        rebuilt = sorted(SaleFact.objects.values_list(
+            'day', 'undated', 'assigned_to_id', 'status', 'priority', 'region', 'count', 'amount'
+        ))
+        self.assertEqual(incremental, rebuilt)
+
+    def test_status_transition(self):
+        ids = [sale.pk for sale in self.bobs]
+        Sale.objects.filter(pk=ids[0]).update(status='WON')
+        RollupCube.rebuild()
+
+        outcome = BulkSaleOperations.transition_status(self.bob, ids + [999999], 'WON')
+
+        self.assertEqual((outcome['updated'], outcome['unchanged'], outcome['not_found']), (2, 1, 1))
+        self.assertEqual(outcome['results'][1], {'id': ids[1], 'result': 'updated', 'previous': {'status': 'NEW'}})
+        self.assertEqual(Sale.objects.filter(pk__in=ids, status='WON').count(), 3)
+        self.assertEqual(
+            SaleFact.objects.filter(status='WON').aggregate(total=Sum('amount'))['total'], Decimal('390')
+        )
+        self.assertEqual(SaleNote.objects.filter(sale_id=ids[1]).get().content, 'Status changed from NEW to WON')
+        self.assertEqual(self.entries(self.bobs[0]), [])
+        self.assertEqual(self.entries(self.bobs[1]), [('upsert', self.bob.id, f',{self.bob.id},')])
+        self.assert_cube_matches_rebuild()
+
+    def test_reassign(self):
+        ids = [sale.pk for sale in self.bobs[:2]]
+
+        outcome = BulkSaleOperations.reassign(self.manager, ids, self.cat)
+
+        self.assertEqual(outcome['updated'], 2)
+        self.assertEqual(
+            outcome['results'][0]['previous'], {'assigned_to_id': self.bob.id}
+        )
+        self.assertEqual(Sale.objects.filter(assigned_to=self.cat).count(), 3)
+        self.assertEqual(
+            SaleFact.objects.filter(assigned_to=self.cat).aggregate(total=Sum('amount'))['total'], Decimal('425')
+        )
+        self.assertEqual(SaleNote.objects.filter(sale_id=ids[0]).get().content, 'Reassigned from Bob to Cat')
+        # The previous assignee gets a tombstone, the new one the sale
+        self.assertEqual(self.entries(self.bobs[0]), [
+            ('delete', self.bob.id, f',{self.bob.id},'),
+            ('upsert', self.cat.id, f',{self.cat.id},'),
+        ])
+        self.assert_cube_matches_rebuild()
+
+    def test_archive_and_restore(self):
+        sale = self.bobs[2]
+
+        self.assertEqual(BulkSaleOperations.archive(self.bob, [sale.pk])['updated'], 1)
+        sale.refresh_from_db()
+        self.assertTrue(sale.is_archived)
+        self.assertEqual(self.entries(sale)[-1][0], 'upsert')
+        self.assertTrue(ChangeLogEntry.objects.filter(object_id=sale.pk).latest('id').data['is_archived'])
+
+        self.assertEqual(BulkSaleOperations.archive(self.bob, [sale.pk], is_archived=False)['updated'], 1)
+        self.assertEqual(
+            list(SaleNote.objects.filter(sale=sale).order_by('id').values_list('content', flat=True)),
+            ['Archived', 'Restored from archive']
+        )
+        # Archiving does not change what a sale counts towards
+        self.assert_cube_matches_rebuild()
+
+    def test_user_cannot_change_other_users_sales(self):
+        for operation in (
+            lambda: BulkSaleOperations.transition_status(self.bob, [self.cats.pk], 'LOST'),
+            lambda: BulkSaleOperations.reassign(self.bob, [self.cats.pk], self.bob),
+            lambda: BulkSaleOperations.archive(self.bob, [self.cats.pk]),
+        ):
+            outcome = operation()
+            self.assertEqual(outcome['not_found'], 1)
+            self.assertEqual(outcome['updated'], 0)
+
+        self.cats.refresh_from_db()
+        self.assertEqual((self.cats.status, self.cats.assigned_to, self.cats.is_archived), ('NEW', self.cat, False))
+        self.assertFalse(SaleNote.objects.filter(sale=self.cats).exists())
+        self.assertEqual(self.entries(self.cats), [])
+        self.assert_cube_matches_rebuild()
+
+    def test_users_cannot_bulk_reassign(self):
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        response = client.post(
+            reverse('sale-bulk-reassign'), {'ids': [self.bobs[0].pk], 'assigned_to': self.cat.pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Sale.objects.get(pk=self.bobs[0].pk).assigned_to, self.bob)
@@ -3,17 +3,39 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from .models import Sale, SaleNote
-from .serializers import SaleSerializer, SaleNoteSerializer
-from django.db.models import Sum, Avg, Q
+from .bulk import BulkSaleOperations
+from .serializers import (
+    SaleSerializer, SaleListSerializer, SaleDetailSerializer, SaleNoteSerializer,
+    BulkSaleStatusSerializer, BulkSaleReassignSerializer, BulkSaleArchiveSerializer
+)
+from django.db.models import Sum, Avg, Count, Q, F, Window
+from django.db.models.functions import RowNumber
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from api.permissions import IsOwnerOrAdmin
+from api.permissions import IsOwnerOrAdmin, IsAdminOrManager
+from api.exports import ExportMixin
+from reporting.metrics import SALES_KPIS, TASK_KPIS
+from tasks.views import get_visible_tasks
+import base64
+import json
 import logging
+from datetime import datetime
+from django.urls import reverse
 from django.utils import timezone
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
-class SaleViewSet(viewsets.ModelViewSet):
+
+class SaleNotePagination(CursorPagination):
+    """Notes newest first, in pages that stay stable while new notes are added."""
+    page_size = 20
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+class SaleViewSet(ExportMixin, viewsets.ModelViewSet):
     """
     API endpoint for sales management with role-based filtering.
     """
@@ -28,7 +50,9 @@ class SaleViewSet(viewsets.ModelViewSet):
         - USER: Can only see sales assigned to them
         """
         user = self.request.user
-        queryset = Sale.objects.all().order_by('-created_at')
+        queryset = Sale.objects.select_related('customer', 'assigned_to').order_by('-created_at')
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.annotate(note_count=Count('notes'))
         
         # Apply role-based filtering
         if user.role == 'USER':
@@ -37,15 +61,66 @@ class SaleViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return SaleListSerializer
+        if self.action == 'retrieve':
+            return SaleDetailSerializer
+        return SaleSerializer
+    
+    def retrieve(self, request, *args, **kwargs):
+        """A sale with the newest page of its notes; notes_next points at the older ones."""
+        sale = self.get_object()
+        paginator = SaleNotePagination()
+        notes = paginator.paginate_queryset(sale.notes.select_related('author'), request)
+        # Further pages come from the notes endpoint
+        paginator.base_url = request.build_absolute_uri(reverse('get-sale-notes', args=[sale.pk]))
+        serializer = self.get_serializer_class()(sale, context={
+            **self.get_serializer_context(),
+            'notes_page': notes,
+            'notes_next': paginator.get_next_link(),
+        })
+        return Response(serializer.data)
+    
     def get_permissions(self):
         """
         Permissions:
         - Admin: Full access
         - Users: Access to sales they're assigned to
+        - Bulk reassignment: Admins and managers only
         """
         permission_classes = [IsAuthenticated]
+        if self.action == 'bulk_reassign':
+            permission_classes = [IsAuthenticated, IsAdminOrManager]
         return [permission() for permission in permission_classes]
     
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        """Move the given sales to one status: {"ids": [...], "status": "WON"}."""
+        serializer = BulkSaleStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(BulkSaleOperations.transition_status(
+            request.user, serializer.validated_data['ids'], serializer.validated_data['status']
+        ))
+    
+    @action(detail=False, methods=['post'])
+    def bulk_reassign(self, request):
+        """Hand the given sales to another user: {"ids": [...], "assigned_to": 7}."""
+        serializer = BulkSaleReassignSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(BulkSaleOperations.reassign(
+            request.user, serializer.validated_data['ids'], serializer.validated_data['assigned_to']
+        ))
+    
+    @action(detail=False, methods=['post'])
+    def bulk_archive(self, request):
+        """Archive, or with "is_archived": false restore, the given sales: {"ids": [...]}."""
+        serializer = BulkSaleArchiveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(BulkSaleOperations.archive(
+            request.user, serializer.validated_data['ids'], serializer.validated_data['is_archived']
+        ))
+    
     def perform_create(self, serializer):
         # Set the current user as the assigned_to if not specified
         if 'assigned_to' not in serializer.validated_data:
@@ -139,76 +214,137 @@ def delete_sale(request, pk):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+# Cards per kanban column in one pipeline response
+PIPELINE_COLUMN_LIMIT = 50
+MAX_PIPELINE_COLUMN_LIMIT = 200
+# Card order within a column; the cursor encodes both fields of the last card
+PIPELINE_ORDER = ('-created_at', '-id')
+PIPELINE_CARD_FIELDS = (
+    'id', 'title', 'amount', 'expected_close_date', 'description', 'priority', 'status', 'created_at',
+    'customer_id', 'customer__name', 'customer__email', 'customer__company',
+    'assigned_to_id', 'assigned_to__email', 'assigned_to__first_name', 'assigned_to__last_name',
+)
+
+
+def _pipeline_card(row):
+    """Kanban card of a sale from its PIPELINE_CARD_FIELDS values."""
+    assigned_to_name = f"{row['assigned_to__first_name']} {row['assigned_to__last_name']}".strip() or row['assigned_to__email']
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'customer_name': row['customer__name'],
+        'customer_details': {
+            'id': row['customer_id'],
+            'name': row['customer__name'],
+            'email': row['customer__email'],
+            'company': row['customer__company'] or ''
+        },
+        'amount': float(row['amount']) if row['amount'] else 0,
+        'expected_close_date': row['expected_close_date'].isoformat() if row['expected_close_date'] else None,
+        'description': row['description'],
+        'priority': row['priority'],
+        'priority_display': dict(Sale.PRIORITY_CHOICES).get(row['priority'], row['priority']),
+        'status': row['status'],
+        'status_display': dict(Sale.STATUS_CHOICES).get(row['status'], row['status']),
+        'assigned_to_name': assigned_to_name,
+        'assigned_to_details': {
+            'id': row['assigned_to_id'],
+            'email': row['assigned_to__email'],
+            'full_name': assigned_to_name
+        },
+        'created_at': row['created_at'].isoformat()
+    }
+
+
+def _pipeline_cursor(row):
+    """Opaque cursor pointing just past a card in its column."""
+    position = json.dumps([row['created_at'].isoformat(), row['id']])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def _after_pipeline_cursor(queryset, cursor):
+    """Restrict a column's sales to those ordered after the cursor's card."""
+    try:
+        created_at, sale_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at, sale_id = datetime.fromisoformat(created_at), int(sale_id)
+    except (ValueError, TypeError):
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+    return queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=sale_id))
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def sales_pipeline(request):
     """
     Endpoint to get sales pipeline data grouped by status with role-based filtering
+
+    Each status holds its first ?limit= cards (default 50), newest first, and
+    'columns' gives every status its full count, amount sum and a cursor to
+    the next cards. ?status=<code>&cursor=<cursor> returns the next cards of
+    one column instead.
     """
     try:
-        # Get all non-archived sales with related data
-        sales = Sale.objects.filter(is_archived=False).select_related('customer', 'assigned_to')
-        
-        # Apply role-based filtering
-        if request.user.role == 'USER':
-            sales = sales.filter(assigned_to=request.user)
-        
-        # Apply search filter if provided
-        search_term = request.query_params.get('search', None)
-        if search_term:
-            print(f"DEBUG: Applying search filter: {search_term}")
-            sales = sales.filter(
-                Q(title__icontains=search_term) |
-                Q(description__icontains=search_term) |
-                Q(customer__name__icontains=search_term)
-            )
-        
-        print(f"DEBUG: Found {sales.count()} sales after filtering")
-        
-        # Create a detailed response
-        result = {}
-        for status_code, status_name in Sale.STATUS_CHOICES:
-            sales_list = []
-            status_sales = sales.filter(status=status_code)
-            print(f"DEBUG: Status {status_code} has {status_sales.count()} sales")
-            
-            for sale in status_sales:
-                # Enhanced response with more details
-                sales_list.append({
-                    'id': sale.id,
-                    'title': sale.title,
-                    'customer_name': sale.customer.name,
-                    'customer_details': {
-                        'id': sale.customer.id,
-                        'name': sale.customer.name,
-                        'email': sale.customer.email,
-                        'company': getattr(sale.customer, 'company', '')
-                    },
-                    'amount': float(sale.amount) if sale.amount else 0,
-                    'expected_close_date': sale.expected_close_date.isoformat() if sale.expected_close_date else None,
-                    'description': sale.description,
-                    'priority': sale.priority,
-                    'priority_display': dict(Sale.PRIORITY_CHOICES).get(sale.priority, sale.priority),
-                    'status': sale.status,
-                    'status_display': dict(Sale.STATUS_CHOICES).get(sale.status, sale.status),
-                    'assigned_to_name': f"{sale.assigned_to.first_name} {sale.assigned_to.last_name}".strip() or sale.assigned_to.email,
-                    'assigned_to_details': {
-                        'id': sale.assigned_to.id,
-                        'email': sale.assigned_to.email,
-                        'full_name': f"{sale.assigned_to.first_name} {sale.assigned_to.last_name}".strip() or sale.assigned_to.email
-                    },
-                    'created_at': sale.created_at.isoformat()
-                })
-            
-            result[status_code] = sales_list
-        
-        print("DEBUG: Pipeline result structure:", {k: len(v) for k, v in result.items()})
-        return Response(result)
-    except Exception as e:
-        print(f"DEBUG ERROR: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        limit = min(int(request.query_params.get('limit', PIPELINE_COLUMN_LIMIT)), MAX_PIPELINE_COLUMN_LIMIT)
+    except ValueError:
+        return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(limit, 1)
+
+    sales = Sale.objects.filter(is_archived=False)
+
+    # Apply role-based filtering
+    if request.user.role == 'USER':
+        sales = sales.filter(assigned_to=request.user)
+
+    # Apply search filter if provided
+    search_term = request.query_params.get('search', None)
+    if search_term:
+        sales = sales.filter(
+            Q(title__icontains=search_term) |
+            Q(description__icontains=search_term) |
+            Q(customer__name__icontains=search_term)
+        )
+
+    # Loading more cards of one column
+    column = request.query_params.get('status')
+    if column:
+        if column not in dict(Sale.STATUS_CHOICES):
+            return Response({'error': f'Unknown status: {column}'}, status=status.HTTP_400_BAD_REQUEST)
+        column_sales = sales.filter(status=column)
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            column_sales = _after_pipeline_cursor(column_sales, cursor)
+        rows = list(column_sales.order_by(*PIPELINE_ORDER).values(*PIPELINE_CARD_FIELDS)[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return Response({
+            'status': column,
+            'results': [_pipeline_card(row) for row in rows],
+            'next_cursor': _pipeline_cursor(rows[-1]) if has_more else None,
+        })
+
+    # Top cards of every column plus column totals in a single query
+    by_status = {'partition_by': [F('status')]}
+    rows = sales.annotate(
+        column_position=Window(RowNumber(), order_by=[F('created_at').desc(), F('id').desc()], **by_status),
+        column_count=Window(Count('id'), **by_status),
+        column_amount=Window(Sum('amount'), **by_status),
+    ).filter(column_position__lte=limit).order_by('status', 'column_position').values(
+        *PIPELINE_CARD_FIELDS, 'column_count', 'column_amount'
+    )
+
+    result = {status_code: [] for status_code, _ in Sale.STATUS_CHOICES}
+    columns = {status_code: {'count': 0, 'amount': 0, 'next_cursor': None} for status_code, _ in Sale.STATUS_CHOICES}
+    for row in rows:
+        cards = result.setdefault(row['status'], [])
+        cards.append(_pipeline_card(row))
+        columns[row['status']] = {
+            'count': row['column_count'],
+            'amount': float(row['column_amount'] or 0),
+            'next_cursor': _pipeline_cursor(row) if row['column_count'] > len(cards) else None,
+        }
+
+    result['columns'] = columns
+    return Response(result)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -225,39 +361,21 @@ def sales_stats(request):
         # Apply role-based filtering
         if request.user.role == 'USER':
             all_sales = all_sales.filter(assigned_to=request.user)
-            
-        print(f"📈 DEBUG: Total sales in query: {all_sales.count()}")
+        
+        # All sales KPIs, including per-status counts, in a single aggregate query
+        sales = SALES_KPIS.compute(all_sales)
         
         result = {
-            'total_count': all_sales.count(),
-            'total_value': float(all_sales.aggregate(Sum('amount'))['amount__sum'] or 0),
-            'status_counts': {}
+            'total_count': sales['total_sales'],
+            'total_value': float(sales['total_amount']),
+            'status_counts': {
+                status_code: sales[f'status_{status_code}']
+                for status_code, status_name in Sale.STATUS_CHOICES
+            }
         }
         
-        # Count by status with detailed logging
-        for status_code, status_name in Sale.STATUS_CHOICES:
-            count = all_sales.filter(status=status_code).count()
-            result['status_counts'][status_code] = count
-            print(f"🏷️  DEBUG: Status {status_code}: {count} sales")
-        
-        # Get task stats from the task service
-        try:
-            # Import here to avoid circular imports
-            from tasks.views import task_stats
-            # Create a mock request with the current user
-            from rest_framework.test import APIRequestFactory
-            factory = APIRequestFactory()
-            task_request = factory.get('/api/task-management/stats/')
-            task_request.user = request.user
-            task_stats_response = task_stats(task_request)
-            if task_stats_response.status_code == 200:
-                task_data = task_stats_response.data
-                result['active_tasks'] = task_data.get('active_tasks', 0)
-            else:
-                result['active_tasks'] = 0
-        except Exception as e:
-            print(f"Error fetching task stats: {str(e)}")
-            result['active_tasks'] = 0
+        # Active tasks come from the same task KPIs the task stats endpoint uses
+        result['active_tasks'] = TASK_KPIS.compute(get_visible_tasks(request.user))['active_tasks']
         
         # For upcoming events - would normally call a similar event stats API
         # For now, just set a placeholder value
@@ -303,51 +421,51 @@ def create_sale_note(request, sale_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_sale_notes(request, sale_id):
-    try:
-        notes = SaleNote.objects.filter(sale_id=sale_id).select_related('author')
-        serializer = SaleNoteSerializer(notes, many=True)
-        return Response(serializer.data)
-    except Exception as e:
-        return Response(
-            {'error': str(e)},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+    """
+    Notes of a sale, newest first, cursor-paginated (?cursor=, ?limit=).
+    """
+    notes = SaleNote.objects.filter(sale_id=sale_id).select_related('author')
+    paginator = SaleNotePagination()
+    page = paginator.paginate_queryset(notes, request)
+    serializer = SaleNoteSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def update_sale(request, pk):
     try:
         sale = Sale.objects.get(pk=pk)
-        old_data = SaleSerializer(sale).data
         serializer = SaleSerializer(sale, data=request.data, partial=True)
         
         if serializer.is_valid():
             serializer.save()
             
-            # Create an update note if there are changes
+            # Create an update note if there are changes; the field tracker knows the values before the save
             changes = []
-            for field, new_value in serializer.validated_data.items():
-                old_value = old_data.get(field)
-                if old_value != new_value:
+            for attname, (old_value, new_value) in sale.saved_changes().items():
+                field = Sale._meta.get_field(attname).name
+                if field in serializer.validated_data:
                     field_display = field.replace('_', ' ').title()
                     changes.append(f"{field_display}: {old_value} → {new_value}")
             
+            notes = []
             if changes:
-                SaleNote.objects.create(
+                notes.append(SaleNote(
                     sale=sale,
                     author=request.user,
                     content="\n".join(changes),
                     is_update=True
-                )
+                ))
             
             # Create a note about the status change
             note_content = f"Status changed to {dict(Sale.STATUS_CHOICES)[sale.status]}"
-            SaleNote.objects.create(
+            notes.append(SaleNote(
                 sale=sale,
                 author=request.user,
                 content=note_content,
                 is_update=True
-            )
+            ))
+            SaleNote.objects.bulk_create(notes)
             
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -431,9 +549,9 @@ def update_sale_status(request, pk):
             )
         
         # Update the status
-        old_status = sale.status
         sale.status = new_status
         sale.save()
+        old_status, _ = sale.saved_changes().get('status', (new_status, new_status))
         
         print(f"✅ DEBUG: Sale {pk} status updated from {old_status} to {new_status}")
         print(f"📝 DEBUG: Sale object after save - ID: {sale.id}, Status: {sale.status}")
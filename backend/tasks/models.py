@@ -2,8 +2,9 @@ from django.db import models
 # from django.contrib.auth.models import User # Replaced with AUTH_USER_MODEL
 from django.conf import settings
 from django.utils import timezone
+from crm.tracking import FieldTrackerMixin
 
-class Task(models.Model):
+class Task(FieldTrackerMixin, models.Model):
     PRIORITY_CHOICES = [
         ('L', 'Low'),
         ('M', 'Medium'),
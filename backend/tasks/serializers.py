@@ -25,4 +25,10 @@ class TaskSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at', 'updated_at', 'assigned_to_username', 'created_by_username',
                             'status_display', 'priority_display', 'comments')
 
+class TaskExportFilterSerializer(serializers.Serializer):
+    """Optional filters of the task export."""
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    priority = serializers.ChoiceField(choices=Task.PRIORITY_CHOICES, required=False)
+    assigned_to = serializers.IntegerField(min_value=1, required=False)
+
 # UserSerializer removed from here, UserListView in tasks.views will use UserSerializer from api.serializers 
\ No newline at end of file
@@ -0,0 +1,41 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .models import Task
+
+User = get_user_model()
+
+
+class TaskExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('ada@example.com', 'pw', role='ADMIN')
+        cls.user = User.objects.create_user('uma@example.com', 'pw', role='USER')
+        Task.objects.create(title='Call', assigned_to=cls.user, created_by=cls.admin, status='P', priority='H')
+        Task.objects.create(title='Mail', assigned_to=cls.admin, created_by=cls.admin, status='C', priority='L')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        return self.client.get(reverse('task-export'), params)
+
+    def titles(self, response):
+        body = b''.join(response.streaming_content).decode()
+        return sorted(json.loads(line)['title'] for line in body.splitlines())
+
+    def test_filters(self):
+        self.assertEqual(self.titles(self.export(assigned_to=self.user.pk)), ['Call'])
+        self.assertEqual(self.titles(self.export(status='C', priority='L')), ['Mail'])
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({'assigned_to': 'abc'}, {'status': 'DONE'}, {'priority': 'X'}):
+            with self.subTest(params=params):
+                response = self.export(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
@@ -5,11 +5,13 @@ from .views import (
     UserListView,
     TaskCommentListCreateView,
     TaskCommentDetailView,
-    task_stats
+    task_stats,
+    export_tasks
 )
 
 urlpatterns = [
     path('tasks/', TaskListCreateView.as_view(), name='task-list-create'),
+    path('tasks/export/', export_tasks, name='task-export'),
     path('tasks/<int:pk>/', TaskDetailView.as_view(), name='task-detail'),
     path('users/', UserListView.as_view(), name='user-list'),
     path('tasks/<int:task_id>/comments/', TaskCommentListCreateView.as_view(), name='task-comment-list'),
@@ -3,13 +3,15 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.exceptions import PermissionDenied, NotFound
 from .models import Task, TaskComment
-from .serializers import TaskSerializer, TaskCommentSerializer
+from .serializers import TaskSerializer, TaskCommentSerializer, TaskExportFilterSerializer
 # UserSerializer will be imported from api.serializers
 from api.serializers import UserSerializer as ApiUserSerializer
 from django.contrib.auth import get_user_model
 from rest_framework.permissions import IsAuthenticated
 from django.db.models import Count, Q
 from django.db import models
+from reporting.metrics import TASK_KPIS
+from api.exports import streaming_export, export_fields
 
 User = get_user_model()
 
@@ -249,6 +251,32 @@ class TaskCommentDetailView(generics.RetrieveUpdateDestroyAPIView):
             )
         return super().destroy(request, *args, **kwargs)
 
+def get_visible_tasks(user):
+    """
+    Return the tasks a user can see based on their role.
+    """
+    if user.role == 'ADMIN':
+        return Task.objects.all()
+    elif user.role == 'MANAGER':
+        # Managers see tasks assigned to them AND tasks they created/assigned
+        return Task.objects.filter(
+            Q(assigned_to=user) | Q(created_by=user)
+        ).distinct()
+    # Users only see tasks assigned to them
+    return Task.objects.filter(assigned_to=user)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_tasks(request):
+    """
+    Stream all tasks visible to the user as NDJSON or CSV.
+    """
+    filters = TaskExportFilterSerializer(data=request.query_params)
+    if not filters.is_valid():
+        return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+    tasks = get_visible_tasks(request.user).filter(**filters.validated_data)
+    return streaming_export(request, tasks, export_fields(Task), 'tasks')
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def task_stats(request):
@@ -257,36 +285,21 @@ def task_stats(request):
     """
     try:
         # Get tasks based on user role
-        user = request.user
-        
-        if user.role == 'ADMIN':
-            tasks = Task.objects.all()
-        elif user.role == 'MANAGER':
-            # Managers see tasks assigned to them AND tasks they created/assigned
-            tasks = Task.objects.filter(
-                Q(assigned_to=user) | Q(created_by=user)
-            ).distinct()
-        else:  # USER role
-            tasks = Task.objects.filter(assigned_to=user)
+        tasks = get_visible_tasks(request.user)
         
-        # Calculate statistics
-        total_tasks = tasks.count()
-        active_tasks = tasks.exclude(status='C').count()  # Exclude completed tasks
-        completed_tasks = tasks.filter(status='C').count()
-        pending_tasks = tasks.filter(status='P').count()
-        in_progress_tasks = tasks.filter(status='IP').count()
-        overdue_tasks = tasks.filter(status='O').count()
+        # Calculate all statistics in a single aggregate query
+        stats = TASK_KPIS.compute(tasks)
         
         # Return statistics
         result = {
-            'total_tasks': total_tasks,
-            'active_tasks': active_tasks,
-            'completed_tasks': completed_tasks,
+            'total_tasks': stats['total_tasks'],
+            'active_tasks': stats['active_tasks'],  # Excludes completed tasks
+            'completed_tasks': stats['status_C'],
             'status_counts': {
-                'P': pending_tasks,
-                'IP': in_progress_tasks,
-                'C': completed_tasks,
-                'O': overdue_tasks
+                'P': stats['status_P'],
+                'IP': stats['status_IP'],
+                'C': stats['status_C'],
+                'O': stats['status_O']
             }
         }
         
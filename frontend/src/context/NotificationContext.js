@@ -1,5 +1,6 @@
-import React, { createContext, useState, useEffect, useContext, useCallback } from 'react';
+import React, { createContext, useState, useEffect, useContext, useCallback, useRef } from 'react';
 import api from '../services/api';
+import { getChangeCursor, getChanges, applyChanges } from '../services/changeService';
 import { AuthContext } from './AuthContext';
 
 export const NotificationContext = createContext();
@@ -11,6 +12,8 @@ export const NotificationProvider = ({ children }) => {
   const [preferences, setPreferences] = useState(null);
   
   const { isAuthenticated, token } = useContext(AuthContext);
+  // Change feed cursor taken before the last full load
+  const changeCursor = useRef(null);
   
   // Fetch all notifications
   const fetchNotifications = useCallback(async () => {
@@ -18,6 +21,7 @@ export const NotificationProvider = ({ children }) => {
     
     try {
       setLoading(true);
+      changeCursor.current = await getChangeCursor();
       const response = await api.get('/api/notifications/notifications/');
       setNotifications(response.data.results || response.data);
       
@@ -45,6 +49,30 @@ export const NotificationProvider = ({ children }) => {
     }
   }, [isAuthenticated, token]);
   
+  // Apply notification changes since the last poll instead of reloading the list
+  const syncNotifications = useCallback(async () => {
+    if (!isAuthenticated || !token) return;
+    if (changeCursor.current === null) {
+      fetchUnreadCount();
+      return;
+    }
+    
+    try {
+      const { cursor, changes, expired } = await getChanges(changeCursor.current);
+      const { items, unknown } = applyChanges(notifications, changes, 'notification');
+      if (expired || unknown.length > 0) {
+        // New notifications need their category details from the full list
+        fetchNotifications();
+        return;
+      }
+      changeCursor.current = cursor;
+      setNotifications(items);
+      setUnreadCount(items.filter(notification => !notification.is_read).length);
+    } catch (error) {
+      console.error('Error syncing notifications:', error);
+    }
+  }, [isAuthenticated, token, notifications, fetchNotifications, fetchUnreadCount]);
+  
   // Mark notification as read
   const markAsRead = useCallback(async (notificationId) => {
     if (!isAuthenticated || !token) return;
@@ -124,19 +152,22 @@ export const NotificationProvider = ({ children }) => {
     if (isAuthenticated) {
       fetchNotifications();
       fetchPreferences();
-      
-      // Set up polling for unread count every 30 seconds
-      const intervalId = setInterval(fetchUnreadCount, 30000);
-      
-      return () => {
-        clearInterval(intervalId);
-      };
     } else {
+      changeCursor.current = null;
       setNotifications([]);
       setUnreadCount(0);
       setPreferences(null);
     }
-  }, [isAuthenticated, fetchNotifications, fetchPreferences, fetchUnreadCount]);
+  }, [isAuthenticated, fetchNotifications, fetchPreferences]);
+  
+  // Poll the change feed every 30 seconds
+  useEffect(() => {
+    if (!isAuthenticated) return undefined;
+    const intervalId = setInterval(syncNotifications, 30000);
+    return () => {
+      clearInterval(intervalId);
+    };
+  }, [isAuthenticated, syncNotifications]);
   
   return (
     <NotificationContext.Provider
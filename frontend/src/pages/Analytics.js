@@ -407,15 +407,11 @@ const Analytics = () => {
       setLoading(true);
       setError(null);
 
-      // Add cache-busting timestamp to ensure fresh data
-      const timestamp = new Date().getTime();
-      
       const params = {
         grouping: filters.timePeriod,
         ...(filters.startDate && { start_date: filters.startDate }),
         ...(filters.endDate && { end_date: filters.endDate }),
-        ...(!isAdminOrManager && user?.id && { user_id: user.id }),
-        _t: timestamp // Cache-busting parameter
+        ...(!isAdminOrManager && user?.id && { user_id: user.id })
       };
 
       // Load core analytics data
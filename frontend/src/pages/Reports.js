@@ -234,6 +234,17 @@ const Reports = () => {
       
       const response = await reportingService.templates.generateReport(templateId);
       
+      // Generation runs in the background; poll until the report is finished
+      let report = response.data;
+      while (['pending', 'processing'].includes(report.status)) {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        report = (await reportingService.reports.getProgress(report.id)).data;
+      }
+      
+      if (report.status !== 'completed') {
+        throw new Error(report.error_message || `Report ${report.status}`);
+      }
+      
       setGenerationProgress({ [templateId]: 'completed' });
       
       // Reload generated reports if we're on that tab
@@ -242,7 +253,7 @@ const Reports = () => {
       }
       
       handleCloseActionMenu();
-      console.log('Report generated:', response.data);
+      console.log('Report generated:', report);
     } catch (error) {
       console.error('Error generating report:', error);
       setGenerationProgress({ [templateId]: 'failed' });
@@ -254,7 +265,11 @@ const Reports = () => {
 
   const handleDownloadReport = async (reportId, reportName, format = 'csv') => {
     try {
-      await reportingService.utils.downloadCSV(reportId, `${reportName}.csv`);
+      if (format === 'raw') {
+        await reportingService.utils.downloadCSV(reportId, `${reportName}_records.csv`, 'raw');
+      } else {
+        await reportingService.utils.downloadCSV(reportId, `${reportName}.csv`);
+      }
       handleCloseActionMenu();
     } catch (error) {
       console.error('Error downloading report:', error);
@@ -629,6 +644,10 @@ const Reports = () => {
         <MenuItem key="download-csv" onClick={() => handleDownloadReport(selectedItem.id, selectedItem.template.name, 'csv')}>
           <GetAppIcon sx={{ mr: 1 }} fontSize="small" />
           Download CSV
+        </MenuItem>,
+        <MenuItem key="download-raw" onClick={() => handleDownloadReport(selectedItem.id, selectedItem.template.name, 'raw')}>
+          <GetAppIcon sx={{ mr: 1 }} fontSize="small" />
+          Download Records (CSV)
         </MenuItem>
       ]}
 
@@ -47,6 +47,8 @@ const SaleDetail = () => {
   
   const [sale, setSale] = useState(null);
   const [notes, setNotes] = useState([]);
+  const [notesNext, setNotesNext] = useState(null);
+  const [loadingNotes, setLoadingNotes] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [editMode, setEditMode] = useState(false);
@@ -83,7 +85,6 @@ const SaleDetail = () => {
   
   useEffect(() => {
     fetchSaleDetails();
-    fetchSaleNotes();
   }, [id]);
   
   const fetchSaleDetails = async () => {
@@ -92,6 +93,9 @@ const SaleDetail = () => {
       const saleData = await getSaleById(id);
       setSale(saleData);
       setFormData(saleData);
+      // The sale comes with the newest page of its notes
+      setNotes(saleData?.notes || []);
+      setNotesNext(saleData?.notes_next || null);
       setLoading(false);
     } catch (err) {
       console.error('Error fetching sale details:', err);
@@ -106,19 +110,25 @@ const SaleDetail = () => {
       const notesData = await getSaleNotes(id);
       console.log("Received notes data:", notesData);
       
-      // Ensure notes is always an array and sort by created_at in descending order
-      const notesArray = Array.isArray(notesData) ? notesData : 
-                        (notesData && notesData.results ? notesData.results : []);
-                        
-      // Sort notes by created_at in descending order (newest first)
-      const sortedNotes = [...notesArray].sort((a, b) => 
-        new Date(b.created_at) - new Date(a.created_at)
-      );
-      
-      setNotes(sortedNotes);
+      // Notes arrive newest first, one page at a time
+      setNotes(notesData?.results || []);
+      setNotesNext(notesData?.next || null);
     } catch (err) {
       console.error('Error fetching sale notes:', err);
       setNotes([]);
+      setNotesNext(null);
+    }
+  };
+  
+  const handleLoadOlderNotes = async () => {
+    if (!notesNext) return;
+    try {
+      setLoadingNotes(true);
+      const notesData = await getSaleNotes(id, notesNext);
+      setNotes(prevNotes => [...prevNotes, ...(notesData?.results || [])]);
+      setNotesNext(notesData?.next || null);
+    } finally {
+      setLoadingNotes(false);
     }
   };
   
@@ -518,6 +528,14 @@ const SaleDetail = () => {
                 </Box>
               )}
             </List>
+            
+            {notesNext && (
+              <Box sx={{ textAlign: 'center', mt: 1 }}>
+                <Button onClick={handleLoadOlderNotes} disabled={loadingNotes}>
+                  {loadingNotes ? 'Loading...' : 'Load older notes'}
+                </Button>
+              </Box>
+            )}
           </Paper>
         </Grid>
         
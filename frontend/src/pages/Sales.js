@@ -45,7 +45,7 @@ import {
   Edit as EditIcon,
   MoreVert as MoreVertIcon
 } from '@mui/icons-material';
-import { getSalesPipeline, getSalesStats, updateSaleStatus, deleteSale, getSales } from '../services/saleService';
+import { getSalesPipeline, getSalesPipelineColumn, getSalesStats, updateSaleStatus, deleteSale, getSales } from '../services/saleService';
 import { SALE_STATUSES } from '../utils/constants';
 import { formatDate } from '../utils/dateUtils';
 
@@ -64,6 +64,7 @@ const Sales = () => {
   const [filterMenuAnchor, setFilterMenuAnchor] = useState(null);
   const [salesList, setSalesList] = useState([]);
   const [totalSales, setTotalSales] = useState(0);
+  const [loadingMore, setLoadingMore] = useState({});
   
   const navigate = useNavigate();
   
@@ -270,6 +271,24 @@ const Sales = () => {
         newPipeline[currentStatus] = newPipeline[currentStatus]?.filter(s => s.id.toString() !== saleId);
         // Add to new status
         newPipeline[newStatus] = [...(newPipeline[newStatus] || []), { ...saleToMove, status: newStatus }];
+        // Keep the column totals in step
+        const columns = { ...(prevPipeline.columns || {}) };
+        const amount = Number(saleToMove.amount) || 0;
+        if (columns[currentStatus]) {
+          columns[currentStatus] = {
+            ...columns[currentStatus],
+            count: columns[currentStatus].count - 1,
+            amount: columns[currentStatus].amount - amount
+          };
+        }
+        if (columns[newStatus]) {
+          columns[newStatus] = {
+            ...columns[newStatus],
+            count: columns[newStatus].count + 1,
+            amount: columns[newStatus].amount + amount
+          };
+        }
+        newPipeline.columns = columns;
         return newPipeline;
       });
 
@@ -306,6 +325,35 @@ const Sales = () => {
     navigate(`/sales/${saleId}`);
   };
   
+  const handleLoadMore = async (status) => {
+    const cursor = salesPipeline.columns?.[status]?.next_cursor;
+    if (!cursor) return;
+
+    try {
+      setLoadingMore(prev => ({ ...prev, [status]: true }));
+      const params = {};
+      if (searchTerm && searchTerm.trim() !== '') {
+        params.search = searchTerm.trim();
+      }
+      const nextCards = await getSalesPipelineColumn(status, cursor, params);
+      setSalesPipeline(prevPipeline => {
+        const loadedIds = new Set((prevPipeline[status] || []).map(sale => sale.id));
+        return {
+          ...prevPipeline,
+          [status]: [...(prevPipeline[status] || []), ...nextCards.results.filter(sale => !loadedIds.has(sale.id))],
+          columns: {
+            ...prevPipeline.columns,
+            [status]: { ...prevPipeline.columns?.[status], next_cursor: nextCards.next_cursor }
+          }
+        };
+      });
+    } catch (err) {
+      setError('Failed to load more opportunities. Please try again.');
+    } finally {
+      setLoadingMore(prev => ({ ...prev, [status]: false }));
+    }
+  };
+  
   const handleDeleteSale = async (saleId, status) => {
     if (window.confirm('Are you sure you want to delete this opportunity?')) {
       // Define originalPipeline outside the try block to ensure it's in scope for catch
@@ -420,7 +468,7 @@ const Sales = () => {
                     {statusDisplay[status]}
                   </Typography>
                   <Chip 
-                    label={salesForStatus.length} 
+                    label={salesPipeline.columns?.[status]?.count ?? salesForStatus.length} 
                     size="small" 
                     sx={{ bgcolor: 'white', color: 'text.primary' }} 
                   />
@@ -514,6 +562,16 @@ const Sales = () => {
                       <Typography color="text.secondary">No sales in this stage</Typography>
                     </Box>
                   )}
+                  {salesPipeline.columns?.[status]?.next_cursor && (
+                    <Button
+                      fullWidth
+                      size="small"
+                      onClick={() => handleLoadMore(status)}
+                      disabled={!!loadingMore[status]}
+                    >
+                      {loadingMore[status] ? 'Loading...' : 'Load more'}
+                    </Button>
+                  )}
                 </Box>
               </Paper>
             </Box>
@@ -0,0 +1,45 @@
+import api from './api';
+
+// Cursor to take before a full load of the lists, so later changes can be fetched incrementally
+export const getChangeCursor = async () => {
+  const response = await api.get('/api/changes/');
+  return response.data.cursor;
+};
+
+// Fetch every change after the cursor. `expired` means the lists must be loaded in full again.
+export const getChanges = async (since) => {
+  let cursor = since;
+  let changes = [];
+  try {
+    for (;;) {
+      const response = await api.get('/api/changes/', { params: { since: cursor } });
+      changes = changes.concat(response.data.changes);
+      cursor = response.data.cursor;
+      if (!response.data.has_more) break;
+    }
+  } catch (error) {
+    if (error.response?.status === 410) {
+      return { cursor: error.response.data.cursor, changes: [], expired: true };
+    }
+    throw error;
+  }
+  return { cursor, changes, expired: false };
+};
+
+// Apply the changes of one model ('sale', 'task', 'customer', 'calendarevent', 'notification')
+// to a list of objects. Upserts only carry the model's own columns, so they are merged into
+// known objects; `unknown` lists upserted ids the list did not contain yet.
+export const applyChanges = (items, changes, model) => {
+  let result = items;
+  const unknown = [];
+  changes.filter(change => change.model === model).forEach(change => {
+    if (change.action === 'delete') {
+      result = result.filter(item => item.id !== change.id);
+    } else if (result.some(item => item.id === change.id)) {
+      result = result.map(item => (item.id === change.id ? { ...item, ...change.data } : item));
+    } else {
+      unknown.push(change.id);
+    }
+  });
+  return { items: result, unknown };
+};
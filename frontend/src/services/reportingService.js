@@ -55,16 +55,11 @@ apiClient.interceptors.response.use(
 
 // Enhanced Analytics API calls with better error handling
 export const analyticsAPI = {
-  // Get dashboard KPIs with enhanced error handling and cache-busting
+  // Get dashboard KPIs with enhanced error handling
+  // Cached analytics are invalidated server-side whenever the underlying data changes
   getDashboardKPIs: async (params = {}) => {
     try {
-      // Add cache-busting parameter and any other params
-      const requestParams = {
-        ...params,
-        _t: new Date().getTime() // Cache-busting timestamp
-      };
-      
-      const response = await apiClient.get('/analytics/dashboard_kpis/', { params: requestParams });
+      const response = await apiClient.get('/analytics/dashboard_kpis/', { params });
       return {
         data: response.data,
         success: true
@@ -86,13 +81,7 @@ export const analyticsAPI = {
   // Get sales performance data with fallback
   getSalesPerformance: async (params = {}) => {
     try {
-      // Ensure cache-busting parameter exists
-      const requestParams = {
-        ...params,
-        _t: params._t || new Date().getTime()
-      };
-      
-      const response = await apiClient.get('/analytics/sales_performance/', { params: requestParams });
+      const response = await apiClient.get('/analytics/sales_performance/', { params });
       return {
         data: {
           sales_over_time: response.data.sales_over_time || [],
@@ -120,13 +109,7 @@ export const analyticsAPI = {
   // Get customer engagement data with fallback
   getCustomerEngagement: async (params = {}) => {
     try {
-      // Ensure cache-busting parameter exists
-      const requestParams = {
-        ...params,
-        _t: params._t || new Date().getTime()
-      };
-      
-      const response = await apiClient.get('/analytics/customer_engagement/', { params: requestParams });
+      const response = await apiClient.get('/analytics/customer_engagement/', { params });
       return {
         data: {
           customer_status: response.data.customer_status || [],
@@ -156,13 +139,7 @@ export const analyticsAPI = {
   // Get task completion data with fallback
   getTaskCompletion: async (params = {}) => {
     try {
-      // Ensure cache-busting parameter exists
-      const requestParams = {
-        ...params,
-        _t: params._t || new Date().getTime()
-      };
-      
-      const response = await apiClient.get('/analytics/task_completion/', { params: requestParams });
+      const response = await apiClient.get('/analytics/task_completion/', { params });
       return {
         data: {
           completion_over_time: response.data.completion_over_time || [],
@@ -226,13 +203,7 @@ export const analyticsAPI = {
   // Get user sales performance data (managers/admins only)
   getUserSalesPerformance: async (params = {}) => {
     try {
-      // Ensure cache-busting parameter exists
-      const requestParams = {
-        ...params,
-        _t: params._t || new Date().getTime()
-      };
-      
-      const response = await apiClient.get('/analytics/user_sales_performance/', { params: requestParams });
+      const response = await apiClient.get('/analytics/user_sales_performance/', { params });
       return {
         data: {
           users: response.data.users || [],
@@ -256,13 +227,7 @@ export const analyticsAPI = {
   // Get user task performance data (managers/admins only)
   getUserTaskPerformance: async (params = {}) => {
     try {
-      // Ensure cache-busting parameter exists
-      const requestParams = {
-        ...params,
-        _t: params._t || new Date().getTime()
-      };
-      
-      const response = await apiClient.get('/analytics/user_task_performance/', { params: requestParams });
+      const response = await apiClient.get('/analytics/user_task_performance/', { params });
       return {
         data: {
           users: response.data.users || [],
@@ -349,8 +314,15 @@ export const generatedReportsAPI = {
   // Get specific report
   getReport: (id) => apiClient.get(`/reports/${id}/`),
   
-  // Export report as CSV
-  exportCSV: (id) => apiClient.get(`/reports/${id}/export_csv/`, {
+  // Get generation status of a report (without its data)
+  getProgress: (id) => apiClient.get(`/reports/${id}/progress/`),
+  
+  // Cancel a pending or processing report
+  cancelReport: (id) => apiClient.post(`/reports/${id}/cancel/`),
+  
+  // Export report as CSV ('summary' for the report figures, 'raw' for the underlying records)
+  exportCSV: (id, mode = 'summary') => apiClient.get(`/reports/${id}/export_csv/`, {
+    params: { mode },
     responseType: 'blob'
   }),
   
@@ -448,9 +420,10 @@ export const reportSchedulesAPI = {
 // Utility functions
 export const utilsAPI = {
   // Download CSV function that triggers file download
-  downloadCSV: async (reportId, filename) => {
+  downloadCSV: async (reportId, filename, mode = 'summary') => {
     try {
       const response = await apiClient.get(`/reports/${reportId}/export_csv/`, {
+        params: { mode },
         responseType: 'blob'
       });
       
@@ -86,6 +86,9 @@ export const getSalesPipeline = async (params = {}) => {
       }
     });
     
+    // Per-column totals and cursors; each status above only holds the first cards
+    normalizedData.columns = pipelineData.columns || {};
+
     console.log('Normalized pipeline data:', normalizedData);
     return normalizedData;
   } catch (error) {
@@ -103,7 +106,8 @@ export const getSalesPipeline = async (params = {}) => {
       PROPOSAL: [],
       NEGOTIATION: [],
       WON: [],
-      LOST: []
+      LOST: [],
+      columns: {}
     };
     
     console.log('Using fallback pipeline data:', fallbackData);
@@ -111,6 +115,19 @@ export const getSalesPipeline = async (params = {}) => {
   }
 };
 
+export const getSalesPipelineColumn = async (status, cursor, params = {}) => {
+  try {
+    const response = await axios.get(`${API_URL}/api/sales/pipeline/`, {
+      ...getAuthHeaders(),
+      params: { ...params, status, cursor }
+    });
+    return response.data;
+  } catch (error) {
+    console.error(`Error loading more ${status} sales:`, error);
+    throw error;
+  }
+};
+
 export const getSalesStats = async () => {
   try {
     const response = await axios.get(`${API_URL}/api/sales/stats/`, getAuthHeaders());
@@ -203,13 +220,33 @@ export const updateSaleStatus = async (id, status) => {
   }
 };
 
-export const getSaleNotes = async (saleId) => {
+// Bulk operations answer with { updated, unchanged, not_found, results: [{ id, result, previous }] }
+const postBulkSaleOperation = async (operation, payload) => {
+  try {
+    const response = await axios.post(`${API_URL}/api/sales/${operation}/`, payload, getAuthHeaders());
+    return response.data;
+  } catch (error) {
+    console.error(`Error running ${operation} on sales:`, error);
+    throw error;
+  }
+};
+
+export const bulkUpdateSaleStatus = (ids, status) => postBulkSaleOperation('bulk_status', { ids, status });
+
+export const bulkReassignSales = (ids, assignedTo) =>
+  postBulkSaleOperation('bulk_reassign', { ids, assigned_to: assignedTo });
+
+export const bulkArchiveSales = (ids, isArchived = true) =>
+  postBulkSaleOperation('bulk_archive', { ids, is_archived: isArchived });
+
+// Notes come newest first in pages of { results, next }; pass `next` back as nextUrl for older notes
+export const getSaleNotes = async (saleId, nextUrl = null) => {
   try {
-    const response = await axios.get(`${API_URL}/api/sales/${saleId}/notes/`, getAuthHeaders());
+    const response = await axios.get(nextUrl || `${API_URL}/api/sales/${saleId}/notes/`, getAuthHeaders());
     return response.data;
   } catch (error) {
     console.error(`Error fetching notes for sale ${saleId}:`, error);
-    return [];
+    return { results: [], next: null };
   }
 };
 